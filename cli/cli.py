@@ -20,6 +20,7 @@
 import os
 import platform
 import shutil
+import threading
 import time
 import traceback
 from datetime import datetime
@@ -32,7 +33,9 @@ import click
 from common.globalconfig import AMAZON_CREDENTIAL_FILE, GlobalConfig
 from notifications.notifications import NotificationHandler, TIME_FORMAT
 from stores.amazon import Amazon
-from utils.logger import log
+from utils.browser_driver import DRIVER_BACKENDS
+from utils.logger import LOG_DIR, LOG_FILE_NAME, log
+from utils.profiler import install_signal_handlers, profiler
 from utils.version import is_latest, version, get_latest_version
 
 LICENSE_PATH = os.path.join(
@@ -56,6 +59,7 @@ def sizeof_fmt(num, suffix="B"):
 # see https://docs.python.org/3/library/signal.html
 def interrupt_handler(signal_num, frame):
     log.info(f"Caught the interrupt signal.  Exiting.")
+    profiler.stop()
     exit(0)
 
 
@@ -75,9 +79,31 @@ def notify_on_crash(func):
     return decorator
 
 
+def check_version():
+    if is_latest():
+        log.info(f"FairGame v{version}")
+    elif version.is_prerelease:
+        log.warning(f"FairGame PRE-RELEASE v{version}")
+    else:
+        log.warning(
+            f"You are running FairGame v{version}, but the most recent version is v{get_latest_version()}. "
+            f"Consider upgrading "
+        )
+
+
 @click.group()
-def main():
-    pass
+@click.option(
+    "--offline",
+    is_flag=True,
+    default=False,
+    help="Do not check GitHub for a newer release of FairGame",
+)
+def main(offline):
+    if offline:
+        log.info(f"FairGame v{version}")
+    else:
+        # Never hold up start up waiting on GitHub
+        threading.Thread(target=check_version, daemon=True).start()
 
 
 # @click.command()
@@ -156,6 +182,54 @@ def main():
     default=False,
     help="Uses normal page load strategy for selenium. Default is none",
 )
+@click.option(
+    "--early-stop",
+    is_flag=True,
+    default=False,
+    help="Stop loading offer pages as soon as the offers are found. Ignored with --slow-mode",
+)
+@click.option(
+    "--prefetch",
+    is_flag=True,
+    default=False,
+    help="Load the next ASIN's offer page in a second tab while the current one is checked. Ignored with --slow-mode",
+)
+@click.option(
+    "--clear-cart",
+    type=click.Choice(["delete", "save"], case_sensitive=False),
+    default=None,
+    help="Delete, or save for later, items already in the cart at startup instead of exiting",
+)
+@click.option(
+    "--adaptive-offers",
+    is_flag=True,
+    default=False,
+    help="Time the /dp/ and /gp/offer-listing/ offer pages for each ASIN and use the faster one",
+)
+@click.option(
+    "--parallel-checkout",
+    is_flag=True,
+    default=False,
+    help="Check out on a second tab with its own WebDriver session, so the other groups keep being checked",
+)
+@click.option(
+    "--watchlist",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="CSV or JSONL file of ASINs to check, with asin, reserve_min, reserve_max and optional group columns. "
+    "Replaces the groups in amazon_config.json",
+)
+@click.option(
+    "--chrome-preset",
+    default=None,
+    help="Chrome launch preset from the chrome_presets section of fairgame.conf. Defaults to the one set there",
+)
+@click.option(
+    "--driver-backend",
+    type=click.Choice(DRIVER_BACKENDS, case_sensitive=False),
+    default="selenium",
+    help="How stock checks talk to Chrome: through chromedriver (selenium) or directly over DevTools (cdp)",
+)
 @click.option(
     "--p",
     type=str,
@@ -180,6 +254,12 @@ def main():
     default=False,
     help="Purge the user profile that Fairgame uses for browsing",
 )
+@click.option(
+    "--ram-profile",
+    is_flag=True,
+    default=False,
+    help="Run Chrome from a temporary in-memory profile, only login cookies are saved between runs",
+)
 @click.option(
     "--clean-credentials",
     is_flag=True,
@@ -198,6 +278,31 @@ def main():
     default=False,
     help="Wait if captcha could not be solved. Only occurs if enters captcha handler during checkout.",
 )
+@click.option(
+    "--record-session",
+    is_flag=True,
+    default=False,
+    help="Record browser commands and pages to sessions/ so the run can be replayed with replay-session",
+)
+@click.option(
+    "--metrics-port",
+    type=int,
+    default=None,
+    help="Serve Prometheus metrics at http://<metrics-host>:<port>/metrics",
+)
+@click.option(
+    "--metrics-host",
+    default="127.0.0.1",
+    show_default=True,
+    help="Address the metrics endpoint listens on. Use 0.0.0.0 to allow remote scraping",
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    default=False,
+    help="Profile the bot from startup and write the results to logs/ on exit. "
+    "SIGUSR1 and SIGUSR2 also start and stop profiling while running",
+)
 @notify_on_crash
 def amazon(
     no_image,
@@ -212,13 +317,26 @@ def amazon(
     disable_presence,
     disable_sound,
     slow_mode,
+    early_stop,
+    prefetch,
+    clear_cart,
+    adaptive_offers,
+    parallel_checkout,
+    watchlist,
+    chrome_preset,
+    driver_backend,
     p,
     log_stock_check,
     shipping_bypass,
     clean_profile,
+    ram_profile,
     clean_credentials,
     alt_checkout,
     captcha_wait,
+    record_session,
+    metrics_port,
+    metrics_host,
+    profile,
 ):
     notification_handler.sound_enabled = not disable_sound
     if not notification_handler.sound_enabled:
@@ -232,10 +350,25 @@ def amazon(
         shutil.rmtree(global_config.get_browser_profile_path())
         log.info(f"Freed {profile_size}")
 
+    if clean_profile and os.path.exists(global_config.get_cookie_store_path()):
+        log.info(f"Removing saved cookies at '{global_config.get_cookie_store_path()}'")
+        os.remove(global_config.get_cookie_store_path())
+
     if clean_credentials and os.path.exists(AMAZON_CREDENTIAL_FILE):
         log.info(f"Removing existing Amazon credentials from {AMAZON_CREDENTIAL_FILE}")
         os.remove(AMAZON_CREDENTIAL_FILE)
 
+    if metrics_port:
+        from utils.metrics import start_metrics_server
+
+        try:
+            start_metrics_server(metrics_port, host=metrics_host)
+        except OSError as e:
+            log.error(f"Unable to serve metrics on {metrics_host}:{metrics_port}: {e}")
+
+    if profile:
+        profiler.start()
+
     amzn_obj = Amazon(
         headless=headless,
         notification_handler=notification_handler,
@@ -246,6 +379,16 @@ def amazon(
         no_screenshots=no_screenshots,
         disable_presence=disable_presence,
         slow_mode=slow_mode,
+        early_stop=early_stop,
+        prefetch=prefetch,
+        clear_cart=clear_cart.lower() if clear_cart else None,
+        watchlist=watchlist,
+        adaptive_offers=adaptive_offers,
+        parallel_checkout=parallel_checkout,
+        chrome_preset=chrome_preset,
+        record_session=record_session,
+        ram_profile=ram_profile,
+        driver_backend=driver_backend.lower(),
         no_image=no_image,
         encryption_pass=p,
         log_stock_check=log_stock_check,
@@ -259,6 +402,8 @@ def amazon(
         del amzn_obj
         log.error("Exiting Program...")
         time.sleep(5)
+    finally:
+        profiler.stop()
 
 
 @click.option(
@@ -409,25 +554,442 @@ def show_traceroutes(domain):
         log.info(f" {trace_command}{endpoint}")
 
 
+@click.command()
+@click.option(
+    "--page",
+    "pages",
+    multiple=True,
+    help="Local HTML page to run the benchmark against. Defaults to the saved page sources",
+)
+@click.option("--xpath", default="//div", help="XPath used for the element lookups")
+@click.option(
+    "--iterations", type=int, default=50, help="Number of times to run each command"
+)
+@click.option("--headless", is_flag=True, help="Headless mode.")
+def benchmark_driver(pages, xpath, iterations, headless):
+    from chromedriver_py import binary_path
+    from selenium import webdriver
+
+    from utils.browser_driver import benchmark_browser, create_browser
+    from utils.selenium_utils import get_chrome_preset
+
+    urls = get_benchmark_urls(pages)
+    options = get_chrome_preset(
+        global_config.get_fairgame_config().get("chrome_presets")
+    ).build_options(headless)
+    driver = webdriver.Chrome(executable_path=binary_path, options=options)
+    try:
+        for backend in DRIVER_BACKENDS:
+            browser = create_browser(backend, driver)
+            log.info(f"Benchmarking {type(browser).__name__} on {len(urls)} page(s)...")
+            timings = benchmark_browser(browser, urls, xpath, iterations)
+            browser.close()
+            for command, samples in timings.items():
+                samples.sort()
+                log.info(
+                    f"  {command:<24} mean {sum(samples) / len(samples):7.2f} ms"
+                    f"  p50 {samples[len(samples) // 2]:7.2f} ms"
+                    f"  p95 {samples[int(len(samples) * 0.95)]:7.2f} ms"
+                )
+    finally:
+        driver.quit()
+
+
+@click.command()
+@click.option(
+    "--page",
+    "pages",
+    multiple=True,
+    help="Local HTML page to load with each preset. Defaults to the saved page sources",
+)
+@click.option(
+    "--preset",
+    "preset_names",
+    multiple=True,
+    help="Preset to benchmark, can be repeated. Defaults to every preset in fairgame.conf",
+)
+@click.option(
+    "--iterations", type=int, default=3, help="Number of Chrome launches per preset"
+)
+@click.option("--headless", is_flag=True, help="Headless mode.")
+def benchmark_presets(pages, preset_names, iterations, headless):
+    """Launches Chrome with each launch preset and reports its startup time, page load times and memory"""
+    import tempfile
+
+    from chromedriver_py import binary_path
+    from selenium import webdriver
+
+    from utils.selenium_utils import load_chrome_presets, process_tree_rss
+
+    urls = get_benchmark_urls(pages)
+    try:
+        presets, default = load_chrome_presets(
+            global_config.get_fairgame_config().get("chrome_presets")
+        )
+    except ValueError as e:
+        log.error(e)
+        exit(1)
+    unknown = [name for name in preset_names if name not in presets]
+    if unknown:
+        log.error(
+            f"Unknown Chrome preset(s) {', '.join(unknown)}, choose from {', '.join(sorted(presets))}"
+        )
+        exit(1)
+
+    def describe(samples, unit="ms"):
+        samples = sorted(samples)
+        return (
+            f"mean {sum(samples) / len(samples):8.1f} {unit}"
+            f"  p50 {samples[len(samples) // 2]:8.1f} {unit}"
+            f"  p95 {samples[int(len(samples) * 0.95)]:8.1f} {unit}"
+        )
+
+    for name in preset_names or sorted(presets):
+        preset = presets[name]
+        startups, loads, rss = [], [], []
+        for _ in range(iterations):
+            # A fresh profile each time, so every launch starts with an empty disk cache
+            profile = tempfile.mkdtemp(prefix="fairgame-preset-")
+            options = preset.build_options(headless)
+            options.add_argument(f"user-data-dir={profile}")
+            try:
+                start = time.perf_counter()
+                driver = webdriver.Chrome(executable_path=binary_path, options=options)
+                startups.append((time.perf_counter() - start) * 1000)
+                try:
+                    for url in urls:
+                        start = time.perf_counter()
+                        # The default page load strategy returns once the page has loaded
+                        driver.get(url)
+                        loads.append((time.perf_counter() - start) * 1000)
+                    rss.append(process_tree_rss(driver.service.process.pid) / 2**20)
+                finally:
+                    driver.quit()
+            finally:
+                shutil.rmtree(profile, ignore_errors=True)
+        default_note = " (default)" if name == default else ""
+        log.info(f"Preset '{name}'{default_note}: {preset.description}")
+        log.info(f"  startup    {describe(startups)}")
+        log.info(f"  page load  {describe(loads)}")
+        log.info(f"  RSS        {describe(rss, 'MiB')}")
+
+
+def get_benchmark_pages(pages):
+    """The given pages, with folders replaced by the HTML files in them, or the saved page sources if
+    there are none"""
+    files = []
+    for page in pages:
+        if os.path.isdir(page):
+            files.extend(
+                sorted(
+                    str(path)
+                    for path in Path(page).iterdir()
+                    if path.suffix.lower() in (".html", ".htm")
+                )
+            )
+        else:
+            files.append(page)
+    if not pages:
+        store = get_artifact_store()
+        files = [
+            store.extract(artifact, "extracted") for artifact in store.find(kind="html")
+        ]
+    if not files:
+        log.error(
+            "No pages to benchmark. Use --page or run FairGame to save some pages"
+        )
+        exit(0)
+    return files
+
+
+def get_benchmark_urls(pages):
+    """file:// URLs for the given pages, or for the saved page sources if there are none"""
+    return [Path(page).resolve().as_uri() for page in get_benchmark_pages(pages)]
+
+
+@click.command()
+@click.option(
+    "--page",
+    "pages",
+    multiple=True,
+    help="Saved HTML page, or folder of them such as html_saves, to profile on. "
+    "Defaults to the saved page sources",
+)
+@click.option(
+    "--engine",
+    type=click.Choice(["lxml", "chrome", "both"], case_sensitive=False),
+    default="both",
+    show_default=True,
+    help="Where to evaluate the XPaths",
+)
+@click.option(
+    "--iterations",
+    type=int,
+    default=20,
+    show_default=True,
+    help="Evaluations of each XPath per page",
+)
+@click.option(
+    "--slow-ms",
+    type=float,
+    default=5.0,
+    show_default=True,
+    help="Flag XPaths whose mean evaluation takes at least this long",
+)
+@click.option("--headless", is_flag=True, help="Headless mode.")
+def profile_xpaths(pages, engine, iterations, slow_ms, headless):
+    """Times every XPath the bot uses on saved pages, and flags the slow ones and the ones that match
+    nothing"""
+    from stores.amazon import (
+        CHECK_STOCK_XPATHS,
+        OFFER_PAGE_FALLBACKS,
+        OFFER_PAGE_SELECTORS,
+        PLACE_ORDER_BUTTONS,
+        SUCCESS_ALERT_XPATH,
+    )
+    from utils.xpath_profiler import XPathProfile
+
+    selectors = {}
+    for name, xpaths in global_config.get_property("AMAZON")["XPATHS"].items():
+        # Each alternative on its own, since they are joined into a single union when used
+        for n, xpath in enumerate(xpaths, start=1):
+            selectors[f"XPATHS.{name}.{n}"] = xpath
+    selectors.update(
+        {
+            f"OFFER_PAGE.{name}": xpath
+            for name, xpath in {**OFFER_PAGE_SELECTORS, **OFFER_PAGE_FALLBACKS}.items()
+        }
+    )
+    selectors.update(
+        {f"CHECK_STOCK.{name}": xpath for name, xpath in CHECK_STOCK_XPATHS.items()}
+    )
+    selectors.update({name: xpath for xpath, name in PLACE_ORDER_BUTTONS.items()})
+    selectors["SUCCESS_ALERT"] = SUCCESS_ALERT_XPATH
+
+    files = get_benchmark_pages(pages)
+    profile = XPathProfile(selectors)
+    engine = engine.lower()
+    if engine in ("lxml", "both"):
+        log.info(
+            f"Profiling {len(selectors)} XPaths on {len(files)} page(s) with lxml..."
+        )
+        sources = []
+        for file in files:
+            with open(file, "rb") as f:
+                sources.append((file, f.read()))
+        profile.profile_lxml(sources, iterations)
+    if engine in ("chrome", "both"):
+        from chromedriver_py import binary_path
+        from selenium import webdriver
+
+        from utils.selenium_utils import get_chrome_preset
+
+        log.info(
+            f"Profiling {len(selectors)} XPaths on {len(files)} page(s) in Chrome..."
+        )
+        options = get_chrome_preset(
+            global_config.get_fairgame_config().get("chrome_presets")
+        ).build_options(headless)
+        try:
+            driver = webdriver.Chrome(executable_path=binary_path, options=options)
+        except Exception as e:
+            log.error(f"Unable to start Chrome, skipping it: {e}")
+        else:
+            try:
+                profile.profile_chrome(
+                    driver,
+                    [Path(file).resolve().as_uri() for file in files],
+                    iterations,
+                )
+            finally:
+                driver.quit()
+    for line in profile.report(slow_ms):
+        log.info(line)
+
+
+@click.command()
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+def check_watchlist(path):
+    """Loads a CSV or JSONL watchlist and reports its groups, load time and memory use"""
+    from stores.watchlist import load_watchlist
+
+    try:
+        watchlist = load_watchlist(path)
+    except ValueError as e:
+        log.error(e)
+        exit(1)
+    for group, asins in watchlist.groups():
+        reserve_min, reserve_max = watchlist.reserve(group)
+        log.info(
+            f"  Group {group + 1}: {len(asins)} ASINs between {reserve_min:.2f} and {reserve_max:.2f}"
+        )
+
+
+@click.command()
+@click.option(
+    "--since",
+    default=None,
+    help="Only count events from this time on: today, yesterday, YYYY-MM-DD or 'YYYY-MM-DD HH:MM:SS'",
+)
+@click.option(
+    "--until",
+    default=None,
+    help="Only count events before this time. A day on its own includes the whole day",
+)
+@click.option("--asin", "asins", multiple=True, help="ASIN to report, can be repeated")
+@click.option(
+    "--log-dir",
+    type=click.Path(exists=True, file_okay=False),
+    default=LOG_DIR,
+    show_default=True,
+    help="Folder with fairgame.log and its rotated, optionally compressed, copies",
+)
+def stats(since, until, asins, log_dir):
+    """Reports stock checks, offers, purchase attempts and checkout times per ASIN from the logs"""
+    from utils.log_stats import log_files, parse_time, read_logs
+
+    try:
+        since = parse_time(since)
+        until = parse_time(until, end=True)
+    except ValueError as e:
+        log.error(e)
+        exit(1)
+    paths = log_files(log_dir, LOG_FILE_NAME)
+    if not paths:
+        log.error(f"No logs found in {log_dir}")
+        exit(1)
+    log_stats = read_logs(paths, since, until)
+    for line in log_stats.report([asin.upper() for asin in asins]):
+        log.info(line)
+
+
+@click.command()
+@click.argument("archive", type=click.Path(exists=True))
+@click.option(
+    "--entry",
+    type=int,
+    multiple=True,
+    help="Only replay the given entries, numbered from 1. Can be given multiple times",
+)
+def replay_session(archive, entry):
+    """Replays a session recorded with --record-session, without a browser.  ARCHIVE can also be the
+    .parts folder of a recording that was cut short."""
+    from utils.session_recorder import ReplaySession
+
+    session = ReplaySession(archive)
+    entries = session.entries()
+    if entry:
+        entries = [e for n, e in enumerate(entries, start=1) if n in entry]
+    log.info(
+        f"Replaying {len(entries)} of {len(session.entries())} calls from {archive}"
+    )
+    notification_handler.enabled = False
+    notification_handler.sound_enabled = False
+    amzn_obj = Amazon(
+        notification_handler=notification_handler,
+        replay_session=session,
+        **session.options,
+    )
+    failures = 0
+    for n, (entry_record, exit_record, result, seconds) in enumerate(
+        session.replay_entries(amzn_obj, entries), start=1
+    ):
+        call = f"{entry_record['name']}({', '.join(map(str, entry_record['args']))})"
+        recorded_ms = exit_record["ms"] if exit_record else float("nan")
+        if isinstance(result, Exception):
+            outcome = f"{type(result).__name__}: {result}"
+            matched = (
+                exit_record is not None
+                and exit_record.get("error", [None])[0] == type(result).__name__
+            )
+        else:
+            outcome = repr(result)
+            matched = exit_record is not None and exit_record.get("result") == result
+        if not matched:
+            failures += 1
+        log.info(
+            f"{n:>4} {'OK  ' if matched else 'DIFF'} {call} -> {outcome} "
+            f"(recorded {recorded_ms:.0f} ms, replayed in {seconds * 1000:.0f} ms)"
+        )
+    log.info(f"{len(entries) - failures} of {len(entries)} calls replayed the same")
+    exit(1 if failures else 0)
+
+
+@click.group()
+def artifacts():
+    """Screenshots and page sources saved while running"""
+    pass
+
+
+def get_artifact_store():
+    from utils.artifact_store import ArtifactStore
+
+    return ArtifactStore.from_config(
+        global_config.get_fairgame_config().get("artifacts")
+    )
+
+
+@artifacts.command(name="list")
+@click.option("--kind", type=click.Choice(["screenshot", "html"]), default=None)
+@click.option(
+    "--page", default=None, help="Only artifacts whose page name contains this"
+)
+@click.option("--asin", default=None)
+def list_artifacts(kind, page, asin):
+    store = get_artifact_store()
+    found = store.find(kind=kind, page=page, asin=asin)
+    for artifact in found:
+        captured = datetime.fromtimestamp(artifact.time).strftime(TIME_FORMAT)
+        log.info(
+            f"{artifact.id:>6}  {captured}  {artifact.kind:<10}  {artifact.page:<24}  "
+            f"{artifact.asin or '-':<10}  {artifact.digest[:12]}"
+        )
+    log.info(
+        f"{len(found)} of {len(store.artifacts)} captures, "
+        f"{len(store.object_sizes)} files using {sizeof_fmt(store.total_size)}"
+    )
+
+
+@artifacts.command(name="extract")
+@click.argument("ids", type=int, nargs=-1)
+@click.option("--kind", type=click.Choice(["screenshot", "html"]), default=None)
+@click.option(
+    "--page", default=None, help="Only artifacts whose page name contains this"
+)
+@click.option("--asin", default=None)
+@click.option(
+    "--dest", default="extracted", show_default=True, help="Folder to extract to"
+)
+def extract_artifacts(ids, kind, page, asin, dest):
+    """Extracts the given artifact IDs, or all artifacts that match the filters"""
+    store = get_artifact_store()
+    found = store.find(kind=kind, page=page, asin=asin)
+    if ids:
+        found = [artifact for artifact in found if artifact.id in ids]
+    for artifact in found:
+        log.info(f"Extracted {store.extract(artifact, dest)}")
+    log.info(f"Extracted {len(found)} artifact(s) to {dest}")
+
+
 # Register Signal Handler for Interrupt
 signal(SIGINT, interrupt_handler)
+install_signal_handlers()
 
 main.add_command(amazon)
 main.add_command(test_notifications)
 main.add_command(show)
 main.add_command(find_endpoints)
 main.add_command(show_traceroutes)
+main.add_command(benchmark_driver)
+main.add_command(benchmark_presets)
+main.add_command(profile_xpaths)
+main.add_command(replay_session)
+main.add_command(check_watchlist)
+main.add_command(stats)
+main.add_command(artifacts)
 
 # Global scope stuff here
-if is_latest():
-    log.info(f"FairGame v{version}")
-elif version.is_prerelease:
-    log.warning(f"FairGame PRE-RELEASE v{version}")
-else:
-    log.warning(
-        f"You are running FairGame v{version}, but the most recent version is v{get_latest_version()}. "
-        f"Consider upgrading "
-    )
-
 global_config = GlobalConfig()
-notification_handler = NotificationHandler()
+notification_handler = NotificationHandler(
+    global_config.get_fairgame_config().get("notification_attachments")
+)
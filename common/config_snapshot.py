@@ -0,0 +1,135 @@
+#      FairGame - Automated Purchasing Program
+#      Copyright (C) 2021  Hari Nagarajan
+#
+#      This program is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      This program is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#      The author may be contacted through the project's GitHub, at:
+#      https://github.com/Hari-Nagarajan/fairgame
+
+import hashlib
+import marshal
+import os
+import sys
+from types import MappingProxyType
+
+from utils.logger import log
+
+# Bump when the compiled layout changes, so old caches are rebuilt
+CACHE_FORMAT = 1
+
+# Amazon settings that are lists of page titles or page text, looked up with `in`
+AMAZON_TEXT_LISTS = (
+    "SIGN_IN_TEXT",
+    "SIGN_IN_TITLES",
+    "CAPTCHA_PAGE_TITLES",
+    "HOME_PAGE_TITLES",
+    "SHOPPING_CART_TITLES",
+    "CHECKOUT_TITLES",
+    "ORDER_COMPLETE_TITLES",
+    "BUSINESS_PO_TITLES",
+    "DOGGO_TITLES",
+    "TWOFA_TITLES",
+    "PRIME_TITLES",
+    "OUT_OF_STOCK",
+    "NO_SELLERS",
+    "FREE_SHIPPING",
+    "ADDRESS_SELECT",
+)
+FAIRGAME_STRINGS = ("profile_name", "cookie_store_name")
+
+
+def get_cache_path(config_path):
+    directory, name = os.path.split(config_path)
+    return os.path.join(directory, f".{name}.cache")
+
+
+def load_config_snapshot(config_path):
+    """Returns the configuration as a read-only mapping of sections.  The compiled form is cached next to
+    the configuration file and reused for as long as the file's hash and modification time match.
+    """
+    with open(config_path, "rb") as f:
+        data = f.read()
+    key = (
+        CACHE_FORMAT,
+        tuple(sys.version_info[:2]),
+        hashlib.sha256(data).hexdigest(),
+        os.stat(config_path).st_mtime_ns,
+    )
+    cache_path = get_cache_path(config_path)
+    compiled = read_cache(cache_path, key)
+    if compiled is None:
+        log.debug(f"Compiling {config_path}")
+        compiled = compile_config(config_path)
+        write_cache(cache_path, key, compiled)
+    return freeze(compiled)
+
+
+def read_cache(cache_path, key):
+    try:
+        with open(cache_path, "rb") as f:
+            cached_key, compiled = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    return compiled if cached_key == key else None
+
+
+def write_cache(cache_path, key, compiled):
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            marshal.dump((key, compiled), f)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        log.debug(f"Unable to cache the compiled configuration: {e}")
+
+
+def compile_config(config_path):
+    """Parses and validates the configuration, converting it to plain types marshal can store"""
+    # See http://docs.red-dove.com/cfg/python.html#getting-started-with-cfg-in-python for how to use Config
+    from config import Config as Cfg
+
+    sections = Cfg(config_path).as_dict()
+    fairgame = sections.get("FAIRGAME")
+    amazon = sections.get("AMAZON")
+    if not isinstance(fairgame, dict) or not isinstance(amazon, dict):
+        raise ValueError(f"{config_path} must have FAIRGAME and AMAZON sections")
+    for name in FAIRGAME_STRINGS:
+        if name in fairgame and not isinstance(fairgame[name], str):
+            raise ValueError(f"FAIRGAME.{name} in {config_path} must be a string")
+
+    for name in AMAZON_TEXT_LISTS:
+        amazon[name] = frozenset(string_list(amazon.get(name, []), f"AMAZON.{name}"))
+    xpaths = amazon.get("XPATHS", {})
+    amazon["XPATHS"] = {
+        name: tuple(string_list(value, f"AMAZON.XPATHS.{name}"))
+        for name, value in xpaths.items()
+    }
+    amazon["JOINED_XPATHS"] = {
+        name: " | ".join(value) for name, value in amazon["XPATHS"].items()
+    }
+    return sections
+
+
+def string_list(value, name):
+    if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+        raise ValueError(f"{name} must be a list of strings")
+    return value
+
+
+def freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
@@ -18,9 +18,11 @@
 #      https://github.com/Hari-Nagarajan/fairgame
 
 import os
-from config import Config as Cfg
+from types import MappingProxyType
+
 import stdiomask
 
+from common.config_snapshot import load_config_snapshot
 from utils.encryption import load_encrypted_config, create_encrypted_config
 from utils.logger import log
 
@@ -53,9 +55,12 @@ class GlobalConfig:
     def __init__(self) -> None:
         super().__init__()
         log.info("Initializing Global configuration...")
-        # Load up the global configuration
-        # See http://docs.red-dove.com/cfg/python.html#getting-started-with-cfg-in-python for how to use Config
-        self.global_config = Cfg(GLOBAL_CONFIG_FILE)
+        # Load up the global configuration, compiled into read-only mappings
+        try:
+            self.global_config = load_config_snapshot(GLOBAL_CONFIG_FILE)
+        except ValueError as e:
+            log.error(f"Invalid configuration: {e}")
+            exit(1)
         self.fairgame_config = self.global_config.get("FAIRGAME")
         self.profile_path = None
         self.get_browser_profile_path()
@@ -63,11 +68,10 @@ class GlobalConfig:
     def get_amazon_config(self, encryption_pass=None):
         log.info("Initializing Amazon configuration...")
         # Load up all things Amazon
-        amazon_config = self.global_config["AMAZON"]
-        amazon_config["username"], amazon_config["password"] = get_credentials(
-            AMAZON_CREDENTIAL_FILE, encryption_pass
+        username, password = get_credentials(AMAZON_CREDENTIAL_FILE, encryption_pass)
+        return MappingProxyType(
+            {**self.global_config["AMAZON"], "username": username, "password": password}
         )
-        return amazon_config
 
     def get_fairgame_config(self):
         return self.fairgame_config
@@ -80,6 +84,14 @@ class GlobalConfig:
             )
         return self.profile_path
 
+    def get_cookie_store_path(self):
+        return os.path.join(
+            os.path.dirname(os.path.abspath("__file__")),
+            self.global_config["FAIRGAME"].get(
+                "cookie_store_name", ".profile-amz-cookies.json"
+            ),
+        )
+
     def get_property(self, property_name):
         if property_name not in self.global_config.keys():  # we don't want KeyError
             return None  # just return None if not found
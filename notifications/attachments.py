@@ -0,0 +1,131 @@
+#      FairGame - Automated Purchasing Program
+#      Copyright (C) 2021  Hari Nagarajan
+#
+#      This program is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      This program is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#      The author may be contacted through the project's GitHub, at:
+#      https://github.com/Hari-Nagarajan/fairgame
+
+import hashlib
+import os
+
+from utils import metrics
+from utils.logger import log
+
+DEFAULT_CACHE_PATH = "artifacts/notifications"
+DEFAULT_FORMAT = "jpeg"
+DEFAULT_MAX_WIDTH = 960
+DEFAULT_MAX_HEIGHT = 1080
+DEFAULT_QUALITY = 70
+# Transcoded files kept on disk, the oldest are removed beyond this
+MAX_CACHED_FILES = 200
+
+FORMATS = {"jpeg": ".jpg", "webp": ".webp"}
+
+
+class AttachmentTranscoder:
+    """Shrinks screenshots before they are uploaded with a notification.  The top of the page is kept when
+    it is taller than max_height, the result is scaled down to max_width and re-encoded as JPEG or WebP.
+    Each source file is transcoded once; the result is cached by the file's path and modification time.
+    """
+
+    def __init__(
+        self,
+        image_format=DEFAULT_FORMAT,
+        max_width=DEFAULT_MAX_WIDTH,
+        max_height=DEFAULT_MAX_HEIGHT,
+        quality=DEFAULT_QUALITY,
+        cache_path=DEFAULT_CACHE_PATH,
+    ):
+        if image_format not in FORMATS:
+            log.warning(
+                f"Unknown attachment format '{image_format}', using {DEFAULT_FORMAT}"
+            )
+            image_format = DEFAULT_FORMAT
+        self.image_format = image_format
+        self.max_width = max_width
+        self.max_height = max_height
+        self.quality = quality
+        self.cache_path = cache_path
+        self.variant = f"{max_width}x{max_height}q{quality}{FORMATS[image_format]}"
+        self.cache = {}
+
+    @classmethod
+    def from_config(cls, config=None):
+        config = config or {}
+        return cls(
+            image_format=config.get("format", DEFAULT_FORMAT),
+            max_width=config.get("max_width", DEFAULT_MAX_WIDTH),
+            max_height=config.get("max_height", DEFAULT_MAX_HEIGHT),
+            quality=config.get("quality", DEFAULT_QUALITY),
+            cache_path=config.get("cache_path", DEFAULT_CACHE_PATH),
+        )
+
+    def transcode(self, source):
+        """Returns the path of the transcoded copy of source, or source itself if it can't be transcoded"""
+        try:
+            mtime = os.stat(source).st_mtime_ns
+        except OSError:
+            return source
+        cached = self.cache.get(source)
+        if cached and cached[0] == mtime and os.path.exists(cached[1]):
+            metrics.notification_attachments.inc(result="cached")
+            return cached[1]
+        key = hashlib.sha1(f"{os.path.abspath(source)}:{mtime}".encode()).hexdigest()
+        output = os.path.join(self.cache_path, f"{key[:16]}-{self.variant}")
+        if os.path.exists(output):
+            result = "cached"
+        else:
+            try:
+                self.write(source, output)
+            except (ImportError, OSError, ValueError) as e:
+                log.debug(f"Sending {source} as is, unable to transcode it: {e}")
+                metrics.notification_attachments.inc(result="original")
+                return source
+            result = "transcoded"
+        metrics.notification_attachments.inc(result=result)
+        self.cache[source] = (mtime, output)
+        return output
+
+    def write(self, source, output):
+        from PIL import Image
+
+        with Image.open(source) as image:
+            image = image.convert("RGB")
+            if self.max_height and image.height > self.max_height:
+                image = image.crop((0, 0, image.width, self.max_height))
+            if self.max_width and image.width > self.max_width:
+                # Only the width is limited, the height follows the aspect ratio
+                image.thumbnail((self.max_width, image.height))
+            os.makedirs(self.cache_path, exist_ok=True)
+            temp_path = f"{output}.tmp"
+            image.save(
+                temp_path,
+                format=self.image_format.upper(),
+                quality=self.quality,
+                optimize=True,
+            )
+        os.replace(temp_path, output)
+        log.debug(
+            f"Transcoded {source} ({os.path.getsize(source)} bytes) to {output} ({os.path.getsize(output)} bytes)"
+        )
+        self.prune()
+
+    def prune(self):
+        entries = sorted(os.scandir(self.cache_path), key=lambda e: e.stat().st_mtime)
+        for entry in entries[:-MAX_CACHED_FILES]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
@@ -19,10 +19,13 @@
 
 import queue
 import threading
+import time
 from os import path
 from playsound import playsound
 import apprise
 
+from notifications.attachments import AttachmentTranscoder
+from utils import metrics
 from utils.logger import log
 
 TIME_FORMAT = "%Y-%m-%d @ %H:%M:%S"
@@ -31,13 +34,24 @@ APPRISE_CONFIG_PATH = "config/apprise.conf"
 NOTIFICATION_SOUND_PATH = "notifications/notify.mp3"
 PURCHASE_SOUND_PATH = "notifications/purchase.mp3"
 ALARM_SOUND_PATH = "notifications/alarm-frenzy-493.mp3"
+# Notifications waiting behind the current one before screenshots are left off to catch up
+DEFAULT_TEXT_ONLY_BACKLOG = 3
 
 
 class NotificationHandler:
     enabled_handlers = []
     sound_enabled = True
 
-    def __init__(self):
+    def __init__(self, attachment_config=None):
+        attachment_config = attachment_config or {}
+        self.transcoder = (
+            AttachmentTranscoder.from_config(attachment_config)
+            if attachment_config.get("enabled", True)
+            else None
+        )
+        self.text_only_backlog = attachment_config.get(
+            "text_only_backlog", DEFAULT_TEXT_ONLY_BACKLOG
+        )
         if path.exists(APPRISE_CONFIG_PATH):
             log.info(f"Initializing Apprise handler using: {APPRISE_CONFIG_PATH}")
             self.apb = apprise.Apprise()
@@ -49,6 +63,7 @@ class NotificationHandler:
                 self.enabled_handlers.append(server.service_name)
             self.apb.add(config)
             self.queue = queue.Queue()
+            metrics.notification_queue_depth.set_callback(self.queue.qsize)
             self.start_worker()
             self.enabled = True
         else:
@@ -58,20 +73,41 @@ class NotificationHandler:
 
     def send_notification(self, message, ss_name=[], **kwargs):
         if self.enabled:
-            self.queue.put((message, ss_name))
+            self.queue.put((message, ss_name, time.monotonic()))
 
     def message_sender(self):
         while True:
-            message, ss_name = self.queue.get()
+            message, ss_name, queued = self.queue.get()
 
             if ss_name:
-                self.apb.notify(body=message, attach=ss_name)
+                ss_name = self.prepare_attachments(ss_name)
+            if ss_name:
+                sent = self.apb.notify(body=message, attach=ss_name)
             else:
-                self.apb.notify(body=message)
+                sent = self.apb.notify(body=message)
+            metrics.notifications.inc(outcome="sent" if sent else "failed")
+            metrics.notification_delivery.observe(time.monotonic() - queued)
             self.queue.task_done()
 
+    def prepare_attachments(self, ss_name):
+        """Shrinks the screenshots for upload, or drops them when notifications are backing up so the
+        messages themselves arrive sooner"""
+        if self.text_only_backlog and self.queue.qsize() >= self.text_only_backlog:
+            log.debug(
+                f"{self.queue.qsize()} notifications waiting, sending without screenshots"
+            )
+            metrics.notification_attachments.inc(result="dropped")
+            return []
+        if self.transcoder is None:
+            return ss_name
+        if isinstance(ss_name, str):
+            return self.transcoder.transcode(ss_name)
+        return [self.transcoder.transcode(name) for name in ss_name]
+
     def start_worker(self):
-        threading.Thread(target=self.message_sender, daemon=True).start()
+        threading.Thread(
+            target=self.message_sender, name="notifications", daemon=True
+        ).start()
 
     def play_notify_sound(self):
         self.play(NOTIFICATION_SOUND_PATH)
@@ -19,7 +19,6 @@
 
 import fileinput
 import json
-import math
 import os
 import platform
 import time
@@ -45,10 +44,26 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 
 import utils.selenium_utils
+from stores.cart import clear_cart, read_cart
+from stores.checkout_coordinator import CheckoutCoordinator
+from stores.page_probe import PageProbe
+from stores.offers import Offer, OfferPolicy, evaluate_offers
+from stores.session import SessionKeeper
+from stores.watchlist import Watchlist, load_watchlist
 from utils import discord_presence as presence
+from utils import metrics
+from utils.artifact_store import ArtifactStore
 from utils.debugger import debug
+from utils.dom_waiter import wait_for_any
+from utils.element_cache import ElementCache
+from utils.browser_driver import create_browser
+from utils.browser_profile import EphemeralProfile
 from utils.logger import log
-from utils.selenium_utils import options, enable_headless
+from utils.page_timing import OfferUrlSelector, PageLoadTimer
+from utils.retry import Deadline, RetryPolicies
+from utils.session_recorder import SessionRecorder, replayable, unwrap
+from utils.tab_pipeline import TabPipeline
+from utils.selenium_utils import get_chrome_preset, process_tree_rss
 
 # Optional OFFER_URL is:     "OFFER_URL": "https://{domain}/dp/",
 AMAZON_URLS = {
@@ -57,6 +72,7 @@ AMAZON_URLS = {
     "OFFER_URL": "https://{domain}/dp/",
     "CART_URL": "https://{domain}/gp/cart/view.html",
     "ATC_URL": "https://{domain}/gp/aws/cart/add.html",
+    "ACCOUNT_URL": "https://{domain}/gp/css/order-history",
 }
 CHECKOUT_URL = "https://{domain}/gp/cart/desktop/go-to-checkout.html/ref=ox_sc_proceed?partialCheckoutCart=1&isToBeGiftWrappedBefore=0&proceedToRetailCheckout=Proceed+to+checkout&proceedToCheckout=1&cartInitiateId={cart_id}"
 
@@ -68,6 +84,36 @@ BUTTON_XPATHS = [
     '//*[@id="bottomSubmitOrderButtonId"]/span/input',
     '//*[@id="placeYourOrder"]/span/input',
 ]
+# Names for the page probe and the element cache
+PLACE_ORDER_BUTTONS = {
+    xpath: f"PLACE_ORDER_{n}" for n, xpath in enumerate(BUTTON_XPATHS, start=1)
+}
+# The alert shown on some order confirmation pages
+SUCCESS_ALERT_XPATH = '//*[@class="a-box a-alert a-alert-success"]'
+# What an offer page shows once it has loaded far enough to tell what it holds
+OFFER_PAGE_SELECTORS = {
+    "OFFERS": "//div[@id='aod-container']",
+    "UNAVAILABLE": "//div[@id='backInStock' or @id='outOfStock']",
+    "SHOW_ALL_OFFERS": "//span[@data-action='show-all-offers-display']",
+}
+# Only counts while none of OFFER_PAGE_SELECTORS match, a product page with an offers link also has one
+OFFER_PAGE_FALLBACKS = {
+    "ADD_TO_CART": "//input[@name='submit.add-to-cart']",
+}
+# The rest of what check_stock looks for, by name so profile-xpaths can time them
+CHECK_STOCK_XPATHS = {
+    "OPEN_OFFERS_LINK": "//span[@data-action='show-all-offers-display']//a",
+    # The flyout is inserted as the first div after the body tag while it loads
+    "LOADING_FLYOUT": "/html/body/div[@id='all-offers-display']",
+    "FLYOUT_ATC": "//div[@id='aod-pinned-offer' or @id='aod-offer']//input[@name='submit.addToCart']",
+    "BUY_BOX_ATC": "//div[@id='qualifiedBuybox']//input[@id='add-to-cart-button'] | //div[contains(translate(@id, 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'qualifiedbuybox')]//input[@id='add-to-cart-button']",
+    "NO_SELLERS": '//*[@id="olpOfferList"]/div/p',
+    "FLYOUT_PRICES": "//div[@id='aod-pinned-offer' or @id='aod-offer']//span[@class='a-price']//span[@class='a-offscreen']",
+    "BUY_BOX_PRICE": "//span[@id='price_inside_buybox']",
+    "FLYOUT_OFFERS": "//div[@id='aod-offer' and .//input[@name='submit.addToCart']] | "
+    "//div[@id='aod-pinned-offer' and .//input[@name='submit.addToCart']]",
+    "BUY_BOX_OFFER": "//form[@id='addToCart']",
+}
 # old xpaths, not sure these were needed for current work flow
 # '//*[@id="orderSummaryPrimaryActionBtn"]',
 # '//input[@name="placeYourOrder1"]',
@@ -80,19 +126,76 @@ BUTTON_XPATHS = [
 FREE_SHIPPING_PRICE = parse_price("0.00")
 
 DEFAULT_MAX_CHECKOUT_LOOPS = 20
-DEFAULT_MAX_PTC_TRIES = 3
-DEFAULT_MAX_PYO_TRIES = 3
-DEFAULT_MAX_ATC_TRIES = 3
 DEFAULT_MAX_WEIRD_PAGE_DELAY = 5
 DEFAULT_PAGE_WAIT_DELAY = 0.5  # also serves as minimum wait for randomized delays
 DEFAULT_MAX_PAGE_WAIT_DELAY = 1.0  # used for random page wait delay
 MAX_CHECKOUT_BUTTON_WAIT = 3  # integers only
 DEFAULT_REFRESH_DELAY = 3
 DEFAULT_MAX_TIMEOUT = 10
-DEFAULT_MAX_URL_FAIL = 5
+# Longest wait for a button to appear before the checkout handlers read the page again
+MAX_BUTTON_WATCH = 1.0
+# Larger groups are only counted when the configuration is shown
+MAX_LISTED_ASINS = 20
+
+# Options that change which driver commands are sent, saved with recorded sessions so a replay matches
+REPLAY_OPTIONS = (
+    "checkshipping",
+    "detailed",
+    "used",
+    "single_shot",
+    "no_screenshots",
+    "slow_mode",
+    "no_image",
+    "log_stock_check",
+    "shipping_bypass",
+    "alt_offers",
+    "wait_on_captcha_fail",
+    "alt_checkout",
+    "early_stop",
+)
 
 amazon_config = {}
 
+# Settings a checkout session takes over from the stock check session.  None of them change once the stock
+# checks are running.  The notification handler queues its work, and the artifact store locks its writes.
+CHECKOUT_SESSION_SETTINGS = (
+    "notification_handler",
+    "checkshipping",
+    "button_xpaths",
+    "detailed",
+    "used",
+    "condition",
+    "take_screenshots",
+    "start_time",
+    "driver_backend",
+    "refresh_delay",
+    "testing",
+    "slow_mode",
+    "headless",
+    "no_image",
+    "log_stock_check",
+    "shipping_bypass",
+    "alt_offers",
+    "wait_on_captcha_fail",
+    "alt_checkout",
+    "clear_cart",
+    "chrome_preset",
+    "profile_path",
+    "artifacts",
+    "amazon_website",
+    "ACTIVE_OFFER_URL",
+)
+
+
+def create_page_probe():
+    return PageProbe(
+        {
+            **amazon_config["JOINED_XPATHS"],
+            "SUCCESS_ALERT": SUCCESS_ALERT_XPATH,
+            **{name: xpath for xpath, name in PLACE_ORDER_BUTTONS.items()},
+        }
+    )
+
 
 class Amazon:
     def __init__(
@@ -111,13 +214,25 @@ class Amazon:
         log_stock_check=False,
         shipping_bypass=False,
         alt_offers=False,
+        adaptive_offers=False,
         wait_on_captcha_fail=False,
         alt_checkout=False,
+        early_stop=False,
+        ram_profile=False,
+        driver_backend="selenium",
+        prefetch=False,
+        clear_cart=None,
+        watchlist=None,
+        parallel_checkout=False,
+        chrome_preset=None,
+        record_session=False,
+        replay_session=None,
     ):
+        session_options = {
+            name: value for name, value in locals().items() if name in REPLAY_OPTIONS
+        }
         self.notification_handler = notification_handler
-        self.asin_list = []
-        self.reserve_min = []
-        self.reserve_max = []
+        self.watchlist = Watchlist()
         self.checkshipping = checkshipping
         self.button_xpaths = BUTTON_XPATHS
         self.detailed = detailed
@@ -133,11 +248,17 @@ class Amazon:
         self.start_time_atc = 0
         self.end_time_atc = 0
         self.webdriver_child_pids = []
+        self.webdriver_pid = None
+        self.current_asin = None
         self.driver = None
+        self.browser = None
+        self.driver_backend = driver_backend
+        self.ram_profile = None
+        self.recorder = None
+        self.replay = replay_session
         self.refresh_delay = DEFAULT_REFRESH_DELAY
         self.testing = False
         self.slow_mode = slow_mode
-        self.setup_driver = True
         self.headless = headless
         self.no_image = no_image
         self.log_stock_check = log_stock_check
@@ -146,14 +267,67 @@ class Amazon:
         self.alt_offers = alt_offers
         self.wait_on_captcha_fail = wait_on_captcha_fail
         self.alt_checkout = alt_checkout
+        self.parallel_checkout = parallel_checkout and not (
+            record_session or replay_session
+        )
+        if parallel_checkout and not self.parallel_checkout:
+            log.warning("Parallel checkout can't be recorded or replayed, ignoring it.")
+        self.coordinator = None
+        self.clear_cart = clear_cart
+        # Early stop relies on the 'none' page load strategy, where driver.get() returns immediately
+        self.early_stop = early_stop and not slow_mode
+        if early_stop and slow_mode:
+            log.warning("Early page stop is not available in slow mode, ignoring it.")
+        self.page_timer = PageLoadTimer() if self.early_stop else None
+        # The offer URL variant is picked per ASIN from how fast each one gets to a decision
+        self.adaptive_offers = adaptive_offers and not alt_offers
+        if adaptive_offers and alt_offers:
+            log.warning(
+                "Adaptive offer URLs don't apply when alternate offers are forced, ignoring it."
+            )
+        if self.adaptive_offers and (record_session or replay_session):
+            log.warning(
+                "Adaptive offer URLs can't be recorded or replayed, ignoring it."
+            )
+            self.adaptive_offers = False
+        self.offer_urls = None
+        # Prefetching needs driver.get() to return right away, and the CDP backend is bound to a single tab
+        self.prefetch = prefetch and not slow_mode and driver_backend == "selenium"
+        if prefetch and not self.prefetch:
+            log.warning(
+                "Prefetching needs the selenium driver backend without slow mode, ignoring it."
+            )
+        if self.prefetch and (record_session or replay_session):
+            log.warning("Prefetching can't be recorded or replayed, ignoring it.")
+            self.prefetch = False
+        self.pipeline = None
+        self.next_asin = None
+        self.offer_load_started = None
+        # Handles found on the current page, until it is replaced
+        self.elements = ElementCache()
 
-        presence.enabled = not disable_presence
+        presence.enabled = not disable_presence and not replay_session
 
         global amazon_config
         from cli.cli import global_config
 
         amazon_config = global_config.get_amazon_config(encryption_pass)
+        self.retry_policies = RetryPolicies(amazon_config.get("RETRY"))
+        self.driver_breaker = self.retry_policies.circuit_breaker("Chrome restart")
+        self.session_keeper = SessionKeeper.from_config(amazon_config.get("SESSION"))
+        self.page_probe = create_page_probe()
+        try:
+            self.chrome_preset = get_chrome_preset(
+                global_config.get_fairgame_config().get("chrome_presets"),
+                chrome_preset,
+            )
+        except ValueError as e:
+            log.error(e)
+            exit(0)
         self.profile_path = global_config.get_browser_profile_path()
+        if ram_profile:
+            self.ram_profile = EphemeralProfile(global_config.get_cookie_store_path())
+            self.profile_path = self.ram_profile.materialize()
 
         try:
             presence.start_presence()
@@ -161,41 +335,24 @@ class Amazon:
             log.error("Discord presence failed to load")
             presence.enabled = False
 
-        # Create necessary sub-directories if they don't exist
-        if not os.path.exists("screenshots"):
-            try:
-                os.makedirs("screenshots")
-            except:
-                raise
-
-        if not os.path.exists("html_saves"):
-            try:
-                os.makedirs("html_saves")
-            except:
-                raise
+        # Screenshots and page sources
+        self.artifacts = ArtifactStore.from_config(
+            global_config.get_fairgame_config().get("artifacts")
+        )
 
         if os.path.exists(AUTOBUY_CONFIG_PATH):
             with open(AUTOBUY_CONFIG_PATH) as json_file:
                 try:
                     config = json.load(json_file)
-                    self.asin_groups = int(config["asin_groups"])
                     self.amazon_website = config.get(
                         "amazon_website", "smile.amazon.com"
                     )
-                    for x in range(self.asin_groups):
-                        if float(config[f"reserve_min_{x + 1}"]) > float(
-                            config[f"reserve_max_{x + 1}"]
-                        ):
-                            log.error("Minimum price must be <= maximum price")
-                            log.error(
-                                f"    {float(config[f'reserve_min_{x + 1}']):.2f} > {float(config[f'reserve_max_{x + 1}']):.2f}"
-                            )
-                            exit(0)
-
-                        self.asin_list.append(config[f"asin_list_{x + 1}"])
-                        self.reserve_min.append(float(config[f"reserve_min_{x + 1}"]))
-                        self.reserve_max.append(float(config[f"reserve_max_{x + 1}"]))
-
+                    watchlist = watchlist or config.get("watchlist")
+                    if not watchlist:
+                        self.watchlist = Watchlist.from_amazon_config(config)
+                except ValueError as e:
+                    log.error(f"amazon_config.json file not formatted properly: {e}")
+                    exit(0)
                 except Exception as e:
                     log.error(f"{e} is missing")
                     log.error(
@@ -208,6 +365,32 @@ class Amazon:
             )
             exit(0)
 
+        if watchlist:
+            try:
+                self.watchlist = load_watchlist(watchlist)
+            except (OSError, ValueError) as e:
+                log.error(f"Unable to load the watchlist: {e}")
+                exit(0)
+
+        if self.replay:
+            # Replayed commands must go to the same domain as the recorded ones
+            self.amazon_website = (
+                self.replay.meta.get("amazon_website") or self.amazon_website
+            )
+            # Normally set up by run(), before the stock check and checkout loops
+            self.ptc_retry = self.retry_policies.start("proceed_to_checkout")
+            self.pyo_retry = self.retry_policies.start("place_order")
+            self.try_to_checkout = True
+            self.great_success = False
+        elif record_session:
+            if not os.path.exists("sessions"):
+                os.makedirs("sessions")
+            self.recorder = SessionRecorder(
+                os.path.join("sessions", get_timestamp_filename("session", "zip")),
+                options=session_options,
+                amazon_website=self.amazon_website,
+            )
+
         if not self.create_driver(self.profile_path):
             exit(1)
 
@@ -218,6 +401,10 @@ class Amazon:
             self.ACTIVE_OFFER_URL = AMAZON_URLS["ALT_OFFER_URL"]
         else:
             self.ACTIVE_OFFER_URL = AMAZON_URLS["OFFER_URL"]
+        if self.adaptive_offers:
+            self.offer_urls = OfferUrlSelector(("OFFER_URL", "ALT_OFFER_URL"))
+            if metrics.enabled():
+                metrics.offer_url_cost.set_callback(self.offer_urls.metric_samples)
 
     def run(self, delay=DEFAULT_REFRESH_DELAY, test=False):
         self.testing = test
@@ -225,6 +412,7 @@ class Amazon:
         self.show_config()
 
         log.info("Waiting for home page.")
+        home_page_retry = self.retry_policies.start("home_page")
         while True:
             try:
                 self.get_page(url=AMAZON_URLS["BASE_URL"])
@@ -235,82 +423,221 @@ class Amazon:
                     + AMAZON_URLS["BASE_URL"]
                     + ", if the address is right, there might be a network outage..."
                 )
-                time.sleep(3)
-                pass
-        cart_quantity = self.get_cart_count()
-        if cart_quantity > 0:
-            log.warning(f"Found {cart_quantity} item(s) in your cart.")
-            log.info("Delete all item(s) in cart before starting bot.")
-            self.driver.get(AMAZON_URLS["CART_URL"])
-            log.info("Exiting in 30 seconds...")
-            time.sleep(30)
-            return
+                if not home_page_retry.backoff():
+                    raise RuntimeError("Failed to load the home page")
         self.handle_startup()
         if not self.is_logged_in():
             self.login()
+        if self.ram_profile:
+            self.ram_profile.sync(self.driver)
+        reason = self.session_keeper.check(self.driver)
+        if reason:
+            log.warning(f"Login looks incomplete: {reason}")
         self.notification_handler.play_notify_sound()
         self.send_notification(
             "Bot Logged in and Starting up", "Start-Up", self.take_screenshots
         )
-        if self.get_cart_count() > 0:
-            log.warning(f"Found {cart_quantity} item(s) in your cart.")
-            log.info("Delete all item(s) in cart before starting bot.")
-            self.driver.get(AMAZON_URLS["CART_URL"])
-            log.info("Exiting in 30 seconds...")
-            time.sleep(30)
+        # A cart from before logging in is merged into the account's, so one check after login covers both
+        if not self.cart_preflight():
             return
 
         continue_stock_check = True
 
         log.info("Checking stock for items.")
 
+        if self.parallel_checkout:
+            self.coordinator = CheckoutCoordinator(
+                self.watchlist,
+                self.create_checkout_session,
+                test,
+                single_shot=self.single_shot,
+            )
+
         while continue_stock_check:
             self.unknown_title_notification_sent = False
             asin = self.run_asins(delay)
+            if asin is None:
+                # every group has been bought or given up on
+                break
             # New normal (buy it now)
             if not self.alt_checkout:
-                self.remove_asin_list(asin)
-                if not self.asin_list or self.single_shot:
+                self.watchlist.remove_group(asin)
+                if not self.watchlist or self.single_shot:
                     continue_stock_check = False
+            elif self.coordinator and self.coordinator.hand_off(asin):
+                # found something in stock and under reserve, it is checked out on its own session while
+                # the other groups are still checked
+                continue
             else:
                 # found something in stock and under reserve
-                # initialize loop limiter variables
-                self.try_to_checkout = True
-                self.checkout_retry = 0
-                self.order_retry = 0
-                loop_iterations = 0
-                self.great_success = False
-                while self.try_to_checkout:
-                    try:
-                        self.navigate_pages(test)
-                    # if for some reason page transitions in the middle of checking elements, don't break the program
-                    except sel_exceptions.StaleElementReferenceException:
-                        pass
-                    # if successful after running navigate pages, remove the asin_list from the list
-                    if (
-                        not self.try_to_checkout
-                        and not self.single_shot
-                        and self.great_success
-                    ):
-                        self.remove_asin_list(asin)
-                    # checkout loop limiters
-                    elif self.checkout_retry > DEFAULT_MAX_PTC_TRIES:
-                        self.try_to_checkout = False
-                        self.fail_to_checkout_note()
-                    elif self.order_retry > DEFAULT_MAX_PYO_TRIES:
-                        self.try_to_checkout = False
-                        self.fail_to_checkout_note()
-                    loop_iterations += 1
-                    if loop_iterations > DEFAULT_MAX_CHECKOUT_LOOPS:
-                        self.fail_to_checkout_note()
-                        self.try_to_checkout = False
+                if self.checkout(test) and not self.single_shot:
+                    # if successful, stop checking the ASIN's group
+                    self.watchlist.remove_group(asin)
                 # if no items left it list, let loop end
-                if not self.asin_list:
+                if not self.watchlist:
                     continue_stock_check = False
+        if self.coordinator:
+            self.coordinator.close()
+        if self.page_timer:
+            self.page_timer.log_summary()
+        if self.offer_urls:
+            self.offer_urls.log_summary()
+        log.info(self.elements.summary())
         runtime = time.time() - self.start_time
         log.info(f"FairGame bot ran for {runtime} seconds.")
         time.sleep(10)  # add a delay to shut stuff done
 
+    def checkout(self, test, start_url=None):
+        """Works through the checkout pages until the order is placed or given up on.  Returns True if the
+        order was placed, or would have been when testing."""
+        if start_url:
+            self.get_page(start_url)
+        # initialize loop limiter variables
+        self.try_to_checkout = True
+        self.ptc_retry = self.retry_policies.start("proceed_to_checkout")
+        self.pyo_retry = self.retry_policies.start("place_order")
+        loop_iterations = 0
+        self.great_success = False
+        while self.try_to_checkout:
+            try:
+                self.navigate_pages(test)
+            # if for some reason page transitions in the middle of checking elements, don't break the program
+            except sel_exceptions.StaleElementReferenceException:
+                pass
+            if not self.try_to_checkout and self.great_success:
+                break
+            # checkout loop limiters
+            elif self.ptc_retry.exhausted():
+                self.try_to_checkout = False
+                self.fail_to_checkout_note()
+            elif self.pyo_retry.exhausted():
+                self.try_to_checkout = False
+                self.fail_to_checkout_note()
+            loop_iterations += 1
+            if loop_iterations > DEFAULT_MAX_CHECKOUT_LOOPS:
+                self.fail_to_checkout_note()
+                self.try_to_checkout = False
+        return self.great_success
+
+    def create_checkout_session(self):
+        """Returns a bot with the same settings that drives a new tab of the same Chrome through a WebDriver
+        session of its own, so it shares the login and cart while the stock checks carry on in the first tab.
+        Opening the tab goes through this bot's driver, so it must be called from the stock check thread.
+        """
+        handles = set(self.driver.window_handles)
+        self.driver.execute_script("window.open('about:blank', '_blank');")
+        handle = next(h for h in self.driver.window_handles if h not in handles)
+        checkout_options = webdriver.ChromeOptions()
+        checkout_options.add_experimental_option(
+            "debuggerAddress",
+            self.driver.capabilities["goog:chromeOptions"]["debuggerAddress"],
+        )
+        if not self.slow_mode:
+            checkout_options.set_capability("pageLoadStrategy", "none")
+        driver = webdriver.Chrome(executable_path=binary_path, options=checkout_options)
+        driver.switch_to.window(handle)
+        # Built from the settings rather than copied, so nothing the stock checks change is shared
+        session = object.__new__(type(self))
+        for name in CHECKOUT_SESSION_SETTINGS:
+            setattr(session, name, getattr(self, name))
+        session.driver = driver
+        session.browser = create_browser(
+            "selenium",
+            driver,
+            page_load_strategy="normal" if self.slow_mode else "none",
+        )
+        session.wait = WebDriverWait(driver, 10)
+        session.retry_policies = RetryPolicies(amazon_config.get("RETRY"))
+        session.driver_breaker = session.retry_policies.circuit_breaker(
+            "Chrome restart"
+        )
+        session.session_keeper = SessionKeeper.from_config(amazon_config.get("SESSION"))
+        session.page_probe = create_page_probe()
+        session.elements = ElementCache()
+        # Only the stock check session searches, the checkout session works from the cart
+        session.watchlist = Watchlist()
+        session.single_shot = False
+        session.current_asin = self.current_asin
+        session.start_time_check = 0
+        session.start_time_atc = 0
+        session.end_time_atc = 0
+        session.next_asin = None
+        session.offer_load_started = None
+        session.unknown_title_notification_sent = False
+        session.parallel_checkout = False
+        session.coordinator = None
+        session.early_stop = False
+        session.page_timer = None
+        session.adaptive_offers = False
+        session.offer_urls = None
+        session.prefetch = False
+        session.pipeline = None
+        # The profile, the recording and the Chrome processes stay with the stock check session
+        session.ram_profile = None
+        session.recorder = None
+        session.replay = None
+        session.webdriver_pid = None
+        session.webdriver_child_pids = []
+        log.info("Started the checkout session")
+        return session
+
+    def checkout_cart(self, test):
+        """Checks out from the cart, where the stock checks left the item, on the checkout session"""
+        return self.checkout(test, start_url=AMAZON_URLS["CART_URL"])
+
+    def close_checkout_session(self):
+        try:
+            # Closes the tab and detaches, the browser belongs to the stock check session
+            self.driver.close()
+            self.driver.quit()
+        except sel_exceptions.WebDriverException as e:
+            log.debug(f"Unable to close the checkout session: {e}")
+        self.driver = None
+        self.browser = None
+
+    def cart_preflight(self):
+        """Makes sure the cart is empty before checking stock, since checking out would also buy whatever
+        was left in it.  Returns False if the bot can't start."""
+        start_time = time.perf_counter()
+        cart_quantity = self.get_cart_count()
+        if not cart_quantity or cart_quantity < 0:
+            log.info(
+                f"Cart preflight took {time.perf_counter() - start_time:.2f} seconds, the cart is empty"
+            )
+            return True
+        self.get_page(AMAZON_URLS["CART_URL"])
+        lines = remaining = None
+        try:
+            lines = remaining = read_cart(self.driver)
+            if lines and self.clear_cart:
+                action = (
+                    "Deleting" if self.clear_cart == "delete" else "Saving for later"
+                )
+                log.info(f"{action} {len(lines)} item(s) already in the cart")
+                remaining = clear_cart(self.driver, self.clear_cart)
+        except sel_exceptions.WebDriverException as e:
+            log.debug(f"Unable to read the cart: {e}")
+        elapsed = time.perf_counter() - start_time
+        if lines and not remaining:
+            log.info(
+                f"Cart preflight took {elapsed:.2f} seconds, the cart has been cleared"
+            )
+            return True
+        if remaining:
+            log.warning(f"Found {len(remaining)} item(s) in your cart:")
+            for line in remaining:
+                log.warning(f"    {line}")
+            if not self.clear_cart:
+                log.info(
+                    "Empty the cart before starting the bot, or use --clear-cart to have the bot do it."
+                )
+        else:
+            log.warning(
+                f"The cart count shows {cart_quantity} item(s), but FairGame couldn't read the cart."
+            )
+        log.info(f"Cart preflight took {elapsed:.2f} seconds")
+        return False
+
     def fail_to_checkout_note(self):
         log.info(
             "It's likely that the product went out of stock before FairGame could checkout."
@@ -356,22 +683,18 @@ class Amazon:
     def login(self):
         log.info("Email")
         email_field = None
-        password_field = None
-        timeout = self.get_timeout()
-        while True:
-            try:
-                email_field = self.driver.find_element_by_xpath('//*[@id="ap_email"]')
-                break
-            except sel_exceptions.NoSuchElementException:
-                try:
-                    password_field = self.driver.find_element_by_xpath(
-                        '//*[@id="ap_password"]'
-                    )
-                    break
-                except sel_exceptions.NoSuchElementException:
-                    pass
-            if time.time() > timeout:
-                break
+        try:
+            # Amazon skips the email step when it remembers the account
+            WebDriverWait(self.driver, timeout=DEFAULT_MAX_TIMEOUT).until(
+                lambda d: d.find_elements_by_xpath('//*[@id="ap_email"]')
+                or d.find_elements_by_xpath('//*[@id="ap_password"]')
+            )
+            email_field = self.driver.find_element_by_xpath('//*[@id="ap_email"]')
+        except (
+            sel_exceptions.TimeoutException,
+            sel_exceptions.NoSuchElementException,
+        ):
+            pass
 
         if email_field:
             try:
@@ -391,7 +714,7 @@ class Amazon:
             log.error("One Time Password input required... pausing for user input")
             try:
                 WebDriverWait(self.driver, timeout=300).until(
-                    lambda d: "/ap/" not in d.driver.current_url
+                    lambda d: "/ap/" not in d.current_url
                 )
             except sel_exceptions.TimeoutException:
                 log.error("User did not solve One Time Password prompt in time.")
@@ -411,18 +734,11 @@ class Amazon:
 
         log.info("Password")
         password_field = None
-        timeout = self.get_timeout()
         current_page = self.driver.title
-        while True:
-            try:
-                password_field = self.driver.find_element_by_xpath(
-                    '//*[@id="ap_password"]'
-                )
-                break
-            except sel_exceptions.NoSuchElementException:
-                pass
-            if time.time() > timeout:
-                break
+        if wait_for_element_by_xpath(
+            self.driver, '//*[@id="ap_password"]', timeout=DEFAULT_MAX_TIMEOUT
+        ):
+            password_field = self.driver.find_element_by_xpath('//*[@id="ap_password"]')
 
         captcha_entry = []
         if password_field:
@@ -447,48 +763,145 @@ class Amazon:
                 time.sleep(2)
         log.info(f'Logged in as {amazon_config["username"]}')
 
+    def keep_session_alive(self):
+        """Checks the sign-in cookies and the account menu of the page that is already loaded, and logs in
+        again now if the session is about to run out, rather than in the middle of a checkout
+        """
+        reason = self.session_keeper.check(self.driver)
+        if not reason:
+            account_menu = self.browser.find_elements_by_xpath(
+                '//*[@id="nav-link-accountList"]'
+            )
+            if account_menu and any(
+                sign_in in account_menu[0].text
+                for sign_in in amazon_config["SIGN_IN_TEXT"]
+            ):
+                reason = "the account menu shows a sign in link"
+        if reason:
+            self.refresh_session(reason)
+
+    def refresh_session(self, reason):
+        log.info(f"Refreshing the Amazon login: {reason}")
+        start_time = time.time()
+        # Pages in the account section send you to the sign in page if the login is no longer good enough
+        self.get_page(AMAZON_URLS["ACCOUNT_URL"])
+        if self.browser.title in amazon_config["SIGN_IN_TITLES"]:
+            self.login()
+        self.session_keeper.refreshes += 1
+        reason = self.session_keeper.check(self.driver)
+        if reason:
+            log.warning(
+                f"Login is still not fresh ({reason}), will try again in {self.session_keeper.check_interval} seconds"
+            )
+        elif self.ram_profile:
+            self.ram_profile.sync(self.driver)
+        log.info(f"Login refresh took {time.time() - start_time:.1f} seconds")
+
     @debug
     def run_asins(self, delay):
         found_asin = False
         while not found_asin:
-            for i in range(len(self.asin_list)):
-                for asin in self.asin_list[i]:
-                    self.start_time_check = time.time()
-                    if self.log_stock_check:
-                        log.info(f"Checking ASIN: {asin}.")
-                    if self.check_stock(asin, self.reserve_min[i], self.reserve_max[i]):
-                        return asin
-                    # log.info(f"check time took {time.time()-start_time} seconds")
+            if self.coordinator:
+                # Groups in the cart are left alone until their checkout is over
+                busy = self.coordinator.busy_groups()
+                self.coordinator.apply_orders()
+            if not self.watchlist:
+                return None
+            schedule = self.watchlist.schedule()
+            if self.coordinator:
+                schedule = [
+                    (group, asin) for group, asin in schedule if group not in busy
+                ]
+                if not schedule:
+                    time.sleep(delay)
+                    continue
+            for n, (group, asin) in enumerate(schedule):
+                if self.coordinator and self.coordinator.has_orders():
+                    # A checkout finished, the schedule may include groups that are bought now
+                    break
+                self.start_time_check = time.time()
+                self.next_asin = schedule[(n + 1) % len(schedule)][1]
+                self.current_asin = asin
+                if self.log_stock_check:
+                    log.info(f"Checking ASIN: {asin}.")
+                else:
+                    # Still in the log file, for the stats command
+                    log.debug(f"Checking ASIN: {asin}.")
+                metrics.record_stock_check(asin)
+                in_stock = self.check_stock(asin, *self.watchlist.reserve(group))
+                if self.offer_urls:
+                    # A check that ended before its offers were decided counts against its URL variant
+                    self.offer_urls.finish()
+                if in_stock:
+                    return asin
+                if self.log_stock_check and self.page_timer:
+                    log.info(self.page_timer.summary(asin))
+                if self.log_stock_check and self.offer_urls:
+                    log.info(f"{asin}: {self.offer_urls.summary(asin)}")
+                if self.log_stock_check and self.pipeline:
+                    log.info(self.pipeline.summary())
+                if self.ram_profile:
+                    self.ram_profile.maybe_sync(self.driver)
+                if self.session_keeper.due():
+                    self.keep_session_alive()
+                # log.info(f"check time took {time.time()-start_time} seconds")
+                if self.pipeline:
+                    # Start loading the next ASIN so it is ready when the delay is over
+                    lead_time = self.pipeline.lead_time(delay)
+                    time.sleep(delay - lead_time)
+                    self.pipeline.prefetch(self.offer_url(self.next_asin))
+                    time.sleep(lead_time)
+                else:
                     time.sleep(delay)
 
+    def offer_url(self, asin, variant=None):
+        if variant is None and self.offer_urls:
+            variant = self.offer_urls.choose(asin)
+        base_url = AMAZON_URLS[variant] if variant else self.ACTIVE_OFFER_URL
+        return furl(base_url + asin).url
+
     @debug
-    def check_stock(self, asin, reserve_min, reserve_max, retry=0):
-        if retry > DEFAULT_MAX_ATC_TRIES:
+    @replayable
+    def check_stock(self, asin, reserve_min, reserve_max, retry=None):
+        if retry is None:
+            retry = self.retry_policies.start("check_stock")
+        elif not retry.backoff():
             log.info("max add to cart retries hit, returning to asin check")
             return False
         # load page
-        f = furl(self.ACTIVE_OFFER_URL + asin)
-        fail_counter = 0
+        variant = self.offer_urls.start(asin) if self.offer_urls else None
+        offer_url = self.offer_url(asin, variant)
+        page_retry = self.retry_policies.start("offer_page")
         presence.searching_update()
+        self.offer_load_started = time.perf_counter()
 
         # handles initial page load only
         while True:
             try:
-                self.get_page(f.url)
-                log.debug(f"Initial page title {self.driver.title}")
-                log.debug(f"        page url: {self.driver.current_url}")
-                if self.driver.title in amazon_config["CAPTCHA_PAGE_TITLES"]:
+                if not (self.pipeline and self.pipeline.activate(offer_url)):
+                    self.get_page(offer_url)
+                log.debug(f"Initial page title {self.browser.title}")
+                log.debug(f"        page url: {self.browser.current_url}")
+                if self.browser.title in amazon_config["CAPTCHA_PAGE_TITLES"]:
                     self.handle_captcha()
+                self.driver_breaker.record_success()
                 break
             except Exception:
-                fail_counter += 1
-                log.error(f"Failed to load the offer URL {fail_counter} times.")
-                if fail_counter < DEFAULT_MAX_URL_FAIL:
+                log.error(
+                    f"Failed to load the offer URL {page_retry.attempts + 1} times."
+                )
+                if page_retry.backoff():
                     log.error(
-                        f"WebDriver will restart if it fails {DEFAULT_MAX_URL_FAIL} times. Retrying now..."
+                        "WebDriver will restart if it keeps failing. Retrying now..."
                     )
-                    time.sleep(3)
                 else:
+                    if not self.driver_breaker.allow():
+                        log.error(
+                            "Chrome was restarted too often without recovering, skipping the restart for now"
+                        )
+                        return False
+                    self.driver_breaker.record_failure()
+                    metrics.driver_restarts.inc()
                     log.info(
                         "Attempting to delete and recreate current chrome instance"
                     )
@@ -523,46 +936,45 @@ class Amazon:
             # Sanity check to see if we have any offers
             try:
                 # Wait for the page to load before determining what's in it by looking for the footer
-                offer_container = WebDriverWait(
-                    self.driver, timeout=DEFAULT_MAX_TIMEOUT
-                ).until(
-                    lambda d: d.find_element_by_xpath(
-                        "//div[@id='aod-container'] | "
-                        "//div[@id='backInStock' or @id='outOfStock'] |"
-                        "//span[@data-action='show-all-offers-display'] | "
-                        "//input[@name='submit.add-to-cart' and not(//span[@data-action='show-all-offers-display'])]"
-                    )
+                offer_page = wait_for_any(
+                    self.browser,
+                    OFFER_PAGE_SELECTORS,
+                    DEFAULT_MAX_TIMEOUT,
+                    fallbacks=OFFER_PAGE_FALLBACKS,
                 )
                 offer_count = []
-                offer_id = offer_container.get_attribute("id")
-                if offer_id == "outOfStock" or offer_id == "backInStock":
+                if offer_page == "ADD_TO_CART":
+                    # Only its label tells the Buy Box button apart from other add to cart inputs
+                    offer_container = self.browser.find_element_by_xpath(
+                        OFFER_PAGE_FALLBACKS["ADD_TO_CART"]
+                    )
+                if offer_page == "UNAVAILABLE":
+                    self.offer_page_decided(asin)
                     # No dice... Early out and move on
                     log.info("Item is currently unavailable.  Moving on...")
                     return False
-                elif offer_id == "aod-container":
+                elif offer_page == "OFFERS":
+                    self.offer_page_decided(asin)
                     # Offer Flyout or Ajax call ... count the 'aod-offer' divs that we 'see'
-                    offer_count = self.driver.find_elements_by_xpath(
-                        "//div[@id='aod-pinned-offer' or @id='aod-offer']//input[@name='submit.addToCart']"
+                    offer_count = self.browser.find_elements_by_xpath(
+                        CHECK_STOCK_XPATHS["FLYOUT_ATC"]
                     )
-                elif (
-                    offer_container.get_attribute("data-action")
-                    == "show-all-offers-display"
-                ):
+                elif offer_page == "SHOW_ALL_OFFERS":
                     # PDP Page
                     # Find the offers link first, just to burn some cycles in case the flyout is loading
                     open_offers_link = None
                     try:
                         open_offers_link: WebElement = (
-                            self.driver.find_element_by_xpath(
-                                "//span[@data-action='show-all-offers-display']//a"
+                            self.browser.find_element_by_xpath(
+                                CHECK_STOCK_XPATHS["OPEN_OFFERS_LINK"]
                             )
                         )
                     except sel_exceptions.NoSuchElementException:
                         pass
 
                     # Now check to see if we're already loading the flyout...
-                    flyout = self.driver.find_elements_by_xpath(
-                        "/html/body/div[@id='all-offers-display']"
+                    flyout = self.browser.find_elements_by_xpath(
+                        CHECK_STOCK_XPATHS["LOADING_FLYOUT"]
                     )
                     if flyout:
                         # This means we have a flyout already loading, as it gets inserted as the first
@@ -571,10 +983,10 @@ class Amazon:
                         log.debug(
                             "Found a loading flyout div.  Waiting for offers to load..."
                         )
-                        WebDriverWait(self.driver, timeout=DEFAULT_MAX_TIMEOUT).until(
-                            lambda d: d.find_element_by_xpath(
-                                "//div[@id='aod-container']  "
-                            )
+                        wait_for_any(
+                            self.browser,
+                            {"OFFERS": OFFER_PAGE_SELECTORS["OFFERS"]},
+                            DEFAULT_MAX_TIMEOUT,
                         )
                         continue
 
@@ -594,12 +1006,10 @@ class Amazon:
                         try:
                             # Now wait for the flyout to load
                             log.debug("Waiting for flyout...")
-                            WebDriverWait(
-                                self.driver, timeout=DEFAULT_MAX_TIMEOUT
-                            ).until(
-                                lambda d: d.find_element_by_xpath(
-                                    "//div[@id='aod-container']"
-                                )
+                            wait_for_any(
+                                self.browser,
+                                {"OFFERS": OFFER_PAGE_SELECTORS["OFFERS"]},
+                                DEFAULT_MAX_TIMEOUT,
                             )
                             log.debug("Flyout should be open and populated.")
                         except sel_exceptions.TimeoutException as te:
@@ -611,22 +1021,22 @@ class Amazon:
                     else:
                         log.error("Could not open offers link")
                 elif (
-                    offer_container.get_attribute("aria-labelledby")
+                    offer_page == "ADD_TO_CART"
+                    and offer_container.get_attribute("aria-labelledby")
                     == "submit.add-to-cart-announce"
                 ):
                     # Use the Buy Box as an Offer as a last resort since it is not guaranteed to be a good offer
                     buy_box = True
-                    upper_case = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
-                    lower_case = 'abcdefghijklmnopqrstuvwxyz'
-                    offer_count = self.driver.find_elements_by_xpath(
-                        "//div[@id='qualifiedBuybox']//input[@id='add-to-cart-button'] | //div[contains(translate(@id, upper_case, lower_case), 'qualifiedbuybox')]//input[@id='add-to-cart-button']"
+                    self.offer_page_decided(asin)
+                    offer_count = self.browser.find_elements_by_xpath(
+                        CHECK_STOCK_XPATHS["BUY_BOX_ATC"]
                     )
                 else:
                     log.warning(
                         "We found elements, but didn't recognize any of the combinations."
                     )
                     log.warning(f"Element found: {offer_container.tag_name}")
-                    attrs = self.driver.execute_script(
+                    attrs = self.browser.execute_script(
                         "var items = {}; "
                         "for (index = 0; index < arguments[0].attributes.length; ++index) "
                         "{ items[arguments[0].attributes[index].name] = arguments[0].attributes[index].value }; "
@@ -647,7 +1057,7 @@ class Amazon:
 
             except sel_exceptions.TimeoutException as te:
                 log.warning("Timed out waiting for offers to render.  Skipping...")
-                log.warning(f"URL: {self.driver.current_url}")
+                log.warning(f"URL: {self.browser.current_url}")
                 log.debug(te)
                 return False
             except sel_exceptions.NoSuchElementException:
@@ -668,70 +1078,55 @@ class Amazon:
 
             test = None
             try:
-                test = self.driver.find_element_by_xpath(
-                    '//*[@id="olpOfferList"]/div/p'
+                test = self.browser.find_element_by_xpath(
+                    CHECK_STOCK_XPATHS["NO_SELLERS"]
                 )
             except sel_exceptions.NoSuchElementException:
                 pass
 
             if test and (test.text in amazon_config["NO_SELLERS"]):
                 return False
-            if time.time() > timeout:
+            if timeout.expired():
                 log.warning(f"Failed to load page for {asin}, going to next ASIN")
                 return False
 
-        timeout = self.get_timeout()
-        while True:
-            if buy_box:
-                prices = self.driver.find_elements_by_xpath(
-                    "//span[@id='price_inside_buybox']"
-                )
-            else:
-                prices = self.driver.find_elements_by_xpath(
-                    "//div[@id='aod-pinned-offer' or @id='aod-offer']//span[@class='a-price']//span[@class='a-offscreen']"
-                )
-            if prices:
-                break
-            if time.time() > timeout:
-                log.warning(f"failed to load prices for {asin}, going to next ASIN")
-                return False
+        if buy_box:
+            price_xpath = CHECK_STOCK_XPATHS["BUY_BOX_PRICE"]
+        else:
+            price_xpath = CHECK_STOCK_XPATHS["FLYOUT_PRICES"]
+        try:
+            wait_for_any(self.browser, {"PRICES": price_xpath}, DEFAULT_MAX_TIMEOUT)
+        except sel_exceptions.TimeoutException:
+            log.warning(f"failed to load prices for {asin}, going to next ASIN")
+            return False
+        prices = self.browser.find_elements_by_xpath(price_xpath)
         shipping = []
         shipping_prices = []
 
-        timeout = self.get_timeout()
-        while True:
-            # Check for offers"
-            if buy_box:
-                offer_xpath = "//form[@id='addToCart']"
-            else:
-                offer_xpath = (
-                    "//div[@id='aod-offer' and .//input[@name='submit.addToCart']] | "
-                    "//div[@id='aod-pinned-offer' and .//input[@name='submit.addToCart']]"
-                )
-            offer_container = self.driver.find_elements_by_xpath(offer_xpath)
-            for idx, offer in enumerate(offer_container):
-                tree = html.fromstring(offer.get_attribute("innerHTML"))
-                shipping_prices.append(
-                    get_shipping_costs(tree, amazon_config["FREE_SHIPPING"])
-                )
-            if shipping_prices:
-                break
-
-            if time.time() > timeout:
-                log.warning(f"failed to load shipping for {asin}, going to next ASIN")
-                return False
-
-        in_stock = False
+        # Check for offers"
+        if buy_box:
+            offer_xpath = CHECK_STOCK_XPATHS["BUY_BOX_OFFER"]
+        else:
+            offer_xpath = CHECK_STOCK_XPATHS["FLYOUT_OFFERS"]
+        try:
+            wait_for_any(self.browser, {"OFFER": offer_xpath}, DEFAULT_MAX_TIMEOUT)
+        except sel_exceptions.TimeoutException:
+            pass
+        offer_container = self.browser.find_elements_by_xpath(offer_xpath)
+        for idx, offer in enumerate(offer_container):
+            tree = html.fromstring(offer.get_attribute("innerHTML"))
+            shipping_prices.append(
+                get_shipping_costs(tree, amazon_config["FREE_SHIPPING"])
+            )
+        if not shipping_prices:
+            log.warning(f"failed to load shipping for {asin}, going to next ASIN")
+            return False
 
+        offers = []
         for idx, atc_button in enumerate(atc_buttons):
-            # If the user has specified that they only want free items, we can skip any items
-            # that have any shipping cost and early out
-            if not self.checkshipping and shipping_prices[idx].amount_float > 0.00:
-                continue
-
-            # Condition check first, using the button to find the form that will divulge the item's condition
-            # with the assumption that anything in the Buy Box on the PDP *must* be New and therefor will clear
-            # any condition hurdle.
+            # Anything in the Buy Box on the PDP *must* be New and therefor will clear any condition hurdle.
+            # Otherwise use the button to find the form that will divulge the item's condition
+            seller_item_condition = AmazonItemCondition.New
             if not buy_box:
                 condition: List[WebElement] = atc_button.find_elements_by_xpath(
                     "./ancestor::form[@method='post']"
@@ -739,15 +1134,6 @@ class Amazon:
                 if condition:
                     atc_form_action = condition[0].get_attribute("action")
                     seller_item_condition = get_item_condition(atc_form_action)
-                    # Lower condition value imply newer
-                    if seller_item_condition.value > self.condition.value:
-                        # Item is below our standards, so skip it
-                        log.debug(
-                            f"Skipping item because its condition is below the requested level: "
-                            f"{seller_item_condition} is below {self.condition}"
-                        )
-                        continue
-
             try:
                 price = parse_price(
                     re.sub(
@@ -759,139 +1145,174 @@ class Amazon:
             except IndexError:
                 log.debug("Price index error")
                 return False
-            # Include the price, even if it's zero for comparison
-            ship_price = shipping_prices[idx]
-            ship_float = ship_price.amount
-            price_float = price.amount
-            if price_float is None:
-                return False
-            if ship_float is None:
-                ship_float = 0
-
-            if (
-                (ship_float + price_float) <= reserve_max
-                or math.isclose((price_float + ship_float), reserve_max, abs_tol=0.01)
-            ) and (
-                (ship_float + price_float) >= reserve_min
-                or math.isclose((price_float + ship_float), reserve_min, abs_tol=0.01)
-            ):
-                log.info(
-                    f"Item {asin} in stock and in reserve range: {price_float} + {ship_float} shipping <= {reserve_max}"
+            # The offer rows and the buttons are separate lookups, so there may be fewer of them
+            if idx < len(shipping_prices):
+                shipping_price = shipping_prices[idx].amount_float
+            else:
+                log.debug(f"No shipping price for offer {idx}")
+                shipping_price = None
+            offers.append(
+                Offer(
+                    index=idx,
+                    price=price.amount_float,
+                    shipping=shipping_price,
+                    condition=seller_item_condition,
                 )
-                log.info("Adding to cart")
-                # Get the offering ID
-                try:
-                    atc_action : List[WebElement] = atc_button.find_elements_by_xpath("./ancestor::span[@data-action='aod-atc-action']")
-                    full_atc_action_string = atc_action[0].get_attribute('data-aod-atc-action')
-                    offering_id = json.loads(full_atc_action_string)["oid"]
-                except:
-                    log.error("Unable to find OfferID...")
+            )
+
+        policy = OfferPolicy(
+            reserve_min=reserve_min,
+            reserve_max=reserve_max,
+            condition=self.condition,
+            check_shipping=self.checkshipping,
+        )
+        start_time = time.perf_counter()
+        ranked_offers, rejected_offers = evaluate_offers(offers, policy)
+        log.debug(
+            f"Evaluated {len(offers)} offers in {(time.perf_counter() - start_time) * 1e6:.0f} us"
+        )
+        for offer, reason in rejected_offers:
+            log.debug(f"  Skipping offer {offer.index}: {reason}")
+        if not ranked_offers:
+            log.info(f"Offers exceed price range ({reserve_min:.2f}-{reserve_max:.2f})")
+            return False
+
+        best_offer = ranked_offers[0]
+        atc_button = atc_buttons[best_offer.index]
+        log.info(
+            f"Item {asin} in stock and in reserve range: {best_offer.price} + {best_offer.shipping} shipping <= {reserve_max}"
+        )
+        if len(ranked_offers) > 1:
+            log.info(
+                f"Picked the best of {len(ranked_offers)} acceptable offers ({best_offer.condition.name})"
+            )
+        log.info("Adding to cart")
+        # Get the offering ID
+        try:
+            atc_action: List[WebElement] = atc_button.find_elements_by_xpath(
+                "./ancestor::span[@data-action='aod-atc-action']"
+            )
+            full_atc_action_string = atc_action[0].get_attribute("data-aod-atc-action")
+            offering_id = json.loads(full_atc_action_string)["oid"]
+        except:
+            log.error("Unable to find OfferID...")
+            return False
+
+        if offering_id:
+            log.info("Attempting Add To Cart with offer ID...")
+            if not self.alt_checkout:
+                bought = self.buy_it_now(offering_id)
+                self.record_purchase_attempt(asin, "bin", bought)
+                if bought:
+                    return True
+                else:
+                    self.send_notification(
+                        "Failed Buy it Now ",
+                        "failed-BIN",
+                        self.take_screenshots,
+                    )
+                    self.save_page_source("failed-atc")
                     return False
-                
-                if offering_id:
-                    log.info("Attempting Add To Cart with offer ID...")
-                    if not self.alt_checkout:
-                        if self.buy_it_now(offering_id, max_atc_retries=20):
-                            return True
-                        else:
-                            self.send_notification(
-                                "Failed Buy it Now ",
-                                "failed-BIN",
-                                self.take_screenshots,
-                            )
-                            self.save_page_source("failed-atc")
-                            return False
-                    else:
-                        if self.attempt_atc(offering_id):
-                            return True
-                        else:
-                            self.send_notification(
-                                "Failed ATC ",
-                                "failed-ATC",
-                                self.take_screenshots,
-                            )
-                            self.save_page_source("failed-atc")
-                            return False
+            else:
+                added = self.attempt_atc(offering_id)
+                self.record_purchase_attempt(asin, "atc", added)
+                if added:
+                    return True
                 else:
-                    log.error(
-                        "Unable to find offering ID to add to cart.  Using legacy mode."
+                    self.send_notification(
+                        "Failed ATC ",
+                        "failed-ATC",
+                        self.take_screenshots,
                     )
-                    self.notification_handler.play_notify_sound()
-                    if self.detailed:
-                        self.send_notification(
-                            message=f"Found Stock ASIN:{asin}",
-                            page_name="Stock Alert",
-                            take_screenshot=self.take_screenshots,
-                        )
+                    self.save_page_source("failed-atc")
+                    return False
 
-                    presence.buy_update()
-                    current_title = self.driver.title
-                    # log.info(f"current page title is {current_title}")
-                    try:
-                        atc_button.click()
-                    except IndexError:
-                        log.debug("Index Error")
-                        return False
-                    self.wait_for_page_change(current_title)
-                    # log.info(f"page title is {self.driver.title}")
-                    emtpy_cart_elements = self.driver.find_elements_by_xpath(
-                        "//div[contains(@class, 'sc-your-amazon-cart-is-empty') or contains(@class, 'sc-empty-cart')]"
-                    )
+        log.error("Unable to find offering ID to add to cart.  Using legacy mode.")
+        self.notification_handler.play_notify_sound()
+        if self.detailed:
+            self.send_notification(
+                message=f"Found Stock ASIN:{asin}",
+                page_name="Stock Alert",
+                take_screenshot=self.take_screenshots,
+            )
 
-                    if (
-                        not emtpy_cart_elements
-                        and self.driver.title in amazon_config["SHOPPING_CART_TITLES"]
-                    ):
-                        return True
-                    else:
-                        log.warning("Did not add to cart, trying again")
-                        if emtpy_cart_elements:
-                            log.info(
-                                "Cart appeared empty after clicking Add To Cart button"
-                            )
-                        log.debug(f"failed title was {self.driver.title}")
-                        self.send_notification(
-                            "Failed Add to Cart", "failed-atc", self.take_screenshots
-                        )
-                        self.save_page_source("failed-atc")
-                        in_stock = self.check_stock(
-                            asin=asin,
-                            reserve_max=reserve_max,
-                            reserve_min=reserve_min,
-                            retry=retry + 1,
-                        )
-            elif reserve_min > (price_float + ship_float):
-                log.debug(
-                    f"  Min ({reserve_min}) > Price ({price_float} + {ship_float} shipping)"
-                )
+        presence.buy_update()
+        current_title = self.browser.title
+        # log.info(f"current page title is {current_title}")
+        try:
+            atc_button.click()
+        except IndexError:
+            log.debug("Index Error")
+            return False
+        self.wait_for_page_change(current_title)
+        # log.info(f"page title is {self.browser.title}")
+        emtpy_cart_elements = self.browser.find_elements_by_xpath(
+            "//div[contains(@class, 'sc-your-amazon-cart-is-empty') or contains(@class, 'sc-empty-cart')]"
+        )
 
-            elif reserve_max < (price_float + ship_float):
-                log.debug(
-                    f"  Max ({reserve_max}) < Price ({price_float} + {ship_float} shipping)"
-                )
+        if (
+            not emtpy_cart_elements
+            and self.browser.title in amazon_config["SHOPPING_CART_TITLES"]
+        ):
+            self.record_purchase_attempt(asin, "legacy", True)
+            return True
 
-            else:
-                log.error("Serious problem with price comparison")
-                log.error(f"  Min:   {reserve_min}")
-                log.error(f"  Price: {price_float} + {ship_float} shipping")
-                log.error(f"  Max:   {reserve_max}")
-
-        log.info(f"Offers exceed price range ({reserve_min:.2f}-{reserve_max:.2f})")
-        return in_stock
-
-    def buy_it_now(self, offering_id, max_atc_retries=DEFAULT_MAX_ATC_TRIES):
-        retry = 0
-        successful = False
-        while not successful:
-            buy_it_now_url = f"https://{self.amazon_website}/checkout/turbo-initiate?ref_=dp_start-bbf_1_glance_buyNow_2-1&pipelineType=turbo&weblab=RCX_CHECKOUT_TURBO_DESKTOP_NONPRIME_87784&temporaryAddToCart=1&offerListing.1={offering_id}&quantity.1=1"
+        self.record_purchase_attempt(asin, "legacy", False)
+
+        log.warning("Did not add to cart, trying again")
+        if emtpy_cart_elements:
+            log.info("Cart appeared empty after clicking Add To Cart button")
+        log.debug(f"failed title was {self.browser.title}")
+        self.send_notification(
+            "Failed Add to Cart", "failed-atc", self.take_screenshots
+        )
+        self.save_page_source("failed-atc")
+        return self.check_stock(
+            asin=asin,
+            reserve_max=reserve_max,
+            reserve_min=reserve_min,
+            retry=retry,
+        )
+
+    def offer_page_decided(self, asin):
+        """Called once the offer container tells us what kind of page we are on.  Records the offer page
+        load time, and with early stop enabled, halts the rest of the page load so it doesn't compete with
+        the next actions."""
+        if self.offer_load_started is not None:
+            metrics.offer_page_load.observe(
+                time.perf_counter() - self.offer_load_started
+            )
+            self.offer_load_started = None
+        if self.pipeline:
+            self.pipeline.record_ready()
+            # When pages take longer to load than the delay, the next one has to start loading now, while
+            # this one is still being evaluated
+            if (
+                self.next_asin
+                and self.pipeline.lead_time(self.refresh_delay) >= self.refresh_delay
+            ):
+                self.pipeline.prefetch(self.offer_url(self.next_asin))
+        if self.page_timer:
+            self.page_timer.decide(self.browser, asin, early_stop=self.early_stop)
+        if self.offer_urls:
+            self.offer_urls.decided(asin)
+
+    def record_purchase_attempt(self, asin, method, succeeded):
+        outcome = "success" if succeeded else "failure"
+        metrics.purchase_attempts.inc(method=method, outcome=outcome)
+        log.info(f"Purchase attempt ({method}) for {asin}: {outcome}")
+
+    def buy_it_now(self, offering_id):
+        retry = self.retry_policies.start("buy_it_now")
+        buy_it_now_url = f"https://{self.amazon_website}/checkout/turbo-initiate?ref_=dp_start-bbf_1_glance_buyNow_2-1&pipelineType=turbo&weblab=RCX_CHECKOUT_TURBO_DESKTOP_NONPRIME_87784&temporaryAddToCart=1&offerListing.1={offering_id}&quantity.1=1"
+        while True:
             with self.wait_for_page_content_change():
                 self.driver.get(buy_it_now_url)
             timeout = self.get_timeout(5)
-            while self.driver.title == "" and time.time() < timeout:
+            while self.driver.title == "" and not timeout.expired():
                 time.sleep(0.5)
             if self.driver.title not in amazon_config["CHECKOUT_TITLES"]:
-                retry += 1
-                if retry > max_atc_retries:
+                if not retry.backoff():
                     return False
                 continue
             try:
@@ -900,44 +1321,40 @@ class Amazon:
                 )
             except sel_exceptions.NoSuchElementException:
                 log.info("No PYO button found, don't ask why")
-                retry += 1
-                if retry > max_atc_retries:
+                if not retry.backoff():
                     return False
                 continue
-            if place_order_button:
-                try:
-                    with self.wait_for_page_content_change():
-                        place_order_button.click()
-                except sel_exceptions.WebDriverException:
-                    log.info("Could not click button, don't ask why")
-                    retry += 1
-                    if retry > max_atc_retries:
-                        return False
-                    continue
-                timeout = self.get_timeout(5)
-                while self.driver.title == "" and time.time() < timeout:
-                    time.sleep(0.5)
-                if self.driver.title in amazon_config["ORDER_COMPLETE_TITLES"]:
-                    log.info("maybe this worked, check your orders")
-                    self.save_screenshot("Order-Complete-Maybe")
-                    successful = True
-                else:
-                    log.info("maybe this didn't work, check your orders")
-                    self.save_screenshot("Order-Maybe-Not-Complete")
-                    successful = True
-        return True
+            try:
+                with self.wait_for_page_content_change():
+                    place_order_button.click()
+            except sel_exceptions.WebDriverException:
+                log.info("Could not click button, don't ask why")
+                if not retry.backoff():
+                    return False
+                continue
+            timeout = self.get_timeout(5)
+            while self.driver.title == "" and not timeout.expired():
+                time.sleep(0.5)
+            if self.driver.title in amazon_config["ORDER_COMPLETE_TITLES"]:
+                log.info("maybe this worked, check your orders")
+                self.save_screenshot("Order-Complete-Maybe")
+            else:
+                log.info("maybe this didn't work, check your orders")
+                self.save_screenshot("Order-Maybe-Not-Complete")
+            return True
 
-    def attempt_atc(self, offering_id, max_atc_retries=DEFAULT_MAX_ATC_TRIES):
+    def attempt_atc(self, offering_id):
         # Open the add.html URL in Selenium
         f = f"{AMAZON_URLS['ATC_URL']}?OfferListingId.1={offering_id}&Quantity.1=1"
-        atc_attempts = 0
-        while atc_attempts < max_atc_retries:
+        retry = self.retry_policies.start("add_to_cart")
+        while True:
             with self.wait_for_page_content_change(timeout=5):
                 try:
                     self.driver.get(f)
                 except sel_exceptions.TimeoutException:
                     log.error("Failed to get page")
-                    atc_attempts += 1
+                    if not retry.backoff():
+                        break
                     continue
             xpath = "//input[@value='add' and @name='add']"
             continue_btn = None
@@ -957,24 +1374,17 @@ class Amazon:
                     else:
                         log.info("Nothing added to cart, trying again")
 
-            atc_attempts = atc_attempts + 1
+            if not retry.backoff():
+                break
         log.error("reached maximum ATC attempts, returning to stock check")
         return False
 
-    # search lists of asin lists, and remove the first list that matches provided asin
-    @debug
-    def remove_asin_list(self, asin):
-        for i in range(len(self.asin_list)):
-            if asin in self.asin_list[i]:
-                self.asin_list.pop(i)
-                self.reserve_max.pop(i)
-                self.reserve_min.pop(i)
-                break
-
     # checkout page navigator
     @debug
+    @replayable
     def navigate_pages(self, test):
-        title = self.driver.title
+        state = self.read_page()
+        title = state.title
         log.debug(f"Navigating page title: '{title}'")
         # see if this resolves blank page title issue?
         if title == "":
@@ -983,9 +1393,10 @@ class Amazon:
                 f"Title was blank, checking to find a real title for {timeout_seconds} seconds"
             )
             timeout = self.get_timeout(timeout=timeout_seconds)
-            while time.time() <= timeout:
-                if self.driver.title != "":
-                    title = self.driver.title
+            while not timeout.expired():
+                state = self.read_page()
+                if state.title != "":
+                    title = state.title
                     log.debug(f"found a real title: {title}.")
                     break
                 time.sleep(0.05)
@@ -1025,10 +1436,11 @@ class Amazon:
                 self.handle_unknown_title(title)
         else:
             log.debug(f"title is: [{title}]")
-            # see if we can handle blank titles here
-            time.sleep(
-                3
-            )  # wait a few seconds for page to load, since we don't know what we are dealing with
+            # give the page up to a few seconds to finish loading, since we don't know what we are dealing with
+            timeout = self.get_timeout(timeout=3)
+            while state.ready_state != "complete" and not timeout.expired():
+                time.sleep(0.1)
+                state = self.read_page()
             log.warning(
                 "FairGame is not sure what page it is on - will attempt to resolve."
             )
@@ -1036,15 +1448,8 @@ class Amazon:
             # PERFORM ELEMENT CHECKS TO SEE IF WE CAN FIGURE OUT WHERE WE ARE #
             ###################################################################
 
-            element = None
             # check page for order complete?
-            try:
-                element = self.driver.find_element_by_xpath(
-                    '//*[@class="a-box a-alert a-alert-success"]'
-                )
-            except sel_exceptions.NoSuchElementException:
-                pass
-            if element:
+            if state.has("SUCCESS_ALERT"):
                 log.info(
                     "FairGame thinks it completed the purchase, please verify ASAP"
                 )
@@ -1063,10 +1468,11 @@ class Amazon:
 
             element = None
             # Prime offer page?
-            try:
-                element = self.get_amazon_element(key="PRIME_NO_THANKS")
-            except sel_exceptions.NoSuchElementException:
-                pass
+            if state.has("PRIME_NO_THANKS"):
+                try:
+                    element = self.get_amazon_element(key="PRIME_NO_THANKS")
+                except sel_exceptions.NoSuchElementException:
+                    pass
             if element:
                 if self.do_button_click(
                     button=element,
@@ -1077,11 +1483,11 @@ class Amazon:
                     return
             # see if a use this address (or similar) button is on page (based on known xpaths). Only check if
             # user has set the shipping_bypass flag
-            if self.shipping_bypass:
+            if self.shipping_bypass and state.has("ADDRESS_SELECT"):
                 if self.handle_shipping_page():
                     return
 
-            if self.get_cart_count() == 0:
+            if state.cart_count == 0:
                 log.info("It appears you have nothing in your cart.")
                 log.info("Returning to stock check.")
                 self.try_to_checkout = False
@@ -1100,7 +1506,7 @@ class Amazon:
             # give user 30 seconds to respond
             self.handle_unknown_title(title=title)
             # check if page title changed, if not, then continue doing other checks:
-            if self.driver.title != title:
+            if self.browser.title != title:
                 log.info(
                     "FairGame thinks user intervened in time, will now continue running"
                 )
@@ -1138,7 +1544,7 @@ class Amazon:
                     break
                 except sel_exceptions.NoSuchElementException:
                     button = None
-                if time.time() > timeout:
+                if timeout.expired():
                     log.error("Could not find and click button")
                     break
             if button:
@@ -1205,26 +1611,39 @@ class Amazon:
         self.save_page_source(page="shipping-select-error")
         return False
 
+    def read_page(self):
+        """Probes the current page, and drops the cached handles if the page has been replaced"""
+        state = self.page_probe.read(self.browser)
+        self.elements.on_page(state.page_id)
+        return state
+
     def get_amazon_element(self, key):
-        return self.driver.find_element_by_xpath(
-            join_xpaths(amazon_config["XPATHS"][key])
+        return self.elements.find(
+            key,
+            lambda: self.browser.find_element_by_xpath(
+                amazon_config["JOINED_XPATHS"][key]
+            ),
         )
 
     def get_amazon_elements(self, key):
-        return self.driver.find_elements_by_xpath(
-            join_xpaths(amazon_config["XPATHS"][key])
-        )
+        return self.browser.find_elements_by_xpath(amazon_config["JOINED_XPATHS"][key])
 
     # returns negative number if cart element does not exist, returns number if cart exists
     def get_cart_count(self):
         # check if cart number is on the page, if cart items = 0
         try:
-            element = self.get_amazon_element(key="CART")
+            text = self.elements.use(
+                "CART",
+                lambda: self.browser.find_element_by_xpath(
+                    amazon_config["JOINED_XPATHS"]["CART"]
+                ),
+                lambda element: element.text,
+            )
         except sel_exceptions.NoSuchElementException:
             return -1
-        if element:
+        if text is not None:
             try:
-                return int(element.text)
+                return int(text)
             except Exception as e:
                 log.debug("Error converting cart number to integer")
                 log.debug(e)
@@ -1264,7 +1683,7 @@ class Amazon:
         )
         timeout = self.get_timeout(timeout=60)
         while self.driver.title in amazon_config["PRIME_TITLES"]:
-            if time.time() > timeout:
+            if timeout.expired():
                 log.info("user did not intervene in time, will try and refresh page")
                 with self.wait_for_page_content_change():
                     self.driver.refresh()
@@ -1298,15 +1717,14 @@ class Amazon:
     def handle_home_page(self):
         log.warning("On home page, trying to get back to checkout")
         button = None
-        tries = 0
-        maxTries = 10
-        while not button and tries < maxTries:
+        retry = self.retry_policies.start("find_button")
+        while True:
             try:
                 button = self.get_amazon_element("CART_BUTTON")
+                break
             except sel_exceptions.NoSuchElementException:
-                pass
-            tries += 1
-            time.sleep(0.5)
+                if not retry.backoff():
+                    break
         current_page = self.driver.title
         if button:
             if self.do_button_click(button=button):
@@ -1314,7 +1732,7 @@ class Amazon:
             else:
                 log.error("Failed to click on cart button")
         else:
-            log.error("Could not find cart button after " + str(maxTries) + " tries")
+            log.error(f"Could not find cart button after {retry.attempts} tries")
 
         # no button found or could not interact with the button
         self.send_notification(
@@ -1325,7 +1743,7 @@ class Amazon:
         timeout = self.get_timeout(timeout=300)
         while self.driver.title == current_page:
             time.sleep(0.25)
-            if time.time() > timeout:
+            if timeout.expired():
                 log.error("user failed to intervene in time, returning to stock check")
                 self.try_to_checkout = False
                 break
@@ -1340,23 +1758,28 @@ class Amazon:
             pass
         timeout = self.get_timeout()
         button = None
+        keys = ("PTC", "ADDRESS_SELECT") if self.shipping_bypass else ("PTC",)
         while True:
-            try:
-                button = self.get_amazon_element(key="PTC")
-                break
-            except sel_exceptions.NoSuchElementException:
-                if self.shipping_bypass:
+            state = self.read_page()
+            for key in keys:
+                if state.has(key):
                     try:
-                        button = self.get_amazon_element(key="ADDRESS_SELECT")
+                        button = self.get_amazon_element(key=key)
                         break
                     except sel_exceptions.NoSuchElementException:
                         pass
-            if self.get_cart_count() == 0:
+            if button:
+                break
+            if state.cart_count == 0:
                 log.error("You have no items in cart. Going back to stock check.")
                 self.try_to_checkout = False
                 break
+            if not any(state.has(key) for key in keys):
+                self.watch_for_buttons(
+                    {key: amazon_config["JOINED_XPATHS"][key] for key in keys}, timeout
+                )
 
-            if time.time() > timeout:
+            if timeout.expired():
                 log.error("couldn't find buttons to proceed to checkout")
                 self.save_page_source("ptc-error")
                 self.send_notification(
@@ -1375,7 +1798,7 @@ class Amazon:
                 log.info("Refreshing page to try again")
                 with self.wait_for_page_content_change():
                     self.driver.refresh()
-                self.checkout_retry += 1
+                self.ptc_retry.backoff()
                 return
 
         if button:
@@ -1393,7 +1816,7 @@ class Amazon:
                 log.info("Refreshing page to try again")
                 with self.wait_for_page_content_change():
                     self.driver.refresh()
-                self.checkout_retry += 1
+                self.ptc_retry.backoff()
 
     @debug
     def handle_checkout(self, test):
@@ -1401,19 +1824,34 @@ class Amazon:
         button = None
         timeout = self.get_timeout()
         while True:
+            # Check every place order button at once, and only fetch the one that can be clicked
+            state = self.read_page()
+            xpath = next(
+                (
+                    x
+                    for x in self.button_xpaths
+                    if state.clickable(PLACE_ORDER_BUTTONS[x])
+                ),
+                None,
+            )
             try:
-                button = self.driver.find_element_by_xpath(self.button_xpaths[0])
-            except sel_exceptions.NoSuchElementException:
-                if self.shipping_bypass:
-                    try:
-                        button = self.get_amazon_element(key="ADDRESS_SELECT")
-                    except sel_exceptions.NoSuchElementException:
-                        pass
-                self.button_xpaths.append(self.button_xpaths.pop(0))
-            if button:
-                if button.is_enabled() and button.is_displayed():
+                if xpath:
+                    button = self.elements.find(
+                        PLACE_ORDER_BUTTONS[xpath],
+                        lambda: self.browser.find_element_by_xpath(xpath),
+                    )
+                    break
+                if self.shipping_bypass and state.clickable("ADDRESS_SELECT"):
+                    button = self.get_amazon_element(key="ADDRESS_SELECT")
                     break
-            if time.time() > timeout:
+            except sel_exceptions.NoSuchElementException:
+                pass
+            if not any(state.has(name) for name in PLACE_ORDER_BUTTONS.values()):
+                self.watch_for_buttons(
+                    {name: xpath for xpath, name in PLACE_ORDER_BUTTONS.items()},
+                    timeout,
+                )
+            if timeout.expired():
                 log.error("couldn't find button to place order")
                 self.save_page_source("pyo-error")
                 self.send_notification(
@@ -1424,7 +1862,7 @@ class Amazon:
                 log.info("Refreshing page to try again")
                 self.driver.refresh()
                 time.sleep(DEFAULT_PAGE_WAIT_DELAY)
-                self.order_retry += 1
+                self.pyo_retry.backoff()
                 return
         if test:
             self.end_time_atc = time.time()
@@ -1439,7 +1877,7 @@ class Amazon:
             self.try_to_checkout = False
             self.great_success = True
             if self.single_shot:
-                self.asin_list = []
+                self.watchlist.clear()
         else:
             log.info(f"Clicking Button {button.text} to place order")
             self.do_button_click(button=button)
@@ -1458,7 +1896,7 @@ class Amazon:
         self.notification_handler.play_purchase_sound()
         self.great_success = True
         if self.single_shot:
-            self.asin_list = []
+            self.watchlist.clear()
         self.try_to_checkout = False
         log.info(f"checkout completed in {time.time() - self.start_time_atc} seconds")
 
@@ -1478,6 +1916,7 @@ class Amazon:
 
     @debug
     def handle_captcha(self, check_presence=True):
+        metrics.captchas.inc()
         # wait for captcha to load
         log.debug("Waiting for captcha to load.")
         time.sleep(DEFAULT_MAX_WEIRD_PAGE_DELAY)
@@ -1512,14 +1951,14 @@ class Amazon:
                             with self.wait_for_page_content_change():
                                 timeout = self.get_timeout(timeout=60)
                                 while (
-                                    time.time() < timeout
+                                    not timeout.expired()
                                     and self.driver.title == current_page
                                 ):
                                     time.sleep(0.5)
                                 # check above is not true, then we must have passed captcha, return back to nav handler
                                 # Otherwise refresh page to try again - either way, returning to nav page handler
                                 if (
-                                    time.time() > timeout
+                                    timeout.expired()
                                     and self.driver.title == current_page
                                 ):
                                     log.info(
@@ -1574,7 +2013,7 @@ class Amazon:
                 break
             except sel_exceptions.NoSuchElementException:
                 pass
-            if time.time() > timeout:
+            if timeout.expired():
                 break
         if button:
             current_page = self.driver.title
@@ -1590,10 +2029,13 @@ class Amazon:
             time.sleep(300)
 
     def save_screenshot(self, page):
-        file_name = get_timestamp_filename("screenshots/screenshot-" + page, ".png")
         try:
-            self.driver.save_screenshot(file_name)
-            return file_name
+            return self.artifacts.save(
+                "screenshot",
+                self.driver.get_screenshot_as_png(),
+                page,
+                self.current_asin,
+            )
         except sel_exceptions.TimeoutException:
             log.info("Timed out taking screenshot, trying to continue anyway")
             pass
@@ -1604,17 +2046,17 @@ class Amazon:
 
     def save_page_source(self, page):
         """Saves DOM at the current state when called.  This includes state changes from DOM manipulation via JS"""
-        file_name = get_timestamp_filename("html_saves/" + page + "_source", "html")
-
         page_source = self.driver.page_source
-        with open(file_name, "w", encoding="utf-8") as f:
-            f.write(page_source)
+        self.artifacts.save(
+            "html", page_source.encode("utf-8"), page, self.current_asin
+        )
 
     @contextmanager
     def wait_for_page_content_change(self, timeout=5):
         """Utility to help manage selenium waiting for a page to load after an action, like a click"""
-        old_page = self.driver.find_element_by_tag_name("html")
+        old_page = self.current_page_element()
         yield
+        self.elements.clear()
         try:
             WebDriverWait(self.driver, timeout).until(EC.staleness_of(old_page))
             WebDriverWait(self.driver, timeout).until(
@@ -1630,11 +2072,11 @@ class Amazon:
 
     def wait_for_page_change(self, page_title, timeout=3):
         time_to_end = self.get_timeout(timeout=timeout)
-        while time.time() < time_to_end and (
-            self.driver.title == page_title or not self.driver.title
+        while not time_to_end.expired() and (
+            self.browser.title == page_title or not self.browser.title
         ):
             pass
-        if self.driver.title != page_title:
+        if self.browser.title != page_title:
             return True
         else:
             return False
@@ -1649,27 +2091,52 @@ class Amazon:
         else:
             self.notification_handler.send_notification(message)
 
+    def watch_for_buttons(self, selectors, timeout):
+        """Waits until one of the buttons is added to the page, for at most MAX_BUTTON_WATCH seconds so
+        the caller still reads the page regularly.  The watch isn't cut short to fit the caller's timeout,
+        so a recorded session sends the same wait when it is replayed."""
+        if timeout.expired():
+            return
+        try:
+            wait_for_any(self.browser, selectors, MAX_BUTTON_WATCH)
+        except sel_exceptions.TimeoutException:
+            pass
+
     def get_timeout(self, timeout=DEFAULT_MAX_TIMEOUT):
-        return time.time() + timeout
+        return Deadline(timeout)
 
     def get_webdriver_pids(self):
         pid = self.driver.service.process.pid
+        self.webdriver_pid = pid
         driver_process = psutil.Process(pid)
         children = driver_process.children(recursive=True)
         for child in children:
             self.webdriver_child_pids.append(child.pid)
 
+    def get_chrome_rss(self):
+        """Resident memory of chromedriver and the Chrome processes it started, in bytes"""
+        if not self.webdriver_pid:
+            return 0
+        return process_tree_rss(self.webdriver_pid)
+
+    def current_page_element(self):
+        """The root element of the current page, which goes stale once the page is replaced"""
+        return self.elements.find(
+            "html", lambda: self.browser.find_element_by_xpath("/html")
+        )
+
     def get_page(self, url):
         check_cart_element = None
         current_page = []
         try:
-            check_cart_element = self.driver.find_element_by_xpath(
-                '//*[@id="nav-cart"]'
-            )
+            check_cart_element = self.current_page_element()
         except sel_exceptions.NoSuchElementException:
-            current_page = self.driver.title
+            current_page = self.browser.title
+        if self.page_timer:
+            self.page_timer.collect_pending(self.browser)
+        self.elements.clear()
         try:
-            self.driver.get(url=url)
+            self.browser.get(url=url)
         except sel_exceptions.WebDriverException or sel_exceptions.TimeoutException:
             log.error(f"Failed to load page at url: {url}")
             return False
@@ -1680,7 +2147,7 @@ class Amazon:
                     check_cart_element.is_displayed()
                 except sel_exceptions.StaleElementReferenceException:
                     break
-                if time.time() > timeout:
+                if timeout.expired():
                     return False
             return True
         elif self.wait_for_page_change(current_page):
@@ -1690,12 +2157,18 @@ class Amazon:
             return False
 
     def __del__(self):
+        if self.offer_urls:
+            metrics.offer_url_cost.clear_callback(self.offer_urls)
         self.delete_driver()
+        if self.ram_profile:
+            self.ram_profile.cleanup()
+        if self.recorder:
+            self.recorder.close()
 
     def show_config(self):
         log.info(f"{'=' * 50}")
         log.info(
-            f"Starting Amazon ASIN Hunt on {AMAZON_URLS['BASE_URL']} for {len(self.asin_list)} Products with:"
+            f"Starting Amazon ASIN Hunt on {AMAZON_URLS['BASE_URL']} for {self.watchlist.asin_count} Products with:"
         )
         log.info(f"--Offer URL of: {self.ACTIVE_OFFER_URL}")
         log.info(f"--Delay of {self.refresh_delay} seconds")
@@ -1719,6 +2192,22 @@ class Amazon:
             log.info(f"--Additional stock check logging enabled")
         if self.slow_mode:
             log.warning(f"--Slow-mode enabled. Pages will fully load before execution.")
+        if self.early_stop:
+            log.info(
+                f"--Early stop enabled. Offer pages stop loading once a decision can be made."
+            )
+        if self.prefetch:
+            log.info(f"--Prefetch enabled. The next offer page loads in a second tab.")
+        if self.parallel_checkout:
+            log.info(
+                f"--Parallel checkout enabled. Stock checks continue during checkout."
+            )
+        if self.clear_cart == "delete":
+            log.warning(f"--Items already in the cart will be deleted.")
+        elif self.clear_cart == "save":
+            log.info(f"--Items already in the cart will be saved for later.")
+        if self.recorder:
+            log.info(f"--Recording browser commands to {self.recorder.path}")
         if self.shipping_bypass:
             log.warning(f"{'=' * 50}")
             log.warning(f"--FairGame will attempt to choose shipping address.")
@@ -1731,43 +2220,51 @@ class Amazon:
                 f"bot may still fail during checkout if defaults are not set on Amazon's site."
             )
             log.warning(f"{'=' * 50}")
-        for idx, asins in enumerate(self.asin_list):
+        for group, asins in self.watchlist.groups():
+            reserve_min, reserve_max = self.watchlist.reserve(group)
             log.info(
-                f"--Looking for {len(asins)} ASINs between {self.reserve_min[idx]:.2f} and {self.reserve_max[idx]:.2f}"
+                f"--Looking for {len(asins)} ASINs between {reserve_min:.2f} and {reserve_max:.2f}"
             )
-            log.info(f"-    {asins}")
+            if len(asins) <= MAX_LISTED_ASINS:
+                log.info(f"-    {asins}")
         if not presence.enabled:
             log.info(f"--Discord Presence feature is disabled.")
         if self.no_image:
             log.info(f"--No images will be requested")
+        if self.ram_profile:
+            log.info(f"--Using a temporary in-memory browser profile")
+        if self.driver_backend != "selenium":
+            log.info(f"--Using the {self.driver_backend} driver backend")
+        if self.chrome_preset.arguments or self.chrome_preset.prefs:
+            log.info(f"--Using the '{self.chrome_preset.name}' Chrome preset")
         if not self.notification_handler.sound_enabled:
             log.info(f"--Notification sounds are disabled.")
         if self.ACTIVE_OFFER_URL == AMAZON_URLS["ALT_OFFER_URL"]:
             log.info(f"--Using alternate offers URL")
+        if self.offer_urls:
+            log.info(f"--Picking the fastest offers URL for each ASIN")
         if self.testing:
             log.warning(f"--Testing Mode.  NO Purchases will be made.")
         log.info(f"{'=' * 50}")
 
     def create_driver(self, path_to_profile):
-        if self.setup_driver:
-
-            if self.headless:
-                enable_headless()
-
-            prefs = {
-                "profile.password_manager_enabled": False,
-                "credentials_enable_service": False,
-            }
-            if self.no_image:
-                prefs["profile.managed_default_content_settings.images"] = 2
-            else:
-                prefs["profile.managed_default_content_settings.images"] = 0
-            options.add_experimental_option("prefs", prefs)
-            options.add_argument(f"user-data-dir={path_to_profile}")
-            if not self.slow_mode:
-                options.set_capability("pageLoadStrategy", "none")
-
-            self.setup_driver = False
+        self.elements.clear()
+        if self.replay:
+            self.driver = self.replay.proxy("driver")
+            self.browser = self.replay.proxy("browser")
+            return True
+        prefs = {
+            "profile.password_manager_enabled": False,
+            "credentials_enable_service": False,
+        }
+        if self.no_image:
+            prefs["profile.managed_default_content_settings.images"] = 2
+        else:
+            prefs["profile.managed_default_content_settings.images"] = 0
+        options = self.chrome_preset.build_options(self.headless, prefs)
+        options.add_argument(f"user-data-dir={path_to_profile}")
+        if not self.slow_mode:
+            options.set_capability("pageLoadStrategy", "none")
 
         # Delete crashed, so restore pop-up doesn't happen
         path_to_prefs = os.path.join(
@@ -1785,6 +2282,20 @@ class Amazon:
             self.driver = webdriver.Chrome(executable_path=binary_path, options=options)
             self.wait = WebDriverWait(self.driver, 10)
             self.get_webdriver_pids()
+            self.browser = create_browser(
+                self.driver_backend,
+                self.driver,
+                page_load_strategy="normal" if self.slow_mode else "none",
+            )
+            if self.ram_profile:
+                self.ram_profile.restore(self.driver)
+            if self.prefetch:
+                self.pipeline = TabPipeline(self.driver)
+            if self.recorder:
+                self.driver = self.recorder.wrap(self.driver, "driver")
+                self.browser = self.recorder.wrap(self.browser, "browser")
+            if metrics.enabled():
+                metrics.chrome_rss.set_callback(self.get_chrome_rss)
         except Exception as e:
             log.error(e)
             log.error(
@@ -1799,6 +2310,20 @@ class Amazon:
         return True
 
     def delete_driver(self):
+        metrics.chrome_rss.clear_callback(self)
+        if self.replay:
+            return True
+        if self.coordinator:
+            # The checkout session drives a tab of this Chrome, so the checkout in progress is let finish
+            self.coordinator.close()
+        if self.recorder:
+            # Shutting down isn't part of the session
+            self.driver = unwrap(self.driver)
+            self.browser = unwrap(self.browser)
+        if self.ram_profile and self.driver:
+            self.ram_profile.sync(self.driver)
+        if self.browser:
+            self.browser.close()
         try:
             if platform.system() == "Windows" and self.driver:
                 log.info("Cleaning up after web driver...")
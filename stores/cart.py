@@ -0,0 +1,85 @@
+#      FairGame - Automated Purchasing Program
+#      Copyright (C) 2021  Hari Nagarajan
+#
+#      This program is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      This program is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#      The author may be contacted through the project's GitHub, at:
+#      https://github.com/Hari-Nagarajan/fairgame
+
+from typing import List, NamedTuple
+
+from selenium.common import exceptions as sel_exceptions
+from selenium.webdriver.support.ui import WebDriverWait
+
+ACTIVE_LINES = "#sc-active-cart div[data-asin][data-itemtype='active']"
+
+# What can be done with a line that was already in the cart, and the button on the line that does it
+CART_ACTIONS = {
+    "delete": "input[name^='submit.delete']",
+    "save": "input[name^='submit.save-for-later']",
+}
+
+# Every active line of the cart page, read in a single round trip
+READ_LINES_SCRIPT = """
+return Array.from(document.querySelectorAll(arguments[0])).map(function (line) {
+    var title = line.querySelector('.sc-product-title .a-truncate-full, .sc-product-title');
+    return {
+        asin: line.getAttribute('data-asin'),
+        quantity: parseInt(line.getAttribute('data-quantity') || '1', 10),
+        title: title ? title.textContent.trim() : ''
+    };
+});
+"""
+
+# Clicks the action on every active line at once, the cart page sends the requests in the background
+CLICK_ALL_SCRIPT = """
+var buttons = document.querySelectorAll(arguments[0] + ' ' + arguments[1]);
+buttons.forEach(function (button) { button.click(); });
+return buttons.length;
+"""
+
+PAGE_PARSED_SCRIPT = "return document.readyState !== 'loading';"
+
+
+class CartLine(NamedTuple):
+    asin: str
+    quantity: int
+    title: str
+
+    def __str__(self):
+        title = self.title if len(self.title) <= 60 else self.title[:57] + "..."
+        return f"{self.asin} x{self.quantity} {title}"
+
+
+def read_cart(driver, timeout=10) -> List[CartLine]:
+    """Reads the lines of the cart page that is loading in driver"""
+    WebDriverWait(driver, timeout).until(lambda d: d.execute_script(PAGE_PARSED_SCRIPT))
+    lines = driver.execute_script(READ_LINES_SCRIPT, ACTIVE_LINES) or []
+    return [CartLine(line["asin"], line["quantity"], line["title"]) for line in lines]
+
+
+def clear_cart(driver, action, timeout=10) -> List[CartLine]:
+    """Deletes, or saves for later, every line in the cart page.  Returns the lines that are left."""
+    clicked = driver.execute_script(
+        CLICK_ALL_SCRIPT, ACTIVE_LINES, CART_ACTIONS[action]
+    )
+    if not clicked:
+        return read_cart(driver, timeout)
+    try:
+        WebDriverWait(driver, timeout).until(
+            lambda d: not d.execute_script(READ_LINES_SCRIPT, ACTIVE_LINES)
+        )
+    except sel_exceptions.TimeoutException:
+        pass
+    return read_cart(driver, timeout)
@@ -0,0 +1,168 @@
+#      FairGame - Automated Purchasing Program
+#      Copyright (C) 2021  Hari Nagarajan
+#
+#      This program is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      This program is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#      The author may be contacted through the project's GitHub, at:
+#      https://github.com/Hari-Nagarajan/fairgame
+
+import queue
+import threading
+import time
+
+from utils.logger import log
+
+
+class CheckoutCoordinator:
+    """Runs checkouts on their own thread and browser session, so stock checks carry on with the other
+    groups in the meantime.  Groups that were added to the cart are left out of stock checks until their
+    checkout ends.  There is only one cart, so there is one checkout at a time, and a successful order
+    ends the search for the groups that were in the cart when it started.  Groups handed off during a
+    checkout are checked out in the next one, and failed groups go back to being checked.  The watchlist
+    belongs to the stock check thread, so orders are queued for it to apply with apply_orders.
+    """
+
+    def __init__(self, watchlist, session_factory, test=False, single_shot=False):
+        self.watchlist = watchlist
+        # Returns a store whose checkout_cart(test) checks out on a browser session of its own.  It opens
+        # the session through the stock check session's driver, so it is only called from hand_off.
+        self.session_factory = session_factory
+        self.test = test
+        self.single_shot = single_shot
+        self.session = None
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.thread = None
+        # ASINs whose group has been bought, None when the whole watchlist is done
+        self.ordered = queue.Queue()
+        self.checkouts = 0
+        self.orders = 0
+
+    @property
+    def running(self):
+        with self.lock:
+            return self.thread is not None
+
+    def busy_groups(self):
+        """Groups in the checkout.  Read this before apply_orders, so that a group is either still busy
+        or already removed."""
+        with self.lock:
+            return set(self.pending)
+
+    def has_orders(self):
+        return not self.ordered.empty()
+
+    def apply_orders(self):
+        """Stops checking the groups that have been bought.  Only called from the stock check thread."""
+        while True:
+            try:
+                asin = self.ordered.get_nowait()
+            except queue.Empty:
+                return
+            if asin is None:
+                self.watchlist.clear()
+            else:
+                self.watchlist.remove_group(asin)
+
+    def hand_off(self, asin):
+        """Takes over the checkout of asin, which is already in the cart.  Returns False if the checkout
+        session can't be started, in which case the caller has to check out itself."""
+        group = self.watchlist.group_of(asin)
+        with self.lock:
+            session = self.session
+        if session is None:
+            # Only this thread opens sessions, the checkout thread only closes them
+            try:
+                session = self.session_factory()
+            except Exception as e:
+                log.error(f"Unable to start the checkout session: {e}")
+                return False
+            with self.lock:
+                self.session = session
+        with self.lock:
+            self.pending[group] = asin
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self.work, name="checkout", daemon=True
+                )
+                self.thread.start()
+                log.info(f"Handed {asin} to the checkout session")
+            else:
+                log.info(
+                    f"{asin} is in the cart, it will be checked out with the others"
+                )
+        return True
+
+    def work(self):
+        while True:
+            with self.lock:
+                if not self.pending:
+                    self.thread = None
+                    return
+                session = self.session
+                if session is None:
+                    # The session failed, the groups are checked again until the next hand off opens one
+                    log.info(
+                        f"No checkout session for {', '.join(self.pending.values())}, going back to checking stock"
+                    )
+                    self.pending.clear()
+                    self.thread = None
+                    return
+                attempted = dict(self.pending)
+            self.checkouts += 1
+            start_time = time.time()
+            try:
+                success = session.checkout_cart(self.test)
+            except Exception as e:
+                log.error(f"Checkout session failed: {e}")
+                self.close_session()
+                success = False
+            with self.lock:
+                if success:
+                    self.orders += 1
+                    if self.single_shot:
+                        self.ordered.put(None)
+                    # What was handed off once this checkout started is left for the next one
+                    for asin in attempted.values():
+                        self.ordered.put(asin)
+                    log.info(
+                        f"Checkout of {', '.join(attempted.values())} finished in {time.time() - start_time:.1f} seconds"
+                    )
+                else:
+                    log.info(
+                        f"Checkout of {', '.join(attempted.values())} failed, going back to checking stock"
+                    )
+                # Only now the groups stop being busy, so bought ones are never checked in between
+                for group in attempted:
+                    self.pending.pop(group, None)
+
+    def wait(self):
+        """Waits for the checkout in progress, if any, to finish"""
+        with self.lock:
+            thread = self.thread
+        if thread is not None and thread is not threading.current_thread():
+            log.info("Waiting for the checkout in progress to finish")
+            thread.join()
+
+    def close(self):
+        """Closes the checkout session once the checkout in progress, if any, is over, since the session
+        drives a tab of the stock check session's Chrome"""
+        self.wait()
+        self.close_session()
+
+    def close_session(self):
+        with self.lock:
+            session, self.session = self.session, None
+        if session is not None:
+            session.close_checkout_session()
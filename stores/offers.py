@@ -0,0 +1,88 @@
+#      FairGame - Automated Purchasing Program
+#      Copyright (C) 2021  Hari Nagarajan
+#
+#      This program is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      This program is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#      The author may be contacted through the project's GitHub, at:
+#      https://github.com/Hari-Nagarajan/fairgame
+
+import math
+from enum import Enum
+from typing import List, NamedTuple, Optional, Tuple
+
+# Prices within a cent of the reserve limits are accepted
+PRICE_TOLERANCE = 0.01
+
+
+class Offer(NamedTuple):
+    """An offer parsed from the offer listing.  index is its position in the listing, so the caller can
+    find the matching Add To Cart button again."""
+
+    index: int
+    price: Optional[float]
+    shipping: Optional[float]
+    condition: Enum
+
+    @property
+    def total(self):
+        return self.price + (self.shipping or 0.0)
+
+
+class OfferPolicy(NamedTuple):
+    """What a group is willing to buy: the reserve range, the worst acceptable condition and whether
+    offers that charge for shipping are considered"""
+
+    reserve_min: float
+    reserve_max: float
+    condition: Enum
+    check_shipping: bool
+
+
+def rejection_reason(offer: Offer, policy: OfferPolicy) -> Optional[str]:
+    """Returns why the offer is not acceptable under the policy, or None if it is"""
+    if offer.price is None:
+        return "price could not be parsed"
+    if not policy.check_shipping and (offer.shipping or 0.0) > 0.0:
+        return f"shipping is not free ({offer.shipping})"
+    # Lower condition values imply newer
+    if offer.condition.value > policy.condition.value:
+        return f"condition {offer.condition} is below {policy.condition}"
+    total = offer.total
+    if total < policy.reserve_min and not math.isclose(
+        total, policy.reserve_min, abs_tol=PRICE_TOLERANCE
+    ):
+        return f"Min ({policy.reserve_min}) > Price ({offer.price} + {offer.shipping} shipping)"
+    if total > policy.reserve_max and not math.isclose(
+        total, policy.reserve_max, abs_tol=PRICE_TOLERANCE
+    ):
+        return f"Max ({policy.reserve_max}) < Price ({offer.price} + {offer.shipping} shipping)"
+    return None
+
+
+def evaluate_offers(
+    offers: List[Offer], policy: OfferPolicy
+) -> Tuple[List[Offer], List[Tuple[Offer, str]]]:
+    """Splits the offers into the acceptable ones, best first, and the rejected ones with the reason.
+    The best offer is the cheapest including shipping, then the one in the best condition, then the one
+    listed first."""
+    acceptable = []
+    rejected = []
+    for offer in offers:
+        reason = rejection_reason(offer, policy)
+        if reason:
+            rejected.append((offer, reason))
+        else:
+            acceptable.append(offer)
+    acceptable.sort(key=lambda o: (o.total, o.condition.value, o.index))
+    return acceptable, rejected
@@ -0,0 +1,117 @@
+#      FairGame - Automated Purchasing Program
+#      Copyright (C) 2021  Hari Nagarajan
+#
+#      This program is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      This program is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#      The author may be contacted through the project's GitHub, at:
+#      https://github.com/Hari-Nagarajan/fairgame
+
+from typing import Dict, NamedTuple, Optional
+
+from selenium.common import exceptions as sel_exceptions
+
+from utils.logger import log
+
+# Everything the checkout handlers decide on, gathered in one round trip.  arguments[0] maps names to
+# XPaths, arguments[1] is the name of the cart count XPath.  Each name reports whether its first match is
+# present, enabled and displayed.  The document is tagged with a random id the first time it is probed, so
+# a page that replaced itself can be told apart from the one that was probed before.
+PROBE_SCRIPT = """
+var xpaths = arguments[0];
+if (!document.fairgamePageId) {
+    document.fairgamePageId = Math.random().toString(36).slice(2);
+}
+var elements = {};
+var cartCount = null;
+for (var name in xpaths) {
+    var node = null;
+    try {
+        node = document.evaluate(xpaths[name], document, null,
+            XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    } catch (e) {}
+    if (!node) {
+        elements[name] = [false, false, false];
+        continue;
+    }
+    var style = window.getComputedStyle(node);
+    var displayed = style.visibility !== 'hidden' && style.display !== 'none' &&
+        !!(node.offsetWidth || node.offsetHeight || node.getClientRects().length);
+    elements[name] = [true, !node.disabled, displayed];
+    if (name === arguments[1]) {
+        var count = parseInt(node.textContent, 10);
+        cartCount = isNaN(count) ? null : count;
+    }
+}
+return {
+    title: document.title,
+    url: location.href,
+    ready_state: document.readyState,
+    cart_count: cartCount,
+    elements: elements,
+    page_id: document.fairgamePageId
+};
+"""
+
+
+class PageState(NamedTuple):
+    title: str
+    url: str
+    ready_state: str
+    # None when the page has no cart count, like checkout pages
+    cart_count: Optional[int]
+    # name -> (present, enabled, displayed)
+    elements: Dict[str, tuple]
+    # Changes whenever the document is replaced, None if the probe failed
+    page_id: Optional[str] = None
+
+    def has(self, name) -> bool:
+        return self.elements.get(name, (False,))[0]
+
+    def clickable(self, name) -> bool:
+        present, enabled, displayed = self.elements.get(name, (False, False, False))
+        return present and enabled and displayed
+
+    @property
+    def loading(self) -> bool:
+        return self.ready_state == "loading"
+
+
+EMPTY_STATE = PageState("", "", "loading", None, {})
+
+
+class PageProbe:
+    """Reads the state of the current page with a single script, instead of one driver command for the
+    title, the URL, the cart count and each button the checkout handlers look for"""
+
+    def __init__(self, xpaths: Dict[str, str], cart_key="CART"):
+        self.xpaths = dict(xpaths)
+        self.cart_key = cart_key
+
+    def read(self, browser) -> PageState:
+        try:
+            state = browser.execute_script(PROBE_SCRIPT, self.xpaths, self.cart_key)
+        except sel_exceptions.WebDriverException as e:
+            # Usually the page is being replaced, the caller will try again
+            log.debug(f"Page probe failed: {e}")
+            return EMPTY_STATE
+        if not state:
+            return EMPTY_STATE
+        return PageState(
+            title=state.get("title") or "",
+            url=state.get("url") or "",
+            ready_state=state.get("ready_state") or "loading",
+            cart_count=state.get("cart_count"),
+            elements={name: tuple(flags) for name, flags in state["elements"].items()},
+            page_id=state.get("page_id"),
+        )
@@ -0,0 +1,82 @@
+#      FairGame - Automated Purchasing Program
+#      Copyright (C) 2021  Hari Nagarajan
+#
+#      This program is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      This program is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#      The author may be contacted through the project's GitHub, at:
+#      https://github.com/Hari-Nagarajan/fairgame
+
+import re
+import time
+from typing import List, Optional
+
+from selenium.common import exceptions as sel_exceptions
+
+from utils.logger import log
+from utils.retry import Deadline
+
+# Amazon only sets these once signed in: at-main/x-main on amazon.com, at-acbuk/x-acbuk on amazon.co.uk, etc.
+AUTH_COOKIE_PATTERN = re.compile(r"^(sess-)?(at|x)-(main|acb[a-z]{2})$")
+
+DEFAULT_CHECK_INTERVAL = 300
+DEFAULT_REFRESH_MARGIN = 3600
+
+
+class SessionKeeper:
+    """Decides when the Amazon login needs refreshing, from the sign-in cookies in the browser.  Reading
+    cookies doesn't touch the network, so it can run between stock checks without slowing them down.
+    """
+
+    def __init__(
+        self,
+        check_interval=DEFAULT_CHECK_INTERVAL,
+        refresh_margin=DEFAULT_REFRESH_MARGIN,
+    ):
+        self.check_interval = check_interval
+        self.refresh_margin = refresh_margin
+        self.next_check = Deadline(check_interval)
+        self.refreshes = 0
+
+    @classmethod
+    def from_config(cls, config=None):
+        config = config or {}
+        return cls(
+            check_interval=config.get("check_interval", DEFAULT_CHECK_INTERVAL),
+            refresh_margin=config.get("refresh_margin", DEFAULT_REFRESH_MARGIN),
+        )
+
+    def due(self):
+        return self.next_check.expired()
+
+    def check(self, driver) -> Optional[str]:
+        """Returns why the session needs refreshing, or None if it looks good"""
+        self.next_check = Deadline(self.check_interval)
+        try:
+            cookies = driver.get_cookies()
+        except sel_exceptions.WebDriverException as e:
+            log.debug(f"Unable to read cookies: {e}")
+            return None
+        return self.expiry_reason(cookies)
+
+    def expiry_reason(self, cookies: List[dict], now=None) -> Optional[str]:
+        now = now or time.time()
+        auth_cookies = [c for c in cookies if AUTH_COOKIE_PATTERN.match(c["name"])]
+        if not auth_cookies:
+            return "no sign-in cookies found"
+        for cookie in auth_cookies:
+            # Session cookies have no expiry and last as long as the browser does
+            expiry = cookie.get("expiry")
+            if expiry is not None and expiry - now < self.refresh_margin:
+                return f"{cookie['name']} cookie expires in {max(0, int(expiry - now))} seconds"
+        return None
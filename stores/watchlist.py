@@ -0,0 +1,234 @@
+#      FairGame - Automated Purchasing Program
+#      Copyright (C) 2021  Hari Nagarajan
+#
+#      This program is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      This program is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#      The author may be contacted through the project's GitHub, at:
+#      https://github.com/Hari-Nagarajan/fairgame
+
+import csv
+import json
+import os
+import re
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from typing import Iterator, List, Optional, Tuple
+
+from utils.logger import log
+
+ASIN_LENGTH = 10
+ASIN_PATTERN = re.compile(r"^[A-Z0-9]{10}$")
+
+
+class Watchlist:
+    """The ASINs to check, in groups that share a price range.  Buying any ASIN of a group ends the search
+    for the whole group.  ASINs are kept as fixed width records in one bytearray, with the group of each
+    in a parallel array.  Lookups by ASIN go through a sorted array of the ASINs as base 36 numbers, so
+    ten thousand ASINs take a couple of hundred KiB instead of a dict of strings."""
+
+    def __init__(self):
+        self.asins = bytearray()
+        self.asin_groups = array("I")
+        self.reserve_min = array("d")
+        self.reserve_max = array("d")
+        self.group_active = bytearray()
+        self.group_keys = {}
+        self.active_groups = 0
+        self.duplicates = 0
+        # ASINs seen while loading, replaced by the sorted index once loading is done
+        self.seen = set()
+        self.index_keys = array("Q")
+        self.index_positions = array("I")
+
+    def __len__(self):
+        """Number of groups still being searched"""
+        return self.active_groups
+
+    @property
+    def asin_count(self):
+        return len(self.asin_groups)
+
+    def add_group(self, reserve_min, reserve_max, key=None) -> int:
+        reserve_min = float(reserve_min)
+        reserve_max = float(reserve_max)
+        if reserve_min > reserve_max:
+            raise ValueError(
+                f"Minimum price must be <= maximum price: {reserve_min:.2f} > {reserve_max:.2f}"
+            )
+        group = len(self.reserve_min)
+        self.reserve_min.append(reserve_min)
+        self.reserve_max.append(reserve_max)
+        self.group_active.append(1)
+        self.active_groups += 1
+        if key is not None:
+            self.group_keys[key] = group
+        return group
+
+    def add(self, asin, group) -> bool:
+        """Adds asin to group.  Returns False if the ASIN is already watched, in this group or another."""
+        asin = asin.strip().upper()
+        if not ASIN_PATTERN.match(asin):
+            raise ValueError(f"'{asin}' is not an ASIN")
+        if self.seen is None:
+            self.seen = set(self.index_keys)
+        key = int(asin, 36)
+        if key in self.seen:
+            self.duplicates += 1
+            return False
+        self.seen.add(key)
+        self.asins += asin.encode("ascii")
+        self.asin_groups.append(group)
+        return True
+
+    def finish(self):
+        """Builds the lookup index once all ASINs have been added"""
+        if self.seen is None:
+            return
+        self.seen = None
+        entries = sorted(
+            (int(self.asin_at(position), 36), position)
+            for position in range(self.asin_count)
+        )
+        self.index_keys = array("Q", (key for key, _ in entries))
+        self.index_positions = array("I", (position for _, position in entries))
+
+    def position_of(self, asin) -> Optional[int]:
+        self.finish()
+        key = int(asin, 36)
+        idx = bisect_left(self.index_keys, key)
+        if idx < len(self.index_keys) and self.index_keys[idx] == key:
+            return self.index_positions[idx]
+        return None
+
+    def group_of(self, asin) -> Optional[int]:
+        position = self.position_of(asin)
+        return None if position is None else self.asin_groups[position]
+
+    def asin_at(self, position) -> str:
+        start = position * ASIN_LENGTH
+        return self.asins[start : start + ASIN_LENGTH].decode("ascii")
+
+    def reserve(self, group) -> Tuple[float, float]:
+        return self.reserve_min[group], self.reserve_max[group]
+
+    def schedule(self) -> List[Tuple[int, str]]:
+        """The (group, ASIN) pairs still to be checked, in the order they were added"""
+        return [
+            (group, self.asin_at(position))
+            for position, group in enumerate(self.asin_groups)
+            if self.group_active[group]
+        ]
+
+    def groups(self) -> Iterator[Tuple[int, List[str]]]:
+        members = {}
+        for position, group in enumerate(self.asin_groups):
+            if self.group_active[group]:
+                members.setdefault(group, []).append(self.asin_at(position))
+        return iter(members.items())
+
+    def remove_group(self, asin):
+        """Stops checking the group asin belongs to"""
+        position = self.position_of(asin)
+        if position is None:
+            return
+        group = self.asin_groups[position]
+        if self.group_active[group]:
+            self.group_active[group] = 0
+            self.active_groups -= 1
+
+    def clear(self):
+        for group in range(len(self.group_active)):
+            self.group_active[group] = 0
+        self.active_groups = 0
+
+    def nbytes(self) -> int:
+        """Approximate memory used by the watchlist, once loaded"""
+        return sum(
+            sys.getsizeof(a)
+            for a in (
+                self.asins,
+                self.asin_groups,
+                self.reserve_min,
+                self.reserve_max,
+                self.group_active,
+                self.index_keys,
+                self.index_positions,
+            )
+        )
+
+    def add_row(self, asin, reserve_min, reserve_max, group_name=None):
+        key = group_name or (float(reserve_min), float(reserve_max))
+        group = self.group_keys.get(key)
+        if group is None:
+            group = self.add_group(reserve_min, reserve_max, key)
+        elif (float(reserve_min), float(reserve_max)) != self.reserve(group):
+            raise ValueError(f"Group '{group_name}' has more than one price range")
+        self.add(asin, group)
+
+    @classmethod
+    def from_amazon_config(cls, config):
+        """Reads the numbered asin_list_N, reserve_min_N and reserve_max_N keys of amazon_config.json"""
+        watchlist = cls()
+        for x in range(int(config["asin_groups"])):
+            group = watchlist.add_group(
+                config[f"reserve_min_{x + 1}"], config[f"reserve_max_{x + 1}"]
+            )
+            for asin in config[f"asin_list_{x + 1}"]:
+                watchlist.add(asin, group)
+        watchlist.finish()
+        return watchlist
+
+    @classmethod
+    def from_file(cls, path):
+        """Streams a CSV or JSONL watchlist.  Each row has asin, reserve_min, reserve_max and optionally
+        group.  Rows without a group are grouped by their price range.  Blank rows are skipped.
+        """
+        watchlist = cls()
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            jsonl = path.lower().endswith((".jsonl", ".ndjson"))
+            rows = f if jsonl else csv.DictReader(f)
+            for line_num, row in enumerate(rows, start=1):
+                try:
+                    if jsonl:
+                        if not row.strip():
+                            continue
+                        row = json.loads(row)
+                    row = {str(k).strip().lower(): v for k, v in row.items() if k}
+                    if not str(row.get("asin") or "").strip():
+                        continue
+                    watchlist.add_row(
+                        str(row["asin"]),
+                        row["reserve_min"],
+                        row["reserve_max"],
+                        str(row.get("group") or "").strip() or None,
+                    )
+                except (AttributeError, KeyError, ValueError, TypeError) as e:
+                    raise ValueError(f"{path}, row {line_num}: {e}") from e
+        watchlist.finish()
+        return watchlist
+
+
+def load_watchlist(path) -> Watchlist:
+    start_time = time.perf_counter()
+    watchlist = Watchlist.from_file(path)
+    log.info(
+        f"Loaded {watchlist.asin_count} ASINs in {len(watchlist.reserve_min)} groups from "
+        f"{os.path.basename(path)} in {time.perf_counter() - start_time:.3f} seconds, "
+        f"using {watchlist.nbytes() / 1024:.0f} KiB"
+    )
+    if watchlist.duplicates:
+        log.info(f"Skipped {watchlist.duplicates} duplicate ASIN(s)")
+    return watchlist
@@ -0,0 +1,210 @@
+#      FairGame - Automated Purchasing Program
+#      Copyright (C) 2021  Hari Nagarajan
+#
+#      This program is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      This program is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#      The author may be contacted through the project's GitHub, at:
+#      https://github.com/Hari-Nagarajan/fairgame
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from utils.logger import log
+
+DEFAULT_ARTIFACT_PATH = "artifacts"
+DEFAULT_MAX_SIZE_MB = 500
+DEFAULT_MAX_AGE_DAYS = 14
+INDEX_FILE = "index.jsonl"
+# How often old artifacts are looked for, size limits are checked on every save
+AGE_CHECK_INTERVAL = 3600
+
+# Screenshots are already compressed PNGs, so only HTML is gzipped
+KINDS = {"screenshot": ".png", "html": ".html.gz"}
+
+
+class Artifact(NamedTuple):
+    id: int
+    digest: str
+    kind: str
+    page: str
+    asin: Optional[str]
+    time: float
+    size: int
+
+    @property
+    def file_name(self):
+        """A readable name for the artifact when it is extracted"""
+        stamp = datetime.fromtimestamp(self.time).strftime("%m-%d-%Y_%H_%M_%S")
+        extension = ".png" if self.kind == "screenshot" else ".html"
+        return f"{self.id:06d}_{self.page}_{stamp}{extension}"
+
+
+class ArtifactStore:
+    """Keeps screenshots and page sources by the hash of their content, so repeated captures of the same
+    page are stored once.  A small index records every capture, and the oldest artifacts are removed once
+    the store is larger than max_size_mb or older than max_age_days."""
+
+    def __init__(
+        self,
+        path=DEFAULT_ARTIFACT_PATH,
+        max_size_mb=DEFAULT_MAX_SIZE_MB,
+        max_age_days=DEFAULT_MAX_AGE_DAYS,
+    ):
+        self.path = path
+        self.index_path = os.path.join(path, INDEX_FILE)
+        self.max_bytes = max_size_mb * 1024 * 1024 if max_size_mb else None
+        self.max_age = max_age_days * 86400 if max_age_days else None
+        self.lock = threading.Lock()
+        self.next_age_check = 0
+        os.makedirs(path, exist_ok=True)
+        self.artifacts = self.read_index()
+        self.object_sizes = {a.digest: a.size for a in self.artifacts}
+        self.total_size = sum(self.object_sizes.values())
+        self.next_id = max((a.id for a in self.artifacts), default=0) + 1
+
+    @classmethod
+    def from_config(cls, config=None):
+        config = config or {}
+        return cls(
+            path=config.get("path", DEFAULT_ARTIFACT_PATH),
+            max_size_mb=config.get("max_size_mb", DEFAULT_MAX_SIZE_MB),
+            max_age_days=config.get("max_age_days", DEFAULT_MAX_AGE_DAYS),
+        )
+
+    def read_index(self):
+        artifacts = []
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        artifacts.append(Artifact(**json.loads(line)))
+                    except (ValueError, TypeError):
+                        # A line cut short by a crash, skip it
+                        continue
+        except FileNotFoundError:
+            pass
+        return artifacts
+
+    def object_path(self, digest, kind):
+        return os.path.join(self.path, digest[:2], digest + KINDS[kind])
+
+    def save(self, kind, content: bytes, page, asin=None) -> str:
+        """Stores the content unless an identical capture is already stored.  Returns the path of the
+        stored object."""
+        digest = hashlib.sha256(content).hexdigest()
+        object_path = self.object_path(digest, kind)
+        with self.lock:
+            if digest not in self.object_sizes:
+                data = (
+                    gzip.compress(content, compresslevel=6)
+                    if kind == "html"
+                    else content
+                )
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                temp_path = f"{object_path}.tmp"
+                with open(temp_path, "wb") as f:
+                    f.write(data)
+                os.replace(temp_path, object_path)
+                self.object_sizes[digest] = len(data)
+                self.total_size += len(data)
+            artifact = Artifact(
+                id=self.next_id,
+                digest=digest,
+                kind=kind,
+                page=page,
+                asin=asin,
+                time=time.time(),
+                size=self.object_sizes[digest],
+            )
+            self.next_id += 1
+            self.artifacts.append(artifact)
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(artifact._asdict()) + "\n")
+            self.enforce_retention()
+        return object_path
+
+    def enforce_retention(self):
+        now = time.time()
+        too_big = self.max_bytes is not None and self.total_size > self.max_bytes
+        check_age = self.max_age is not None and now >= self.next_age_check
+        if not too_big and not check_age:
+            return
+        self.next_age_check = now + AGE_CHECK_INTERVAL
+        keep = self.artifacts
+        if self.max_age is not None:
+            keep = [a for a in keep if now - a.time <= self.max_age]
+        # Drop the oldest captures until the objects that are still referenced fit.  The newest one is the
+        # capture that was just saved, which is kept even if it doesn't fit on its own.
+        references = Counter(a.digest for a in keep)
+        sizes = {a.digest: a.size for a in keep}
+        total = sum(sizes.values())
+        start = 0
+        while (
+            self.max_bytes is not None
+            and total > self.max_bytes
+            and start < len(keep) - 1
+        ):
+            digest = keep[start].digest
+            start += 1
+            references[digest] -= 1
+            if not references[digest]:
+                total -= sizes.pop(digest)
+        keep = keep[start:]
+        if len(keep) == len(self.artifacts):
+            return
+        removed = {a.digest: a.kind for a in self.artifacts if a.digest not in sizes}
+        for digest, kind in removed.items():
+            try:
+                os.remove(self.object_path(digest, kind))
+            except OSError:
+                pass
+        log.debug(
+            f"Removed {len(self.artifacts) - len(keep)} old captures and {len(removed)} files from {self.path}"
+        )
+        self.artifacts = keep
+        self.object_sizes = sizes
+        self.total_size = total
+        temp_path = f"{self.index_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for artifact in keep:
+                f.write(json.dumps(artifact._asdict()) + "\n")
+        os.replace(temp_path, self.index_path)
+
+    def find(self, kind=None, page=None, asin=None):
+        return [
+            a
+            for a in self.artifacts
+            if (kind is None or a.kind == kind)
+            and (page is None or page in a.page)
+            and (asin is None or a.asin == asin)
+        ]
+
+    def read(self, artifact: Artifact) -> bytes:
+        with open(self.object_path(artifact.digest, artifact.kind), "rb") as f:
+            data = f.read()
+        return gzip.decompress(data) if artifact.kind == "html" else data
+
+    def extract(self, artifact: Artifact, destination) -> str:
+        os.makedirs(destination, exist_ok=True)
+        file_path = os.path.join(destination, artifact.file_name)
+        with open(file_path, "wb") as f:
+            f.write(self.read(artifact))
+        return file_path
@@ -0,0 +1,524 @@
+#      FairGame - Automated Purchasing Program
+#      Copyright (C) 2021  Hari Nagarajan
+#
+#      This program is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      This program is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#      The author may be contacted through the project's GitHub, at:
+#      https://github.com/Hari-Nagarajan/fairgame
+
+import json
+import math
+from abc import ABC, abstractmethod
+import threading
+import time
+
+import requests
+import websocket
+from selenium.common import exceptions as sel_exceptions
+
+from utils.logger import log
+
+DRIVER_BACKENDS = ["selenium", "cdp"]
+CDP_TIMEOUT = 10  # seconds
+CDP_OBJECT_GROUP = "fairgame"
+WINDOW_HANDLE_PREFIX = "CDWINDOW-"
+
+# Wraps element functions so that detached nodes behave like Selenium's stale elements
+STALE_ELEMENT_MESSAGE = "stale element reference"
+ELEMENT_FUNCTION = (
+    "function() {{"
+    "if (!this.isConnected) {{ throw new Error('" + STALE_ELEMENT_MESSAGE + "'); }}"
+    "{body}"
+    "}}"
+)
+FIRST_NODE_FUNCTION = (
+    "document.evaluate({xpath}, {context}, null, "
+    "XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue"
+)
+ALL_NODES_FUNCTION = (
+    "(function(){{"
+    "var r = document.evaluate({xpath}, {context}, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);"
+    "var nodes = [];"
+    "for (var i = 0; i < r.snapshotLength; i++) {{ nodes.push(r.snapshotItem(i)); }}"
+    "return nodes;"
+    "}})()"
+)
+# Mirrors WebElement.get_attribute, which prefers the property when there is one
+GET_ATTRIBUTE_BODY = (
+    "var name = arguments[0];"
+    "var value = this[name];"
+    "if (value === undefined || value === null || typeof value === 'object' || typeof value === 'function') {"
+    "return this.getAttribute(name); }"
+    "return String(value);"
+)
+# Scrolls the element into view and returns the point a click would land on, or why it can't be clicked
+CLICK_POINT_BODY = (
+    "this.scrollIntoView({block: 'center', inline: 'center'});"
+    "var rect = this.getBoundingClientRect();"
+    "if (!rect.width || !rect.height) { return {error: 'not interactable'}; }"
+    "var x = rect.left + rect.width / 2, y = rect.top + rect.height / 2;"
+    "var hit = document.elementFromPoint(x, y);"
+    "if (hit && hit !== this && !this.contains(hit)) {"
+    "return {error: 'intercepted', x: x, y: y, other: hit.outerHTML.slice(0, hit.outerHTML.indexOf('>') + 1)}; }"
+    "return {x: x, y: y};"
+)
+IS_DISPLAYED_BODY = (
+    "var style = window.getComputedStyle(this);"
+    "return style.visibility !== 'hidden' && style.display !== 'none' && "
+    "!!(this.offsetWidth || this.offsetHeight || this.getClientRects().length);"
+)
+
+
+class BrowserDriver(ABC):
+    """The browser operations the Amazon store performs in its stock check and checkout loops.  Element
+    lookups return objects with the same methods as Selenium's WebElement: get_attribute, text, tag_name,
+    click, is_displayed, is_enabled and find_elements_by_xpath."""
+
+    @property
+    @abstractmethod
+    def title(self):
+        raise NotImplementedError
+
+    @property
+    @abstractmethod
+    def current_url(self):
+        raise NotImplementedError
+
+    @property
+    @abstractmethod
+    def page_source(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, url):
+        raise NotImplementedError
+
+    @abstractmethod
+    def refresh(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def find_element_by_xpath(self, xpath):
+        raise NotImplementedError
+
+    @abstractmethod
+    def find_elements_by_xpath(self, xpath):
+        raise NotImplementedError
+
+    @abstractmethod
+    def execute_script(self, script, *args):
+        raise NotImplementedError
+
+    @abstractmethod
+    def execute_async_script(self, script, *args, timeout=CDP_TIMEOUT):
+        """Runs script with a callback as its last argument, and returns what it is called with.  Raises
+        TimeoutException if that doesn't happen within timeout seconds."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SeleniumBrowser(BrowserDriver):
+    """Sends every command to chromedriver over its JSON/HTTP protocol"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.script_timeout = None
+
+    @property
+    def title(self):
+        return self.driver.title
+
+    @property
+    def current_url(self):
+        return self.driver.current_url
+
+    @property
+    def page_source(self):
+        return self.driver.page_source
+
+    def get(self, url):
+        self.driver.get(url)
+
+    def refresh(self):
+        self.driver.refresh()
+
+    def find_element_by_xpath(self, xpath):
+        return self.driver.find_element_by_xpath(xpath)
+
+    def find_elements_by_xpath(self, xpath):
+        return self.driver.find_elements_by_xpath(xpath)
+
+    def execute_script(self, script, *args):
+        return self.driver.execute_script(script, *args)
+
+    def execute_async_script(self, script, *args, timeout=CDP_TIMEOUT):
+        # The script timeout is a session setting.  Scripts end themselves in time, so the setting only
+        # needs to be long enough, and is only sent when a longer one is needed.
+        timeout = math.ceil(timeout)
+        if self.script_timeout is None or timeout > self.script_timeout:
+            self.driver.set_script_timeout(timeout)
+            self.script_timeout = timeout
+        return self.driver.execute_async_script(script, *args)
+
+
+class CdpConnection:
+    """A persistent DevTools Protocol websocket to a single page target"""
+
+    def __init__(self, ws_url, timeout=CDP_TIMEOUT):
+        # Chrome rejects DevTools websockets with an Origin header unless it was started with
+        # --remote-allow-origins, so don't send one
+        self.ws = websocket.create_connection(
+            ws_url, timeout=timeout, suppress_origin=True
+        )
+        self.message_id = 0
+        self.lock = threading.Lock()
+
+    def send(self, method, params=None, timeout=None):
+        """Sends a command and waits for its result, for up to timeout seconds if given instead of the
+        connection's timeout"""
+        with self.lock:
+            self.message_id += 1
+            message_id = self.message_id
+            self.ws.send(
+                json.dumps({"id": message_id, "method": method, "params": params or {}})
+            )
+            default_timeout = self.ws.gettimeout()
+            if timeout is not None:
+                self.ws.settimeout(timeout)
+            try:
+                while True:
+                    # No domains are enabled, but skip over any events that show up anyway
+                    message = json.loads(self.ws.recv())
+                    if message.get("id") == message_id:
+                        break
+            except websocket.WebSocketTimeoutException:
+                raise sel_exceptions.TimeoutException(
+                    f"{method} got no reply within {self.ws.gettimeout()} seconds"
+                )
+            finally:
+                self.ws.settimeout(default_timeout)
+        if "error" in message:
+            error = message["error"].get("message", "")
+            if "Could not find object" in error or "Cannot find context" in error:
+                raise sel_exceptions.StaleElementReferenceException(error)
+            raise sel_exceptions.WebDriverException(f"{method} failed: {error}")
+        return message["result"]
+
+    def close(self):
+        try:
+            self.ws.close()
+        except Exception:
+            pass
+
+
+class CdpElement:
+    def __init__(self, connection, object_id):
+        self.connection = connection
+        self.object_id = object_id
+
+    def call(self, body, *args):
+        result = self.connection.send(
+            "Runtime.callFunctionOn",
+            {
+                "objectId": self.object_id,
+                "functionDeclaration": ELEMENT_FUNCTION.format(body=body),
+                "arguments": [{"value": arg} for arg in args],
+                "returnByValue": True,
+            },
+        )
+        raise_for_exception(result)
+        return result["result"].get("value")
+
+    def get_attribute(self, name):
+        return self.call(GET_ATTRIBUTE_BODY, name)
+
+    @property
+    def text(self):
+        return self.call("return this.innerText;")
+
+    @property
+    def tag_name(self):
+        return self.call("return this.tagName.toLowerCase();")
+
+    def click(self):
+        """Clicks the centre of the element with trusted mouse events, like chromedriver does, and raises
+        the same exceptions when something covers it or it has no size"""
+        point = self.call(CLICK_POINT_BODY)
+        if point.get("error") == "not interactable":
+            raise sel_exceptions.ElementNotInteractableException(
+                "element not interactable"
+            )
+        if point.get("error") == "intercepted":
+            raise sel_exceptions.ElementClickInterceptedException(
+                f"element click intercepted: Element is not clickable at point ({point['x']:.0f}, "
+                f"{point['y']:.0f}). Other element would receive the click: {point['other']}"
+            )
+        for event in ("mouseMoved", "mousePressed", "mouseReleased"):
+            self.connection.send(
+                "Input.dispatchMouseEvent",
+                {
+                    "type": event,
+                    "x": point["x"],
+                    "y": point["y"],
+                    "button": "none" if event == "mouseMoved" else "left",
+                    "clickCount": 0 if event == "mouseMoved" else 1,
+                },
+            )
+
+    def is_displayed(self):
+        return self.call(IS_DISPLAYED_BODY)
+
+    def is_enabled(self):
+        return self.call("return !this.disabled;")
+
+    def find_elements_by_xpath(self, xpath):
+        return find_all(self.connection, xpath, context=self)
+
+
+class CdpBrowser(BrowserDriver):
+    """Talks to the Chrome instance started by chromedriver directly over the DevTools Protocol, so each
+    command costs one websocket message instead of an HTTP request to chromedriver.  Anything that is not
+    part of BrowserDriver (typing, screenshots, cookies) still goes through the Selenium driver.
+    """
+
+    def __init__(self, driver, page_load_strategy="none"):
+        self.driver = driver
+        self.page_load_strategy = page_load_strategy
+        debugger_address = driver.capabilities["goog:chromeOptions"]["debuggerAddress"]
+        targets = requests.get(
+            f"http://{debugger_address}/json", timeout=CDP_TIMEOUT
+        ).json()
+        # chromedriver names windows after their DevTools target, with a CDwindow- prefix in older versions
+        target_id = driver.current_window_handle.upper()
+        if target_id.startswith(WINDOW_HANDLE_PREFIX):
+            target_id = target_id[len(WINDOW_HANDLE_PREFIX) :]
+        page = next(
+            (
+                target
+                for target in targets
+                if target["type"] == "page" and target["id"].upper() == target_id
+            ),
+            None,
+        )
+        if page is None:
+            raise sel_exceptions.WebDriverException(
+                f"No DevTools page target found for window {driver.current_window_handle}"
+            )
+        log.debug(f"Connecting to DevTools target {page['id']}")
+        self.connection = CdpConnection(page["webSocketDebuggerUrl"])
+
+    def evaluate(self, expression, return_by_value=True):
+        result = self.connection.send(
+            "Runtime.evaluate",
+            {
+                "expression": expression,
+                "returnByValue": return_by_value,
+                "objectGroup": CDP_OBJECT_GROUP,
+            },
+        )
+        raise_for_exception(result)
+        return result["result"]
+
+    @property
+    def title(self):
+        return self.evaluate("document.title").get("value")
+
+    @property
+    def current_url(self):
+        return self.evaluate("location.href").get("value")
+
+    @property
+    def page_source(self):
+        return self.evaluate("document.documentElement.outerHTML").get("value")
+
+    def get(self, url):
+        self.release_elements()
+        result = self.connection.send("Page.navigate", {"url": url})
+        if "errorText" in result:
+            raise sel_exceptions.WebDriverException(
+                f"Navigation to {url} failed: {result['errorText']}"
+            )
+        self.wait_for_load()
+
+    def refresh(self):
+        self.release_elements()
+        self.connection.send("Page.reload")
+        self.wait_for_load()
+
+    def release_elements(self):
+        """Frees the remote objects behind the elements found so far, which the next page makes stale"""
+        self.connection.send(
+            "Runtime.releaseObjectGroup", {"objectGroup": CDP_OBJECT_GROUP}
+        )
+
+    def wait_for_load(self):
+        """Page.navigate returns right away, which matches the 'none' page load strategy"""
+        if self.page_load_strategy == "none":
+            return
+        timeout = time.time() + CDP_TIMEOUT
+        while time.time() < timeout:
+            try:
+                if self.evaluate("document.readyState").get("value") == "complete":
+                    return
+            except sel_exceptions.WebDriverException:
+                pass
+            time.sleep(0.05)
+        raise sel_exceptions.TimeoutException("Timed out waiting for the page to load")
+
+    def find_element_by_xpath(self, xpath):
+        result = self.evaluate(
+            FIRST_NODE_FUNCTION.format(xpath=json.dumps(xpath), context="document"),
+            return_by_value=False,
+        )
+        if "objectId" not in result:
+            raise sel_exceptions.NoSuchElementException(f"Unable to locate {xpath}")
+        return CdpElement(self.connection, result["objectId"])
+
+    def find_elements_by_xpath(self, xpath):
+        return find_all(self.connection, xpath)
+
+    def execute_script(self, script, *args):
+        element_args = [arg for arg in args if isinstance(arg, CdpElement)]
+        if not element_args:
+            return self.evaluate(
+                f"(function(){{{script}}}).apply(null, {json.dumps(list(args))})"
+            ).get("value")
+        # Elements can only be passed by object id, so call the script on the first one
+        arguments = [
+            (
+                {"objectId": arg.object_id}
+                if isinstance(arg, CdpElement)
+                else {"value": arg}
+            )
+            for arg in args
+        ]
+        result = self.connection.send(
+            "Runtime.callFunctionOn",
+            {
+                "objectId": element_args[0].object_id,
+                "functionDeclaration": f"function(){{{script}}}",
+                "arguments": arguments,
+                "returnByValue": True,
+            },
+        )
+        raise_for_exception(result)
+        return result["result"].get("value")
+
+    def execute_async_script(self, script, *args, timeout=CDP_TIMEOUT):
+        # Chrome waits for the promise, so the reply arrives as soon as the script calls back
+        expression = (
+            "new Promise(function (resolve) {"
+            f"(function(){{{script}}}).apply(null, {json.dumps(list(args))}.concat([resolve]));"
+            "})"
+        )
+        result = self.connection.send(
+            "Runtime.evaluate",
+            {"expression": expression, "returnByValue": True, "awaitPromise": True},
+            timeout=timeout,
+        )
+        raise_for_exception(result)
+        return result["result"].get("value")
+
+    def close(self):
+        self.connection.close()
+
+
+def find_all(connection, xpath, context=None):
+    expression = ALL_NODES_FUNCTION.format(
+        xpath=json.dumps(xpath), context="context" if context else "document"
+    )
+    if context:
+        result = connection.send(
+            "Runtime.callFunctionOn",
+            {
+                "objectId": context.object_id,
+                "functionDeclaration": f"function() {{ var context = this; return {expression}; }}",
+                "objectGroup": CDP_OBJECT_GROUP,
+            },
+        )
+    else:
+        result = connection.send(
+            "Runtime.evaluate",
+            {"expression": expression, "objectGroup": CDP_OBJECT_GROUP},
+        )
+    raise_for_exception(result)
+    properties = connection.send(
+        "Runtime.getProperties",
+        {"objectId": result["result"]["objectId"], "ownProperties": True},
+    )
+    return [
+        CdpElement(connection, prop["value"]["objectId"])
+        for prop in properties["result"]
+        if prop["name"].isdigit()
+    ]
+
+
+def raise_for_exception(result):
+    if "exceptionDetails" not in result:
+        return
+    details = result["exceptionDetails"]
+    description = details.get("exception", {}).get("description", details.get("text"))
+    if STALE_ELEMENT_MESSAGE in str(description):
+        raise sel_exceptions.StaleElementReferenceException(description)
+    raise sel_exceptions.JavascriptException(description)
+
+
+def create_browser(backend, driver, page_load_strategy="none"):
+    if backend == "cdp":
+        try:
+            return CdpBrowser(driver, page_load_strategy=page_load_strategy)
+        except Exception as e:
+            log.error(f"Unable to connect to Chrome over DevTools, using Selenium: {e}")
+    return SeleniumBrowser(driver)
+
+
+def benchmark_browser(browser, urls, xpath, iterations):
+    """Times each BrowserDriver command against the given pages.  Returns a dict of command name to a
+    list of latencies in milliseconds."""
+    timings = {}
+
+    def timed(name, command):
+        start = time.perf_counter()
+        result = command()
+        timings.setdefault(name, []).append((time.perf_counter() - start) * 1000)
+        return result
+
+    for url in urls:
+        browser.get(url)
+        # Give the page time to settle, so the load itself isn't part of the measurements
+        timeout = time.time() + CDP_TIMEOUT
+        while (
+            browser.execute_script("return document.readyState;") != "complete"
+            and time.time() < timeout
+        ):
+            time.sleep(0.05)
+        for _ in range(iterations):
+            timed("title", lambda: browser.title)
+            timed("current_url", lambda: browser.current_url)
+            timed(
+                "find_elements_by_xpath", lambda: browser.find_elements_by_xpath(xpath)
+            )
+            try:
+                element = timed(
+                    "find_element_by_xpath",
+                    lambda: browser.find_element_by_xpath(xpath),
+                )
+            except sel_exceptions.NoSuchElementException:
+                continue
+            timed("get_attribute", lambda: element.get_attribute("id"))
+            timed("text", lambda: element.text)
+            timed("execute_script", lambda: browser.execute_script("return 1;"))
+    return timings
@@ -0,0 +1,146 @@
+#      FairGame - Automated Purchasing Program
+#      Copyright (C) 2021  Hari Nagarajan
+#
+#      This program is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      This program is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#      The author may be contacted through the project's GitHub, at:
+#      https://github.com/Hari-Nagarajan/fairgame
+
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import psutil
+
+from utils.logger import log
+
+# tmpfs mounts that are backed by RAM
+RAM_DIRS = ["/dev/shm"]
+PROFILE_PREFIX = "fairgame-profile-"
+# Only cookies for these domains are persisted between runs
+COOKIE_DOMAINS = ["amazon"]
+# Fields accepted by the Network.setCookies DevTools command
+COOKIE_FIELDS = ["name", "value", "domain", "path", "secure", "httpOnly", "sameSite"]
+DEFAULT_SYNC_INTERVAL = 300  # seconds
+
+
+def get_ram_dir():
+    for ram_dir in RAM_DIRS:
+        if os.path.isdir(ram_dir) and os.access(ram_dir, os.W_OK):
+            return ram_dir
+    return None
+
+
+class EphemeralProfile:
+    """A throw-away Chrome profile in RAM.  Only the login cookies are kept, in a small JSON store on disk,
+    which is restored into each new browser and synced back periodically and on shutdown.
+    """
+
+    def __init__(self, cookie_store_path, sync_interval=DEFAULT_SYNC_INTERVAL):
+        self.cookie_store_path = cookie_store_path
+        self.sync_interval = sync_interval
+        self.path = None
+        self.last_sync = time.monotonic()
+
+    def materialize(self):
+        base_dir = get_ram_dir()
+        if not base_dir:
+            base_dir = tempfile.gettempdir()
+            log.info(f"No RAM disk found, using {base_dir} for the temporary profile")
+        remove_orphaned_profiles(base_dir)
+        self.path = tempfile.mkdtemp(
+            prefix=f"{PROFILE_PREFIX}{os.getpid()}-", dir=base_dir
+        )
+        log.debug(f"Created temporary browser profile at {self.path}")
+        return self.path
+
+    def restore(self, driver):
+        cookies = self.load_cookies()
+        if not cookies:
+            return
+        try:
+            driver.execute_cdp_cmd("Network.setCookies", {"cookies": cookies})
+            log.debug(f"Restored {len(cookies)} cookies into the browser")
+        except Exception as e:
+            log.warning(f"Unable to restore saved cookies: {e}")
+
+    def maybe_sync(self, driver):
+        if time.monotonic() - self.last_sync >= self.sync_interval:
+            self.sync(driver)
+
+    def sync(self, driver):
+        self.last_sync = time.monotonic()
+        try:
+            cookies = driver.execute_cdp_cmd("Network.getAllCookies", {})["cookies"]
+        except Exception as e:
+            log.debug(f"Unable to read cookies from the browser: {e}")
+            return
+        saved = [
+            compact_cookie(cookie)
+            for cookie in cookies
+            if any(domain in cookie["domain"] for domain in COOKIE_DOMAINS)
+        ]
+        temp_path = self.cookie_store_path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(saved, f, separators=(",", ":"))
+            os.replace(temp_path, self.cookie_store_path)
+        except OSError as e:
+            log.warning(f"Unable to save cookies to {self.cookie_store_path}: {e}")
+            return
+        log.debug(f"Saved {len(saved)} cookies to {self.cookie_store_path}")
+
+    def load_cookies(self):
+        if not os.path.exists(self.cookie_store_path):
+            return []
+        try:
+            with open(self.cookie_store_path, encoding="utf-8") as f:
+                cookies = json.load(f)
+        except ValueError:
+            log.warning(f"Ignoring unreadable cookie store {self.cookie_store_path}")
+            return []
+        now = time.time()
+        return [
+            cookie
+            for cookie in cookies
+            if "expires" not in cookie or cookie["expires"] > now
+        ]
+
+    def cleanup(self):
+        if self.path:
+            shutil.rmtree(self.path, ignore_errors=True)
+            self.path = None
+
+
+def compact_cookie(cookie):
+    compact = {field: cookie[field] for field in COOKIE_FIELDS if field in cookie}
+    if not cookie.get("session", False) and cookie.get("expires", -1) > 0:
+        compact["expires"] = cookie["expires"]
+    return compact
+
+
+def remove_orphaned_profiles(base_dir):
+    """Removes temporary profiles left behind by FairGame processes that are no longer running"""
+    for entry in os.listdir(base_dir):
+        if not entry.startswith(PROFILE_PREFIX):
+            continue
+        try:
+            pid = int(entry[len(PROFILE_PREFIX) :].split("-")[0])
+        except ValueError:
+            continue
+        if not psutil.pid_exists(pid):
+            log.debug(f"Removing orphaned profile {entry}")
+            shutil.rmtree(os.path.join(base_dir, entry), ignore_errors=True)
@@ -17,6 +17,8 @@
 #      The author may be contacted through the project's GitHub, at:
 #      https://github.com/Hari-Nagarajan/fairgame
 
+import asyncio
+import threading
 import time
 
 from pypresence import Presence
@@ -24,22 +26,19 @@ from pypresence import Presence
 from utils.logger import log
 from utils.version import version
 
-FAILS_BETWEEN_RETRY = 5
+# Discord only accepts one presence update every 15 seconds
+UPDATE_INTERVAL = 15
+MIN_RECONNECT_DELAY = 5
+MAX_RECONNECT_DELAY = 300
 
 start_time = int(time.time())
 client_id = "783592971903696907"
 enabled = True
-connected = False
-failure_count = 0
-RPC = Presence(client_id=client_id)
-
-try:
-    RPC.connect()
-    connected = True
-except:
-    # Eat the exception to allow main app processing to continue
-    connected = False
-    pass
+
+# Only the latest requested state is kept, the worker thread pushes it to Discord when it changes
+desired_state = None
+state_changed = threading.Condition()
+worker = None
 
 
 def start_presence():
@@ -55,39 +54,74 @@ def searching_update():
 
 
 def send_update(state):
-    global connected
-    global failure_count
+    """Records the state to show in Discord.  Never blocks on Discord, the update is sent by the
+    presence worker thread."""
+    global desired_state
 
-    if enabled:
+    if not enabled:
         # Only process messages if the user has this enabled
-        if connected:
-            # Only try to send messages if the connection is available
-            try:
-                RPC.update(
-                    large_image="fairgame",
-                    state=state,
-                    details=f"{version}",
-                    start=start_time,
-                )
-                # Reset the failure count on every successful update
-                failure_count = 0
-                return
-            except:
-                # Track the number of failures
-                failure_count += 1
-                # Eat the exception to allow main app processing to continue
-                pass
-        else:
-            failure_count += 1
-
-        # Retry the Discord connection every now and then in case it was disconnected and is back
-        if failure_count % FAILS_BETWEEN_RETRY == 0:
+        return
+    with state_changed:
+        desired_state = state
+        state_changed.notify()
+    start_worker()
+
+
+def start_worker():
+    global worker
+
+    if worker is None:
+        worker = threading.Thread(target=presence_worker, daemon=True)
+        worker.start()
+
+
+def presence_worker():
+    # pypresence runs on asyncio, so this thread needs a loop of its own
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    rpc = Presence(client_id=client_id)
+    connected = False
+    reconnect_delay = MIN_RECONNECT_DELAY
+    sent_state = None
+
+    while True:
+        with state_changed:
+            while desired_state == sent_state:
+                state_changed.wait()
+            state = desired_state
+
+        if not connected:
             try:
-                RPC.connect()
+                rpc.connect()
                 connected = True
-                log.debug("Reconnected to Discord Presence")
+                log.debug("Connected to Discord Presence")
             except Exception as e:
-                # Well, we tried.
-                log.debug(f"Failed reconnect attempt. {e}")
-                connected = False
-                pass
+                # Well, we tried.  Back off before the next attempt
+                log.debug(
+                    f"Failed to connect to Discord Presence, retrying in {reconnect_delay} seconds. {e}"
+                )
+                time.sleep(reconnect_delay)
+                reconnect_delay = min(reconnect_delay * 2, MAX_RECONNECT_DELAY)
+                continue
+
+        try:
+            rpc.update(
+                large_image="fairgame",
+                state=state,
+                details=f"{version}",
+                start=start_time,
+            )
+            sent_state = state
+            # The delay only starts over once an update goes through, since Discord can accept the
+            # connection and still fail every update
+            reconnect_delay = MIN_RECONNECT_DELAY
+        except Exception as e:
+            log.debug(
+                f"Failed to update Discord Presence, reconnecting in {reconnect_delay} seconds. {e}"
+            )
+            connected = False
+            time.sleep(reconnect_delay)
+            reconnect_delay = min(reconnect_delay * 2, MAX_RECONNECT_DELAY)
+            continue
+
+        # Anything requested in the meantime is coalesced into a single update
+        time.sleep(UPDATE_INTERVAL)
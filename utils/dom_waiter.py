@@ -0,0 +1,119 @@
+#      FairGame - Automated Purchasing Program
+#      Copyright (C) 2021  Hari Nagarajan
+#
+#      This program is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      This program is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#      The author may be contacted through the project's GitHub, at:
+#      https://github.com/Hari-Nagarajan/fairgame
+
+import time
+from typing import Dict
+
+from selenium.common import exceptions as sel_exceptions
+
+from utils import metrics
+from utils.logger import log
+from utils.retry import Deadline
+
+# The driver gives up this long after the script's own timer, so the script is the one that times out
+SCRIPT_TIMEOUT_MARGIN = 2  # seconds
+# Pause before watching again when the document was replaced mid-wait
+RESTART_DELAY = 0.05  # seconds
+
+# arguments[0] maps names to XPaths, arguments[1] is the timeout in ms and arguments[2] maps names to XPaths
+# that only count while none of the others match.  Calls back with the name whose first match comes first
+# in the document, like a union of the XPaths would, as soon as one matches, or with null once the timeout
+# is up.  The DOM is only searched again after nodes are added or removed.
+WAIT_SCRIPT = """
+var selectors = arguments[0];
+var fallbacks = arguments[2];
+var done = arguments[arguments.length - 1];
+var finished = false;
+var observer = null;
+var timer = null;
+function first(selectors) {
+    var best = null, bestNode = null;
+    for (var name in selectors) {
+        var node = null;
+        try {
+            node = document.evaluate(selectors[name], document, null,
+                XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+        } catch (e) {}
+        if (node && (!bestNode ||
+                bestNode.compareDocumentPosition(node) & Node.DOCUMENT_POSITION_PRECEDING)) {
+            best = name;
+            bestNode = node;
+        }
+    }
+    return best;
+}
+function match() {
+    return first(selectors) || first(fallbacks);
+}
+function finish(name) {
+    if (finished) { return; }
+    finished = true;
+    if (observer) { observer.disconnect(); }
+    clearTimeout(timer);
+    done(name);
+}
+var found = match();
+if (found) {
+    finish(found);
+} else {
+    observer = new MutationObserver(function () {
+        var name = match();
+        if (name) { finish(name); }
+    });
+    observer.observe(document, {childList: true, subtree: true});
+    timer = setTimeout(function () { finish(null); }, arguments[1]);
+}
+"""
+
+
+def wait_for_any(browser, selectors: Dict[str, str], timeout, fallbacks=None) -> str:
+    """Waits for any of the named XPaths to match in the current page, and returns the name of the one that
+    matched.  The fallbacks are only returned while none of the selectors match.  Raises TimeoutException if
+    nothing matches within timeout seconds.
+
+    The script is sent the same arguments on every call, so recorded sessions replay them exactly.  Its own
+    timer ends the wait, and a wait that restarts after a navigation may run past the deadline by up to one
+    timeout."""
+    deadline = Deadline(timeout)
+    start_time = time.perf_counter()
+    while not deadline.expired():
+        try:
+            matched = browser.execute_async_script(
+                WAIT_SCRIPT,
+                selectors,
+                int(timeout * 1000),
+                fallbacks or {},
+                timeout=timeout + SCRIPT_TIMEOUT_MARGIN,
+            )
+        except sel_exceptions.TimeoutException:
+            break
+        except sel_exceptions.WebDriverException as e:
+            # Navigating away ends the script without calling back, so watch the next document
+            log.debug(f"Restarting the wait for {', '.join(selectors)}: {e}")
+            time.sleep(RESTART_DELAY)
+            continue
+        if not matched:
+            break
+        elapsed = time.perf_counter() - start_time
+        metrics.dom_waits.observe(elapsed)
+        log.debug(f"{matched} appeared after {elapsed * 1000:.0f} ms")
+        return matched
+    raise sel_exceptions.TimeoutException(
+        f"None of {', '.join(selectors)} appeared within {timeout} seconds"
+    )
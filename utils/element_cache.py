@@ -0,0 +1,94 @@
+#      FairGame - Automated Purchasing Program
+#      Copyright (C) 2021  Hari Nagarajan
+#
+#      This program is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      This program is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#      The author may be contacted through the project's GitHub, at:
+#      https://github.com/Hari-Nagarajan/fairgame
+
+from collections import Counter
+
+from selenium.common import exceptions as sel_exceptions
+
+from utils import metrics
+
+
+class ElementCache:
+    """Element handles for the page that is currently loaded, by a logical name like "PTC" or "html".  A
+    cached handle costs no driver round trip, but is only good until the page is replaced.  The cache is
+    cleared when the bot navigates, and when the page probe reports a different document, which catches
+    redirects at no extra cost.  Lookups that fail aren't cached, since the element may still appear.
+    """
+
+    def __init__(self):
+        self.elements = {}
+        # The page probe's id of the document the handles belong to, None until the first probe
+        self.page_id = None
+        self.hits = Counter()
+        self.misses = Counter()
+        self.stale = Counter()
+
+    def on_page(self, page_id):
+        """Drops the handles if the page probe reports a different document than the one they were found
+        in.  Handles found before the first probe after a navigation are taken to belong to the new page.
+        """
+        if page_id is None:
+            return
+        if self.page_id is not None and page_id != self.page_id:
+            self.elements.clear()
+        self.page_id = page_id
+
+    def find(self, name, finder):
+        """Returns the handle cached under name, or the one finder() returns, which is then cached"""
+        element = self.elements.get(name)
+        if element is not None:
+            self.hits[name] += 1
+            metrics.element_lookups.inc(name=name, result="hit")
+            return element
+        self.misses[name] += 1
+        metrics.element_lookups.inc(name=name, result="miss")
+        element = finder()
+        self.elements[name] = element
+        return element
+
+    def use(self, name, finder, action):
+        """Returns action(element) for the element under name, finding it again if the cached handle
+        turns out to be from a page that has been replaced"""
+        try:
+            return action(self.find(name, finder))
+        except sel_exceptions.StaleElementReferenceException:
+            self.stale[name] += 1
+            metrics.element_lookups.inc(name=name, result="stale")
+            self.elements.pop(name, None)
+            return action(self.find(name, finder))
+
+    def clear(self):
+        self.elements.clear()
+        self.page_id = None
+
+    def summary(self):
+        names = sorted(set(self.hits) | set(self.misses))
+        if not names:
+            return "Element cache: no lookups"
+        hits = sum(self.hits.values())
+        lookups = hits + sum(self.misses.values())
+        parts = []
+        for name in names:
+            name_lookups = self.hits[name] + self.misses[name]
+            stale = f", {self.stale[name]} stale" if self.stale[name] else ""
+            parts.append(f"{name} {self.hits[name]}/{name_lookups}{stale}")
+        return (
+            f"Element cache: {hits}/{lookups} hits ({hits / lookups:.0%}), "
+            + ", ".join(parts)
+        )
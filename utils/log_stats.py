@@ -0,0 +1,298 @@
+#      FairGame - Automated Purchasing Program
+#      Copyright (C) 2021  Hari Nagarajan
+#
+#      This program is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      This program is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#      The author may be contacted through the project's GitHub, at:
+#      https://github.com/Hari-Nagarajan/fairgame
+
+import bz2
+import gzip
+import lzma
+import mmap
+import os
+import re
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from typing import Iterator, List, Optional
+
+from utils.logger import log
+
+# Rotated logs may have been compressed by hand or by logrotate
+OPENERS = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open}
+CHUNK_SIZE = 16 * 1024 * 1024
+READ_ERRORS = (OSError, EOFError, lzma.LZMAError)
+
+TIMESTAMP_LENGTH = len("YYYY-MM-DD HH:MM:SS")
+
+# The messages the stats are made of, in the asctime|version|level|message format of utils.logger.
+# Matching starts at the level, since anchoring each line with ^ makes the regex engine try every
+# byte.  The timestamp is then read from the start of the line.  Nothing else is decoded or split.
+EVENT_PATTERN = re.compile(
+    rb"\|[A-Z]+\|(?:"
+    rb"Checking ASIN: (?P<check>[A-Z0-9]{10})"
+    rb"|Found (?P<offers>\d+) offers for (?P<offers_asin>[A-Z0-9]{10})"
+    rb"|Item (?P<stock>[A-Z0-9]{10}) in stock"
+    rb"|(?P<over>Offers exceed price range)"
+    rb"|Purchase attempt \((?P<method>\w+)\) for (?P<attempt>[A-Z0-9]{10}): (?P<outcome>\w+)"
+    rb"|  From cart: took (?P<checkout>[\d.]+) to check out"
+    rb"|(?P<order>Order Placed\.)"
+    rb")",
+)
+
+
+class AsinStats:
+    __slots__ = (
+        "checks",
+        "offer_pages",
+        "offers",
+        "in_stock",
+        "over_range",
+        "attempts",
+        "checkouts",
+        "orders",
+    )
+
+    def __init__(self):
+        self.checks = 0
+        self.offer_pages = 0
+        self.offers = 0
+        self.in_stock = 0
+        self.over_range = 0
+        # (method, outcome) -> count
+        self.attempts = Counter()
+        self.checkouts = []
+        self.orders = 0
+
+
+class LogStats:
+    """Aggregates stock checks, offers, purchase attempts and checkouts per ASIN from FairGame logs.
+    since and until are "YYYY-MM-DD HH:MM:SS" strings, compared as text against the log timestamps.
+    """
+
+    def __init__(self, since=None, until=None):
+        self.since = since.encode("ascii") if since else None
+        self.until = until.encode("ascii") if until else None
+        self.asins = {}
+        self.files = 0
+        self.bytes_read = 0
+        self.elapsed = 0.0
+        self.first_event = None
+        self.last_event = None
+        self.reset_context()
+
+    def reset_context(self):
+        # Checkouts and orders don't name the ASIN, they belong to the last one that was checked or bought
+        self.last_asin = None
+
+    def asin(self, asin):
+        stats = self.asins.get(asin)
+        if stats is None:
+            stats = self.asins[asin] = AsinStats()
+        return stats
+
+    def read(self, path):
+        self.reset_context()
+        for buffer in read_buffers(path):
+            self.bytes_read += len(buffer)
+            self.feed(buffer)
+        self.files += 1
+
+    def feed(self, buffer):
+        since, until = self.since, self.until
+        for match in EVENT_PATTERN.finditer(buffer):
+            line_start = buffer.rfind(b"\n", 0, match.start()) + 1
+            timestamp = bytes(buffer[line_start : line_start + TIMESTAMP_LENGTH])
+            if since and timestamp < since:
+                continue
+            if until and timestamp >= until:
+                continue
+            if self.first_event is None:
+                self.first_event = timestamp
+            self.last_event = timestamp
+            event = match.lastgroup
+            if event == "check":
+                self.last_asin = match.group("check").decode()
+                self.asin(self.last_asin).checks += 1
+            elif event == "offers_asin":
+                self.last_asin = match.group("offers_asin").decode()
+                stats = self.asin(self.last_asin)
+                stats.offer_pages += 1
+                stats.offers += int(match.group("offers"))
+            elif event == "stock":
+                self.last_asin = match.group("stock").decode()
+                self.asin(self.last_asin).in_stock += 1
+            elif event == "over" and self.last_asin:
+                self.asin(self.last_asin).over_range += 1
+            elif event == "outcome":
+                self.last_asin = match.group("attempt").decode()
+                self.asin(self.last_asin).attempts[
+                    match.group("method").decode(), match.group("outcome").decode()
+                ] += 1
+            elif event == "checkout" and self.last_asin:
+                self.asin(self.last_asin).checkouts.append(
+                    float(match.group("checkout"))
+                )
+            elif event == "order" and self.last_asin:
+                self.asin(self.last_asin).orders += 1
+
+    def merge(self, other):
+        """Adds the stats of other, read from different files, to these"""
+        for asin, theirs in other.asins.items():
+            ours = self.asin(asin)
+            for name in ("checks", "offer_pages", "offers", "in_stock", "over_range"):
+                setattr(ours, name, getattr(ours, name) + getattr(theirs, name))
+            ours.attempts.update(theirs.attempts)
+            ours.checkouts.extend(theirs.checkouts)
+            ours.orders += theirs.orders
+        self.files += other.files
+        self.bytes_read += other.bytes_read
+        if other.first_event and (
+            not self.first_event or other.first_event < self.first_event
+        ):
+            self.first_event = other.first_event
+        if other.last_event and (
+            not self.last_event or other.last_event > self.last_event
+        ):
+            self.last_event = other.last_event
+
+    def report(self, asins=None) -> List[str]:
+        lines = []
+        if self.first_event:
+            lines.append(
+                f"Events from {self.first_event.decode()} to {self.last_event.decode()}"
+            )
+        lines.append(
+            f"{'ASIN':<10} {'checks':>8} {'offers':>8} {'in stock':>8} {'over':>6} "
+            f"{'ATC ok/fail':>11} {'BIN ok/fail':>11} {'orders':>6}  checkout (mean/max s)"
+        )
+        for asin in sorted(asins or self.asins):
+            stats = self.asins.get(asin) or AsinStats()
+            attempts = stats.attempts
+            atc = f"{attempts['atc', 'success'] + attempts['legacy', 'success']}/{attempts['atc', 'failure'] + attempts['legacy', 'failure']}"
+            buy_now = f"{attempts['bin', 'success']}/{attempts['bin', 'failure']}"
+            checkout = (
+                f"{sum(stats.checkouts) / len(stats.checkouts):.1f}/{max(stats.checkouts):.1f}"
+                if stats.checkouts
+                else "-"
+            )
+            lines.append(
+                f"{asin:<10} {stats.checks:>8} {stats.offers:>8} {stats.in_stock:>8} {stats.over_range:>6} "
+                f"{atc:>11} {buy_now:>11} {stats.orders:>6}  {checkout}"
+            )
+        megabytes = self.bytes_read / 2**20
+        lines.append(
+            f"Read {megabytes:.1f} MiB from {self.files} file(s) in {self.elapsed:.2f} seconds"
+            f" ({megabytes / self.elapsed if self.elapsed else 0:.0f} MiB/s)"
+        )
+        return lines
+
+
+def read_log_file(path, since=None, until=None) -> LogStats:
+    stats = LogStats(since, until)
+    stats.read(path)
+    return stats
+
+
+def read_logs(paths, since=None, until=None, workers=None) -> LogStats:
+    """Reads the log files in parallel, one process per file, since each one is a separate run"""
+    start_time = time.perf_counter()
+    stats = LogStats(since, until)
+    if len(paths) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                path: executor.submit(read_log_file, path, since, until)
+                for path in paths
+            }
+            for path, future in futures.items():
+                try:
+                    stats.merge(future.result())
+                except READ_ERRORS as e:
+                    log.error(f"Unable to read {path}: {e}")
+    else:
+        for path in paths:
+            try:
+                stats.merge(read_log_file(path, since, until))
+            except READ_ERRORS as e:
+                log.error(f"Unable to read {path}: {e}")
+    stats.elapsed = time.perf_counter() - start_time
+    return stats
+
+
+def log_files(log_dir, file_name) -> List[str]:
+    """The current log and its rotations in log_dir, oldest first"""
+    pattern = re.compile(
+        re.escape(file_name)
+        + r"(?:\.(\d+))?("
+        + "|".join(map(re.escape, OPENERS))
+        + ")?$"
+    )
+    found = []
+    for name in os.listdir(log_dir):
+        match = pattern.match(name)
+        if match:
+            found.append((int(match.group(1) or 0), os.path.join(log_dir, name)))
+    return [path for _, path in sorted(found, reverse=True)]
+
+
+def read_buffers(path) -> Iterator[bytes]:
+    """Yields the content of a log file in buffers that end on line boundaries.  Plain files are memory
+    mapped in one piece, compressed ones are decompressed a chunk at a time."""
+    opener = OPENERS.get(os.path.splitext(path)[1])
+    if opener is None:
+        if os.path.getsize(path) == 0:
+            return
+        with open(path, "rb") as f, mmap.mmap(
+            f.fileno(), 0, access=mmap.ACCESS_READ
+        ) as buffer:
+            yield buffer
+        return
+    with opener(path, "rb") as f:
+        remainder = b""
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            chunk = remainder + chunk
+            end = chunk.rfind(b"\n") + 1
+            remainder = chunk[end:]
+            if end:
+                yield chunk[:end]
+        if remainder:
+            yield remainder
+
+
+def parse_time(value, end=False) -> Optional[str]:
+    """Accepts today, yesterday, YYYY-MM-DD or YYYY-MM-DD HH:MM:SS.  A day on its own means its start,
+    or the start of the next day if end is set."""
+    if not value:
+        return None
+    value = value.strip()
+    if re.match(r"^\d{4}-\d\d-\d\d \d\d:\d\d:\d\d$", value):
+        return value
+    if value == "today":
+        day = date.today()
+    elif value == "yesterday":
+        day = date.today() - timedelta(days=1)
+    elif re.match(r"^\d{4}-\d\d-\d\d$", value):
+        day = date.fromisoformat(value)
+    else:
+        raise ValueError(
+            f"'{value}' is not today, yesterday, YYYY-MM-DD or YYYY-MM-DD HH:MM:SS"
+        )
+    if end:
+        day += timedelta(days=1)
+    return f"{day.isoformat()} 00:00:00"
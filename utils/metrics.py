@@ -0,0 +1,353 @@
+#      FairGame - Automated Purchasing Program
+#      Copyright (C) 2021  Hari Nagarajan
+#
+#      This program is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      This program is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#      The author may be contacted through the project's GitHub, at:
+#      https://github.com/Hari-Nagarajan/fairgame
+
+import inspect
+import threading
+import time
+import weakref
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.logger import log
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Set by start_metrics_server
+server = None
+DEFAULT_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(
+        f'{name}="{escape(str(value))}"' for name, value in sorted(labels.items())
+    )
+    return "{" + pairs + "}"
+
+
+def escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metric:
+    metric_type = "untyped"
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self.lock = threading.Lock()
+
+    def header(self):
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        return self.header() + [
+            f"{name}{format_labels(labels)} {value}"
+            for name, labels, value in self.samples()
+        ]
+
+
+class Counter(Metric):
+    """A counter, optionally split by labels.  Counters without labels report 0 before their first event,
+    so a scrape can tell "nothing happened" from "not reported"."""
+
+    metric_type = "counter"
+
+    def __init__(self, name, documentation, labelled=False):
+        super().__init__(name, documentation)
+        self.values = {} if labelled else {(): 0}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, dict(key), value) for key, value in self.values.items()]
+
+
+class Gauge(Metric):
+    """A gauge that is either set directly, or computed by a callback when scraped.  The callback returns
+    a number, or a list of (labels, value) tuples.  Bound methods are held through a weak reference, so a
+    gauge doesn't keep the object it reports on alive."""
+
+    metric_type = "gauge"
+
+    def __init__(self, name, documentation, callback=None):
+        super().__init__(name, documentation)
+        self.values = {}
+        self.callback = None
+        self.set_callback(callback)
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[tuple(sorted(labels.items()))] = value
+
+    def set_callback(self, callback):
+        if callback is None:
+            self.callback = None
+        elif inspect.ismethod(callback):
+            self.callback = weakref.WeakMethod(callback)
+        else:
+            self.callback = lambda: callback
+
+    def clear_callback(self, owner):
+        """Removes the callback if it is a method of owner"""
+        callback = self.callback() if self.callback else None
+        if callback is None or getattr(callback, "__self__", None) is owner:
+            self.callback = None
+
+    def samples(self):
+        callback = self.callback() if self.callback else None
+        if callback:
+            try:
+                result = callback()
+            except Exception as e:
+                log.debug(f"Unable to collect {self.name}: {e}")
+                return []
+            if isinstance(result, list):
+                return [(self.name, labels, value) for labels, value in result]
+            return [(self.name, {}, result)]
+        with self.lock:
+            return [(self.name, dict(key), value) for key, value in self.values.items()]
+
+
+class Histogram(Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = sorted(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        with self.lock:
+            self.count += 1
+            self.sum += value
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[idx] += 1
+
+    def samples(self):
+        with self.lock:
+            samples = [
+                (f"{self.name}_bucket", {"le": str(bound)}, count)
+                for bound, count in zip(self.buckets, self.counts)
+            ]
+            samples.append((f"{self.name}_bucket", {"le": "+Inf"}, self.count))
+            samples.append((f"{self.name}_sum", {}, self.sum))
+            samples.append((f"{self.name}_count", {}, self.count))
+        return samples
+
+
+class RateWindow:
+    """Counts events over a sliding window, for 'per minute' style gauges"""
+
+    def __init__(self, window=60):
+        self.window = window
+        self.events = deque()
+        self.lock = threading.Lock()
+
+    def add(self):
+        with self.lock:
+            self.events.append(time.monotonic())
+
+    def count(self):
+        cutoff = time.monotonic() - self.window
+        with self.lock:
+            while self.events and self.events[0] < cutoff:
+                self.events.popleft()
+            return len(self.events)
+
+
+registry = []
+
+
+def register(metric):
+    registry.append(metric)
+    return metric
+
+
+def render():
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+stock_checks = register(
+    Counter(
+        "fairgame_stock_checks_total", "Stock checks performed, by ASIN", labelled=True
+    )
+)
+stock_check_rate = RateWindow()
+stock_checks_per_minute = register(
+    Gauge(
+        "fairgame_stock_checks_per_minute",
+        "Stock checks performed in the last minute",
+        callback=stock_check_rate.count,
+    )
+)
+last_check = {}
+last_check_age = register(
+    Gauge(
+        "fairgame_last_check_age_seconds",
+        "Seconds since each ASIN was last checked",
+        callback=lambda: [
+            ({"asin": asin}, round(time.time() - checked, 3))
+            for asin, checked in list(last_check.items())
+        ],
+    )
+)
+offer_page_load = register(
+    Histogram(
+        "fairgame_offer_page_load_seconds",
+        "Time to load an offer page until its offers could be evaluated",
+    )
+)
+offer_url_checks = register(
+    Counter(
+        "fairgame_offer_url_checks_total",
+        "Offer page checks by ASIN, offer URL variant and whether they got to a decision",
+        labelled=True,
+    )
+)
+offer_url_cost = register(
+    Gauge(
+        "fairgame_offer_url_cost_seconds",
+        "Moving average of the seconds an offer URL variant takes to decide an ASIN, failures included",
+    )
+)
+dom_waits = register(
+    Histogram(
+        "fairgame_dom_wait_seconds",
+        "Time from starting to watch the page until a waited for element appeared",
+        buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10),
+    )
+)
+purchase_attempts = register(
+    Counter(
+        "fairgame_purchase_attempts_total",
+        "Add To Cart and Buy It Now attempts, by method and outcome",
+        labelled=True,
+    )
+)
+element_lookups = register(
+    Counter(
+        "fairgame_element_lookups_total",
+        "Element lookups through the element cache, by logical name and result",
+        labelled=True,
+    )
+)
+element_cache_hit_ratio = register(
+    Gauge(
+        "fairgame_element_cache_hit_ratio",
+        "Share of element lookups served from the element cache",
+        callback=lambda: element_hit_ratio(),
+    )
+)
+driver_restarts = register(
+    Counter("fairgame_driver_restarts_total", "Times Chrome was recreated")
+)
+captchas = register(Counter("fairgame_captchas_total", "Captcha pages encountered"))
+notifications = register(
+    Counter(
+        "fairgame_notifications_total", "Notifications sent, by outcome", labelled=True
+    )
+)
+notification_attachments = register(
+    Counter(
+        "fairgame_notification_attachments_total",
+        "Screenshots attached to notifications, by how they were sent",
+        labelled=True,
+    )
+)
+notification_delivery = register(
+    Histogram(
+        "fairgame_notification_delivery_seconds",
+        "Time from queueing a notification until it was handed to the services",
+        buckets=(0.5, 1, 2, 5, 10, 30, 60, 120),
+    )
+)
+notification_queue_depth = register(
+    Gauge(
+        "fairgame_notification_queue_depth",
+        "Notifications waiting to be sent",
+    )
+)
+chrome_rss = register(
+    Gauge(
+        "fairgame_chrome_rss_bytes",
+        "Resident memory of the Chrome processes started by the bot",
+    )
+)
+
+
+def element_hit_ratio():
+    results = {}
+    for _, labels, value in element_lookups.samples():
+        results[labels["result"]] = results.get(labels["result"], 0) + value
+    lookups = results.get("hit", 0) + results.get("miss", 0)
+    return round(results.get("hit", 0) / lookups, 4) if lookups else 0
+
+
+def record_stock_check(asin):
+    stock_checks.inc(asin=asin)
+    stock_check_rate.add()
+    last_check[asin] = time.time()
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Keep scrapes out of the console
+        pass
+
+
+def start_metrics_server(port, host="127.0.0.1"):
+    global server
+    server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    log.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
+
+
+def enabled():
+    """Whether metrics are served, gauges that are only computed on a scrape aren't needed otherwise"""
+    return server is not None
@@ -0,0 +1,264 @@
+#      FairGame - Automated Purchasing Program
+#      Copyright (C) 2021  Hari Nagarajan
+#
+#      This program is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      This program is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#      The author may be contacted through the project's GitHub, at:
+#      https://github.com/Hari-Nagarajan/fairgame
+
+import time
+from collections import defaultdict, deque
+
+from utils import metrics
+from utils.logger import log
+
+# Every Nth check of an ASIN lets the page finish loading so there is a full-load time to compare against
+FULL_LOAD_PROBE_INTERVAL = 10
+# Number of samples kept per ASIN
+MAX_SAMPLES = 50
+
+# Returns the time since navigation start (ms) at which the decision was made, and stops the
+# rest of the page load if asked to.  Timings come from the browser, so they do not include
+# the WebDriver round-trip.
+DECISION_SCRIPT = (
+    "var state = document.readyState;"
+    "var stop = arguments[0] && state !== 'complete';"
+    "if (stop) { window.stop(); }"
+    "return [performance.now(), state, stop];"
+)
+
+# Returns the load event end (ms since navigation start) of the current page and its url
+FULL_LOAD_SCRIPT = (
+    "var nav = performance.getEntriesByType('navigation')[0];"
+    "return [nav ? nav.loadEventEnd : 0, location.href];"
+)
+
+
+class PageLoadTimer:
+    """Tracks time-to-decision and full page load times for offer pages, per ASIN"""
+
+    def __init__(self, probe_interval=FULL_LOAD_PROBE_INTERVAL):
+        self.probe_interval = probe_interval
+        self.decision_times = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+        self.full_load_times = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+        self.check_count = defaultdict(int)
+        self.pending_probe = None
+
+    def should_stop(self, asin):
+        """Early stop on everything but the periodic full load probes"""
+        return self.check_count[asin] % self.probe_interval != 0
+
+    def decide(self, driver, asin, early_stop=True):
+        """Records the time-to-decision for the current page of the ASIN and halts the remaining load"""
+        stop = early_stop and self.should_stop(asin)
+        self.check_count[asin] += 1
+        try:
+            decision_ms, ready_state, stopped = driver.execute_script(
+                DECISION_SCRIPT, stop
+            )
+        except Exception as e:
+            log.debug(f"Unable to record page timing for {asin}: {e}")
+            return
+        self.decision_times[asin].append(decision_ms)
+        if ready_state == "complete":
+            # Page already finished loading before we could decide, so there is nothing to stop
+            self.record_full_load(driver, asin)
+        elif not stopped:
+            # Let the page finish in the background and collect the full load time later
+            self.pending_probe = asin
+        log.debug(
+            f"{asin}: decision after {decision_ms:.0f} ms (readyState '{ready_state}', stopped: {stopped})"
+        )
+
+    def collect_pending(self, driver):
+        """Collects the full load time of a probed page before navigating away from it"""
+        if self.pending_probe:
+            self.record_full_load(driver, self.pending_probe)
+            self.pending_probe = None
+
+    def record_full_load(self, driver, asin):
+        try:
+            load_ms, url = driver.execute_script(FULL_LOAD_SCRIPT)
+        except Exception as e:
+            log.debug(f"Unable to record full load time for {asin}: {e}")
+            return
+        if load_ms and asin in url:
+            self.full_load_times[asin].append(load_ms)
+
+    def summary(self, asin):
+        decision = average(self.decision_times[asin])
+        full_load = average(self.full_load_times[asin])
+        if decision is None:
+            return f"{asin}: no timings recorded"
+        if full_load is None:
+            return (
+                f"{asin}: time-to-decision {decision:.0f} ms, full load not yet sampled"
+            )
+        return (
+            f"{asin}: time-to-decision {decision:.0f} ms vs full load {full_load:.0f} ms "
+            f"({full_load - decision:.0f} ms saved)"
+        )
+
+    def log_summary(self):
+        for asin in self.decision_times:
+            log.info(self.summary(asin))
+
+
+def average(samples):
+    if not samples:
+        return None
+    return sum(samples) / len(samples)
+
+
+# Checks of each offer URL variant before an ASIN settles on the faster one
+MIN_VARIANT_SAMPLES = 3
+# Every Nth check of an ASIN goes to the variant it isn't using, in case that one got faster
+VARIANT_REPROBE_INTERVAL = 25
+# A check that never got to a decision costs about a full retry
+FAILURE_PENALTY = 5.0
+# Weight of the latest sample in the moving averages
+SMOOTHING = 0.3
+
+
+class VariantStats:
+    """Time-to-decision and failures of one offer URL variant for one ASIN"""
+
+    def __init__(self):
+        self.checks = 0
+        self.failures = 0
+        self.decision_time = None
+        # Expected seconds per check, counting failures as FAILURE_PENALTY on top of the time they took
+        self.cost = None
+
+    def record(self, elapsed, failed=False):
+        self.checks += 1
+        if failed:
+            self.failures += 1
+            elapsed += FAILURE_PENALTY
+        else:
+            self.decision_time = smooth(self.decision_time, elapsed)
+        self.cost = smooth(self.cost, elapsed)
+
+    @property
+    def failure_rate(self):
+        return self.failures / self.checks if self.checks else 0.0
+
+    def __str__(self):
+        if not self.checks:
+            return "no checks"
+        decision = (
+            f"{self.decision_time:.2f}s to decide"
+            if self.decision_time is not None
+            else "never decided"
+        )
+        return f"{decision}, {self.failure_rate:.0%} failed of {self.checks}"
+
+
+class OfferUrlSelector:
+    """Picks the offer URL variant that gets each ASIN to a decision fastest.  Every variant is tried
+    MIN_VARIANT_SAMPLES times first, then the ASIN sticks with the cheapest one, going back to the others
+    every VARIANT_REPROBE_INTERVAL checks."""
+
+    def __init__(self, variants, reprobe_interval=VARIANT_REPROBE_INTERVAL):
+        self.variants = tuple(variants)
+        self.reprobe_interval = reprobe_interval
+        self.stats = defaultdict(VariantStats)
+        self.check_count = defaultdict(int)
+        self.preferred = {}
+        self.pending = None
+
+    def choose(self, asin):
+        """The variant the next check of asin will use.  Doesn't change until that check starts."""
+        count = self.check_count[asin]
+        untried = [
+            variant
+            for variant in self.variants
+            if self.stats[asin, variant].checks < MIN_VARIANT_SAMPLES
+        ]
+        if untried:
+            return untried[count % len(untried)]
+        best = self.best(asin)
+        if count % self.reprobe_interval == 0:
+            others = [variant for variant in self.variants if variant != best]
+            return others[(count // self.reprobe_interval) % len(others)]
+        return best
+
+    def best(self, asin):
+        return min(self.variants, key=lambda variant: self.stats[asin, variant].cost)
+
+    def start(self, asin):
+        """Starts timing a check of asin, returns the variant to load"""
+        self.finish()
+        variant = self.choose(asin)
+        self.check_count[asin] += 1
+        self.pending = (asin, variant, time.perf_counter())
+        return variant
+
+    def decided(self, asin):
+        """The offer page of the check in progress showed what it has"""
+        if self.pending and self.pending[0] == asin:
+            self.record(*self.pending, failed=False)
+            self.pending = None
+
+    def finish(self):
+        """Ends the check in progress.  If it never got to a decision, it counts as a failure."""
+        if self.pending:
+            self.record(*self.pending, failed=True)
+            self.pending = None
+
+    def record(self, asin, variant, started, failed):
+        self.stats[asin, variant].record(time.perf_counter() - started, failed)
+        metrics.offer_url_checks.inc(
+            asin=asin, variant=variant, result="failed" if failed else "decided"
+        )
+        if any(
+            self.stats[asin, other].checks < MIN_VARIANT_SAMPLES
+            for other in self.variants
+        ):
+            return
+        best = self.best(asin)
+        if self.preferred.get(asin) != best:
+            self.preferred[asin] = best
+            log.info(f"{asin}: using {best} for offers. {self.summary(asin)}")
+
+    def summary(self, asin):
+        return "; ".join(
+            f"{variant} {self.stats[asin, variant]}" for variant in self.variants
+        )
+
+    def log_summary(self):
+        for asin in self.check_count:
+            preferred = self.preferred.get(asin, "undecided")
+            log.info(f"{asin} ({preferred}): {self.summary(asin)}")
+
+    def metric_samples(self):
+        """(labels, value) pairs for the offer URL cost gauge"""
+        return [
+            (
+                {
+                    "asin": asin,
+                    "variant": variant,
+                    "preferred": str(self.preferred.get(asin) == variant).lower(),
+                },
+                round(stats.cost, 3),
+            )
+            for (asin, variant), stats in list(self.stats.items())
+            if stats.cost is not None
+        ]
+
+
+def smooth(average, sample):
+    if average is None:
+        return sample
+    return average + SMOOTHING * (sample - average)
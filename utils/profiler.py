@@ -0,0 +1,135 @@
+#      FairGame - Automated Purchasing Program
+#      Copyright (C) 2021  Hari Nagarajan
+#
+#      This program is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      This program is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#      The author may be contacted through the project's GitHub, at:
+#      https://github.com/Hari-Nagarajan/fairgame
+
+import cProfile
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from utils.logger import log
+
+DEFAULT_INTERVAL = 0.01
+PROFILE_DIR = "logs"
+
+
+class SamplingProfiler:
+    """Samples the stack of every thread at a fixed interval and counts identical stacks, which costs
+    little enough to leave running on a live bot.  cProfile runs alongside it for exact call counts, but
+    only sees the thread that started profiling, which is the bot itself when started by signal.
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL, output_dir=PROFILE_DIR):
+        self.interval = interval
+        self.output_dir = output_dir
+        self.samples = Counter()
+        self.sample_count = 0
+        self.started = None
+        self.stop_event = None
+        self.thread = None
+        self.cprofile = None
+
+    @property
+    def running(self):
+        return self.thread is not None
+
+    def start(self):
+        if self.running:
+            return
+        self.samples = Counter()
+        self.sample_count = 0
+        self.started = time.time()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.sample, name="profiler", daemon=True)
+        self.thread.start()
+        self.cprofile = cProfile.Profile()
+        self.cprofile.enable()
+        log.info(f"Profiling started, sampling every {self.interval * 1000:.0f} ms")
+
+    def stop(self):
+        """Stops profiling and writes the results.  Returns the paths of the files written."""
+        if not self.running:
+            return []
+        self.cprofile.disable()
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = datetime.fromtimestamp(self.started).strftime("%m-%d-%Y_%H_%M_%S")
+        base_path = os.path.join(self.output_dir, f"profile_{stamp}")
+        # One "frame;frame;frame count" line per stack, the input flamegraph.pl and speedscope expect
+        collapsed_path = base_path + ".collapsed"
+        with open(collapsed_path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        stats_path = base_path + ".prof"
+        self.cprofile.dump_stats(stats_path)
+        self.cprofile = None
+        log.info(
+            f"Profiled {time.time() - self.started:.0f} seconds, {self.sample_count} samples. "
+            f"Wrote {collapsed_path} and {stats_path}"
+        )
+        for frame, count in self.hotspots():
+            log.info(f"  {count / max(1, self.sample_count):6.1%}  {frame}")
+        return [collapsed_path, stats_path]
+
+    def sample(self):
+        own_id = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(
+                        f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                    )
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.samples[";".join(reversed(stack))] += 1
+            self.sample_count += 1
+
+    def hotspots(self, limit=10):
+        """The functions most often at the top of a stack, across all sampled threads"""
+        leaves = Counter()
+        for stack, count in self.samples.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return leaves.most_common(limit)
+
+
+profiler = SamplingProfiler()
+
+
+def toggle_handler(signal_num, frame):
+    if signal_num == getattr(signal, "SIGUSR1", None):
+        profiler.start()
+    else:
+        profiler.stop()
+
+
+def install_signal_handlers():
+    """SIGUSR1 starts profiling and SIGUSR2 stops it and writes the results.  Not available on Windows."""
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, toggle_handler)
+        signal.signal(signal.SIGUSR2, toggle_handler)
@@ -0,0 +1,181 @@
+#      FairGame - Automated Purchasing Program
+#      Copyright (C) 2021  Hari Nagarajan
+#
+#      This program is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      This program is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#      The author may be contacted through the project's GitHub, at:
+#      https://github.com/Hari-Nagarajan/fairgame
+
+import random
+import time
+from typing import NamedTuple, Optional
+
+from utils.logger import log
+
+
+class Deadline:
+    """A point in time based on the monotonic clock, so it isn't affected by system clock changes"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return time.monotonic() >= self.expires_at
+
+
+class RetryPolicy(NamedTuple):
+    """How often and how long an operation may be retried.  max_attempts of None means the attempts are
+    only limited by the time budget, and a budget of None means they are only limited by max_attempts.
+    """
+
+    max_attempts: Optional[int] = 3
+    base_delay: float = 0.5
+    max_delay: float = 10.0
+    budget: Optional[float] = 60.0
+    jitter: float = 0.5
+
+    def backoff(self, attempt):
+        """Exponential backoff for the given (1-based) attempt, with up to `jitter` of it taken off at
+        random so multiple instances don't retry in lock step"""
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return delay * (1 - random.uniform(0, self.jitter))
+
+
+# Used for any operation that isn't configured in fairgame.conf
+DEFAULT_RETRY_POLICIES = {
+    "home_page": RetryPolicy(
+        max_attempts=None, base_delay=3, max_delay=60, budget=None
+    ),
+    "offer_page": RetryPolicy(max_attempts=5, base_delay=1, max_delay=10, budget=60),
+    "check_stock": RetryPolicy(max_attempts=4, base_delay=0.5, max_delay=5, budget=120),
+    "buy_it_now": RetryPolicy(max_attempts=20, base_delay=0.1, max_delay=2, budget=60),
+    "add_to_cart": RetryPolicy(max_attempts=3, base_delay=0.5, max_delay=5, budget=60),
+    # A checkout that is getting somewhere can take minutes (two-factor prompts, slow pages), so these are
+    # limited by failed attempts and the checkout loop's iteration limit rather than by time
+    "proceed_to_checkout": RetryPolicy(
+        max_attempts=4, base_delay=0.5, max_delay=5, budget=None
+    ),
+    "place_order": RetryPolicy(
+        max_attempts=4, base_delay=0.5, max_delay=5, budget=None
+    ),
+    "find_button": RetryPolicy(
+        max_attempts=10, base_delay=0.25, max_delay=1, budget=10
+    ),
+}
+
+
+class Retry:
+    """Tracks the attempts of a single run of an operation against its policy"""
+
+    def __init__(self, name, policy):
+        self.name = name
+        self.policy = policy
+        self.attempts = 0
+        self.deadline = Deadline(policy.budget) if policy.budget is not None else None
+
+    def failed(self):
+        """Records a failed attempt"""
+        self.attempts += 1
+
+    def exhausted(self):
+        if (
+            self.policy.max_attempts is not None
+            and self.attempts >= self.policy.max_attempts
+        ):
+            return True
+        return self.deadline is not None and self.deadline.expired()
+
+    def backoff(self):
+        """Records a failed attempt and waits before the next one.  Returns False, without waiting, if
+        the attempts or the time budget are used up."""
+        self.failed()
+        if self.exhausted():
+            log.debug(
+                f"Giving up on {self.name} after {self.attempts} attempt(s) "
+                f"({self.policy.max_attempts} attempts, {self.policy.budget} second budget)"
+            )
+            return False
+        delay = self.policy.backoff(self.attempts)
+        if self.deadline is not None:
+            delay = min(delay, self.deadline.remaining())
+        if delay > 0:
+            time.sleep(delay)
+        return True
+
+
+class CircuitBreaker:
+    """Stops an action that keeps failing from being tried over and over.  After failure_threshold failures
+    without a success in between, the breaker opens and allow() returns False until reset_timeout seconds
+    have passed, when one more try is allowed."""
+
+    def __init__(self, name, failure_threshold=3, reset_timeout=600):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened = None
+
+    def allow(self):
+        if self.opened is None:
+            return True
+        if self.opened.expired():
+            log.info(f"Trying {self.name} again after it was paused")
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            log.warning(
+                f"{self.name} failed {self.failures} times in a row, pausing it for {self.reset_timeout} seconds"
+            )
+            self.opened = Deadline(self.reset_timeout)
+
+
+class RetryPolicies:
+    """The retry policies for each operation, from the RETRY section of the store configuration"""
+
+    def __init__(self, config=None):
+        config = config or {}
+        self.policies = dict(DEFAULT_RETRY_POLICIES)
+        for name, settings in config.items():
+            if name == "circuit_breaker":
+                continue
+            default = self.policies.get(name, RetryPolicy())
+            self.policies[name] = default._replace(
+                **{
+                    field: value
+                    for field, value in settings.items()
+                    if field in RetryPolicy._fields
+                }
+            )
+        self.breaker_settings = config.get("circuit_breaker", {})
+
+    def start(self, name):
+        return Retry(name, self.policies.get(name, RetryPolicy()))
+
+    def circuit_breaker(self, name):
+        return CircuitBreaker(
+            name,
+            failure_threshold=self.breaker_settings.get("failure_threshold", 3),
+            reset_timeout=self.breaker_settings.get("reset_timeout", 600),
+        )
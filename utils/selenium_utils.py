@@ -17,6 +17,7 @@
 #      The author may be contacted through the project's GitHub, at:
 #      https://github.com/Hari-Nagarajan/fairgame
 
+import psutil
 import requests
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.action_chains import ActionChains
@@ -27,17 +28,97 @@ from selenium.webdriver.remote.remote_connection import LOGGER as selenium_logge
 from urllib3.connectionpool import log as urllib_logger
 from logging import WARNING as logging_WARNING
 
-options = Options()
-options.add_experimental_option(
-    "excludeSwitches", ["enable-automation", "enable-logging"]
-)
-options.add_experimental_option("useAutomationExtension", False)
-# CHROME ONLY option to prevent Restore Session popup
-options.add_argument("--disable-session-crashed-bubble")
 selenium_logger.setLevel(logging_WARNING)
 urllib_logger.setLevel(logging_WARNING)
 
 
+def base_options():
+    """Options every Chrome launched by FairGame starts from"""
+    options = Options()
+    options.add_experimental_option(
+        "excludeSwitches", ["enable-automation", "enable-logging"]
+    )
+    options.add_experimental_option("useAutomationExtension", False)
+    # CHROME ONLY option to prevent Restore Session popup
+    options.add_argument("--disable-session-crashed-bubble")
+    return options
+
+
+class ChromePreset:
+    """A named set of Chrome switches and preferences, from the chrome_presets section of fairgame.conf"""
+
+    def __init__(self, name, arguments=(), prefs=None, description=""):
+        self.name = name
+        self.arguments = list(arguments)
+        self.prefs = dict(prefs or {})
+        self.description = description
+
+    @classmethod
+    def from_config(cls, name, config):
+        return cls(
+            name,
+            arguments=config.get("arguments", ()),
+            prefs=config.get("prefs"),
+            description=config.get("description", ""),
+        )
+
+    def build_options(self, headless=False, prefs=None):
+        """Returns new Options for this preset.  prefs are added to, and override, the preset's own."""
+        options = base_options()
+        for argument in self.arguments:
+            options.add_argument(argument)
+        if headless:
+            enable_headless(options)
+        merged_prefs = {**self.prefs, **(prefs or {})}
+        if merged_prefs:
+            options.add_experimental_option("prefs", merged_prefs)
+        return options
+
+
+# Plain Chrome, as launched before presets existed
+DEFAULT_PRESET = ChromePreset("compat")
+
+
+def load_chrome_presets(config):
+    """Returns the presets defined in config by name, and the name of the default one"""
+    config = config or {}
+    presets = {
+        name: ChromePreset.from_config(name, preset)
+        for name, preset in config.get("presets", {}).items()
+    }
+    presets.setdefault(DEFAULT_PRESET.name, DEFAULT_PRESET)
+    default = config.get("default", DEFAULT_PRESET.name)
+    if default not in presets:
+        raise ValueError(f"Default Chrome preset '{default}' is not defined")
+    return presets, default
+
+
+def get_chrome_preset(config, name=None) -> ChromePreset:
+    presets, default = load_chrome_presets(config)
+    name = name or default
+    if name not in presets:
+        raise ValueError(
+            f"Unknown Chrome preset '{name}', choose from {', '.join(sorted(presets))}"
+        )
+    return presets[name]
+
+
+def process_tree_rss(pid):
+    """Resident memory of a process and all of its descendants, in bytes"""
+    try:
+        process = psutil.Process(pid)
+        processes = [process] + process.children(recursive=True)
+    except psutil.Error:
+        return 0
+    rss = 0
+    for process in processes:
+        try:
+            rss += process.memory_info().rss
+        except psutil.Error:
+            pass
+    return rss
+
+
 class AnyEc:
     """Use with WebDriverWait to combine expected_conditions
     in an OR.
@@ -151,7 +232,7 @@ def add_cookies_to_session_from_driver(driver, session):
     ]
 
 
-def enable_headless():
+def enable_headless(options):
     options.add_argument("--headless")
     options.add_argument("--window-size=1920x1080")
     options.add_argument("--no-sandbox")
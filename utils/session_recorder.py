@@ -0,0 +1,481 @@
+#      FairGame - Automated Purchasing Program
+#      Copyright (C) 2021  Hari Nagarajan
+#
+#      This program is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      This program is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#      The author may be contacted through the project's GitHub, at:
+#      https://github.com/Hari-Nagarajan/fairgame
+
+import atexit
+import base64
+import builtins
+import functools
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import zipfile
+from contextlib import contextmanager
+
+from selenium.common import exceptions as sel_exceptions
+
+from utils.logger import log
+from utils.version import version
+
+# A session archive is a zip file with:
+#   session.json     the store options and domain the session was recorded with
+#   commands.jsonl   one record per driver command, and the start and end of each replayable call
+#   pages/<sha1>     the page source every time the page title changed, stored once per distinct page
+SESSION_FILE = "session.json"
+COMMANDS_FILE = "commands.jsonl"
+PAGES_DIR = "pages/"
+# The same files are written to a folder next to the archive while recording, and packed into the archive
+# when the recording is closed.  A recording cut short by a crash can be replayed from the folder.
+PARTS_SUFFIX = ".parts"
+
+PRIMITIVES = (str, int, float, bool, type(None))
+
+
+class ReplayMismatch(Exception):
+    """The code being replayed sent a different command than the one that was recorded"""
+
+
+class ReplayFinished(Exception):
+    """The code being replayed sent more commands than were recorded"""
+
+
+def encode(value, wrap_object):
+    if isinstance(value, PRIMITIVES):
+        return value
+    if isinstance(value, bytes):
+        # Screenshots
+        return {"$bytes": base64.b64encode(value).decode("ascii")}
+    if isinstance(value, (list, tuple)):
+        return [encode(v, wrap_object) for v in value]
+    if isinstance(value, dict):
+        return {str(k): encode(v, wrap_object) for k, v in value.items()}
+    return wrap_object(value)
+
+
+def describe_error(e):
+    # Selenium exceptions add "Message: " to str(), so keep their original message
+    return [type(e).__name__, getattr(e, "msg", None) or str(e)]
+
+
+def unwrap(value):
+    """The real object behind a recording proxy, for code that must not be recorded"""
+    if isinstance(value, RecordingProxy):
+        return value._inner
+    if isinstance(value, (list, tuple)):
+        return type(value)(unwrap(v) for v in value)
+    return value
+
+
+class SessionRecorder:
+    """Records every command sent through the objects it wraps.  Results that aren't plain values, such
+    as WebElements, are wrapped too and referred to by number.  Each record is written out as soon as it
+    is complete, so a long session doesn't keep them in memory."""
+
+    def __init__(self, path, options=None, amazon_website=None):
+        self.path = path
+        self.parts_path = path + PARTS_SUFFIX
+        os.makedirs(os.path.join(self.parts_path, PAGES_DIR), exist_ok=True)
+        with open(
+            os.path.join(self.parts_path, SESSION_FILE), "w", encoding="utf-8"
+        ) as f:
+            json.dump(
+                {
+                    "version": str(version),
+                    "started": time.time(),
+                    "options": options or {},
+                    "amazon_website": amazon_website,
+                },
+                f,
+            )
+        self.commands = open(
+            os.path.join(self.parts_path, COMMANDS_FILE), "w", encoding="utf-8"
+        )
+        self.recorded = 0
+        self.pages = set()
+        self.last_title = None
+        self.next_ref = 0
+        self.depth = 0
+        self.lock = threading.Lock()
+        atexit.register(self.close)
+
+    def wrap(self, obj, name=None):
+        if name is None:
+            self.next_ref += 1
+            name = self.next_ref
+        return RecordingProxy(self, obj, name)
+
+    def record(self, record):
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self.lock:
+            if self.commands:
+                self.commands.write(line)
+                # Flushed so the commands up to a crash are on disk
+                self.commands.flush()
+                self.recorded += 1
+
+    def snapshot(self, obj, title):
+        """Saves the page source when the title changes, so each page the session saw is archived"""
+        if title == self.last_title:
+            return None
+        self.last_title = title
+        try:
+            source = obj.page_source
+        except Exception as e:
+            log.debug(f"Unable to snapshot the page: {e}")
+            return None
+        digest = hashlib.sha1(source.encode("utf-8")).hexdigest()
+        with self.lock:
+            if self.commands and digest not in self.pages:
+                with open(
+                    os.path.join(self.parts_path, PAGES_DIR, digest),
+                    "w",
+                    encoding="utf-8",
+                ) as f:
+                    f.write(source)
+                self.pages.add(digest)
+        return digest
+
+    def close(self):
+        with self.lock:
+            if not self.commands:
+                return
+            self.commands.close()
+            self.commands = None
+            temp_path = f"{self.path}.tmp"
+            with zipfile.ZipFile(
+                temp_path, "w", compression=zipfile.ZIP_DEFLATED
+            ) as archive:
+                archive.write(os.path.join(self.parts_path, SESSION_FILE), SESSION_FILE)
+                archive.write(
+                    os.path.join(self.parts_path, COMMANDS_FILE), COMMANDS_FILE
+                )
+                for digest in sorted(self.pages):
+                    archive.write(
+                        os.path.join(self.parts_path, PAGES_DIR, digest),
+                        PAGES_DIR + digest,
+                    )
+            os.replace(temp_path, self.path)
+            shutil.rmtree(self.parts_path, ignore_errors=True)
+        log.info(
+            f"Recorded {self.recorded} commands and {len(self.pages)} pages to {self.path}"
+        )
+
+
+def read_session_files(path):
+    """The files of a session archive, or of the folder of a recording that was never closed, by name"""
+    if os.path.isdir(path):
+        files = {}
+        for root, _, names in os.walk(path):
+            for name in names:
+                file_path = os.path.join(root, name)
+                with open(file_path, "rb") as f:
+                    files[os.path.relpath(file_path, path).replace(os.sep, "/")] = (
+                        f.read()
+                    )
+        return files
+    with zipfile.ZipFile(path) as archive:
+        return {name: archive.read(name) for name in archive.namelist()}
+
+
+class RecordingProxy:
+    """Forwards attribute reads and method calls to the wrapped object, recording each one"""
+
+    def __init__(self, recorder, inner, ref):
+        self._recorder = recorder
+        self._inner = inner
+        self._ref = ref
+
+    def __getattr__(self, name):
+        start_time = time.perf_counter()
+        try:
+            value = getattr(self._inner, name)
+        except Exception as e:
+            self._recorder.record(self._record(name, "attr", start_time, error=e))
+            raise
+        if callable(value):
+            return functools.partial(self._call, name, value)
+        record = self._record(name, "attr", start_time, result=value)
+        if name == "title" and isinstance(self._ref, str):
+            record["page"] = self._recorder.snapshot(self._inner, value)
+        return self._result(record, value)
+
+    def _call(self, name, method, *args, **kwargs):
+        start_time = time.perf_counter()
+        try:
+            value = method(*unwrap(args), **{k: unwrap(v) for k, v in kwargs.items()})
+        except Exception as e:
+            self._recorder.record(
+                self._record(name, "call", start_time, args, kwargs, error=e)
+            )
+            raise
+        record = self._record(name, "call", start_time, args, kwargs, result=value)
+        return self._result(record, value)
+
+    def _record(self, name, kind, start_time, args=(), kwargs=None, **outcome):
+        """Builds the record of a command, the caller records it once it is complete"""
+        record = {
+            "target": self._ref,
+            "name": name,
+            "kind": kind,
+            "ms": round((time.perf_counter() - start_time) * 1000, 3),
+        }
+        if args or kwargs:
+            record["args"] = encode(list(args), lambda v: {"$ref": v._ref})
+            record["kwargs"] = encode(kwargs or {}, lambda v: {"$ref": v._ref})
+        if "error" in outcome:
+            record["error"] = describe_error(outcome["error"])
+        return record
+
+    def _result(self, record, value):
+        wrapped = {}
+
+        def wrap_object(obj):
+            proxy = self._recorder.wrap(obj)
+            wrapped[id(obj)] = proxy
+            return {"$ref": proxy._ref}
+
+        record["result"] = encode(value, wrap_object)
+        self._recorder.record(record)
+        return rebuild(value, lambda obj: wrapped[id(obj)])
+
+
+def rebuild(value, replace_object):
+    if isinstance(value, PRIMITIVES + (bytes,)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [rebuild(v, replace_object) for v in value]
+    if isinstance(value, dict):
+        return {k: rebuild(v, replace_object) for k, v in value.items()}
+    return replace_object(value)
+
+
+def replayable(method):
+    """Marks a store method as an entry point that replay_entries can call again from a recording"""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        recorder = getattr(self, "recorder", None)
+        # Only the outermost call is an entry, check_stock calls itself to retry
+        if recorder is None or recorder.depth:
+            return method(self, *args, **kwargs)
+        recorder.record(
+            {
+                "kind": "enter",
+                "name": method.__name__,
+                "args": encode(list(args), repr),
+                "kwargs": encode(kwargs, repr),
+            }
+        )
+        exit_record = {"kind": "exit", "name": method.__name__}
+        start_time = time.perf_counter()
+        recorder.depth += 1
+        try:
+            result = method(self, *args, **kwargs)
+            exit_record["result"] = encode(result, repr)
+        except Exception as e:
+            exit_record["error"] = describe_error(e)
+            raise
+        finally:
+            recorder.depth -= 1
+            exit_record["ms"] = round((time.perf_counter() - start_time) * 1000, 3)
+            recorder.record(exit_record)
+        return result
+
+    return wrapper
+
+
+class VirtualClock:
+    """Stands in for the time module while replaying.  Sleeping and recorded commands move the clock
+    forward instantly, so timeouts expire at the same point as they did in the recording.
+    """
+
+    def __init__(self):
+        self.elapsed = 0.0
+        self.real = {
+            name: getattr(time, name)
+            for name in ("time", "monotonic", "perf_counter", "sleep")
+        }
+        self.base = {
+            name: self.real[name]() for name in ("time", "monotonic", "perf_counter")
+        }
+
+    def advance(self, seconds):
+        self.elapsed += max(0.0, seconds)
+
+    @contextmanager
+    def installed(self):
+        for name in ("time", "monotonic", "perf_counter"):
+            setattr(time, name, functools.partial(self.now, name))
+        time.sleep = self.advance
+        try:
+            yield self
+        finally:
+            for name, function in self.real.items():
+                setattr(time, name, function)
+
+    def now(self, name):
+        return self.base[name] + self.elapsed
+
+
+class ReplaySession:
+    """Plays back a session archive.  Driver commands must arrive in the recorded order, and get the
+    recorded results, including any exception, without a browser."""
+
+    def __init__(self, path):
+        self.path = path
+        files = read_session_files(path)
+        self.meta = json.loads(files[SESSION_FILE])
+        self.records = []
+        for line in files[COMMANDS_FILE].decode("utf-8").splitlines():
+            if not line:
+                continue
+            try:
+                self.records.append(json.loads(line))
+            except ValueError:
+                # The last line of a recording cut short by a crash
+                break
+        self.pages = {
+            name[len(PAGES_DIR) :]: content.decode("utf-8")
+            for name, content in files.items()
+            if name.startswith(PAGES_DIR)
+        }
+        self.position = 0
+        self.clock = None
+
+    @property
+    def options(self):
+        return self.meta.get("options", {})
+
+    def proxy(self, name):
+        return ReplayProxy(self, name)
+
+    def entries(self):
+        return [
+            (index, record)
+            for index, record in enumerate(self.records)
+            if record["kind"] == "enter"
+        ]
+
+    def next_record(self, target, name, kind):
+        if self.position >= len(self.records):
+            raise ReplayFinished(f"No recorded command left for {name}")
+        record = self.records[self.position]
+        if (
+            record["kind"] != kind
+            or record.get("target") != target
+            or record.get("name") != name
+        ):
+            raise ReplayMismatch(
+                f"Command {self.position}: expected {record.get('target')}.{record.get('name')} "
+                f"({record['kind']}), got {target}.{name} ({kind})"
+            )
+        self.position += 1
+        if self.clock:
+            self.clock.advance(record.get("ms", 0) / 1000)
+        return record
+
+    def outcome(self, record):
+        if "error" in record:
+            error_name, message = record["error"]
+            error_class = getattr(
+                sel_exceptions,
+                error_name,
+                getattr(builtins, error_name, sel_exceptions.WebDriverException),
+            )
+            raise error_class(message)
+        return self.decode(record.get("result"))
+
+    def decode(self, value):
+        if isinstance(value, list):
+            return [self.decode(v) for v in value]
+        if isinstance(value, dict):
+            if set(value) == {"$ref"}:
+                return ReplayProxy(self, value["$ref"])
+            if set(value) == {"$bytes"}:
+                return base64.b64decode(value["$bytes"])
+            return {k: self.decode(v) for k, v in value.items()}
+        return value
+
+    def replay_entries(self, store, entries=None):
+        """Calls each recorded entry point on the store again, starting from the commands it sent in the
+        recording.  Returns a list of (entry record, exit record, result or exception, replay seconds).
+        """
+        results = []
+        for index, entry in entries or self.entries():
+            self.position = index + 1
+            self.clock = VirtualClock()
+            start_time = time.perf_counter()
+            try:
+                with self.clock.installed():
+                    result = getattr(store, entry["name"])(
+                        *entry["args"], **entry["kwargs"]
+                    )
+                    exit_record = self.records[self.position]
+                    if exit_record["kind"] != "exit":
+                        raise ReplayMismatch(
+                            f"{entry['name']} returned before sending command {self.position}"
+                        )
+            except Exception as e:
+                result = e
+                exit_record = next(
+                    (
+                        r
+                        for r in self.records[index + 1 :]
+                        if r["kind"] == "exit" and r["name"] == entry["name"]
+                    ),
+                    None,
+                )
+            finally:
+                self.clock = None
+            results.append(
+                (entry, exit_record, result, time.perf_counter() - start_time)
+            )
+        return results
+
+
+class ReplayProxy:
+    def __init__(self, session, ref):
+        self._session = session
+        self._ref = ref
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        # Whether the recording read an attribute or called a method decides what to hand back
+        upcoming = self._session.records[
+            self._session.position : self._session.position + 1
+        ]
+        if upcoming and upcoming[0]["kind"] == "call" and upcoming[0]["name"] == name:
+            return functools.partial(self._call, name)
+        return self._session.outcome(self._session.next_record(self._ref, name, "attr"))
+
+    def _call(self, name, *args, **kwargs):
+        record = self._session.next_record(self._ref, name, "call")
+        sent = {
+            "args": encode(list(args), lambda v: {"$ref": v._ref}),
+            "kwargs": encode(kwargs, lambda v: {"$ref": v._ref}),
+        }
+        recorded = {"args": record.get("args", []), "kwargs": record.get("kwargs", {})}
+        if sent != recorded:
+            raise ReplayMismatch(
+                f"Command {self._session.position - 1}: {name} was recorded with {recorded}, got {sent}"
+            )
+        return self._session.outcome(record)
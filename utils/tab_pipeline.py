@@ -0,0 +1,104 @@
+#      FairGame - Automated Purchasing Program
+#      Copyright (C) 2021  Hari Nagarajan
+#
+#      This program is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      This program is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#      The author may be contacted through the project's GitHub, at:
+#      https://github.com/Hari-Nagarajan/fairgame
+
+from selenium.common import exceptions as sel_exceptions
+
+from utils.logger import log
+
+# Weight of the newest sample in the load time estimate
+LOAD_ESTIMATE_SMOOTHING = 0.3
+
+# Time from navigation start until the DOM was parsed, or 0 while it is still loading
+DOM_INTERACTIVE_SCRIPT = """
+var timing = window.performance.timing;
+return timing.domInteractive ? (timing.domInteractive - timing.navigationStart) / 1000 : 0;
+"""
+
+
+class TabPipeline:
+    """Keeps a second tab loading the next page while the current one is being checked.  When the next
+    check starts, the tabs swap roles instead of navigating, so the page is usually ready already.  Needs
+    the 'none' page load strategy, otherwise driver.get() blocks until the prefetched page has loaded.
+    """
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.active = driver.current_window_handle
+        driver.execute_script("window.open('about:blank', '_blank');")
+        self.spare = next(h for h in driver.window_handles if h != self.active)
+        self.prefetched_url = None
+        self.load_estimate = None
+        self.hits = 0
+        self.misses = 0
+
+    def lead_time(self, delay):
+        """How long before the next check the prefetch should start, so the page is ready just in time
+        without being loaded earlier than needed"""
+        if self.load_estimate is None:
+            return delay
+        return min(delay, self.load_estimate)
+
+    def prefetch(self, url):
+        if self.prefetched_url == url:
+            return
+        try:
+            self.driver.switch_to.window(self.spare)
+            try:
+                self.driver.get(url)
+            finally:
+                self.driver.switch_to.window(self.active)
+        except sel_exceptions.WebDriverException as e:
+            log.debug(f"Prefetch of {url} failed: {e}")
+            self.prefetched_url = None
+            return
+        self.prefetched_url = url
+
+    def activate(self, url):
+        """Makes the prefetched tab the current one.  Returns False, leaving the current tab in place, if
+        it wasn't loading url."""
+        if self.prefetched_url != url:
+            self.misses += 1
+            self.prefetched_url = None
+            return False
+        self.prefetched_url = None
+        self.driver.switch_to.window(self.spare)
+        self.active, self.spare = self.spare, self.active
+        self.hits += 1
+        return True
+
+    def record_ready(self):
+        """Updates the load time estimate from the page in the current tab, once it can be used"""
+        try:
+            load_time = self.driver.execute_script(DOM_INTERACTIVE_SCRIPT)
+        except sel_exceptions.WebDriverException:
+            return
+        if not load_time:
+            return
+        if self.load_estimate is None:
+            self.load_estimate = load_time
+        else:
+            self.load_estimate += LOAD_ESTIMATE_SMOOTHING * (
+                load_time - self.load_estimate
+            )
+
+    def summary(self):
+        estimate = (
+            f"{self.load_estimate:.2f}s" if self.load_estimate is not None else "n/a"
+        )
+        return f"Prefetch: {self.hits} hits, {self.misses} misses, estimated load time {estimate}"
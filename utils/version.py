@@ -17,12 +17,20 @@
 #      The author may be contacted through the project's GitHub, at:
 #      https://github.com/Hari-Nagarajan/fairgame
 
+import json
+import os
+import tempfile
+import time
+
 import requests
 from packaging.version import Version, parse, InvalidVersion
-import sys
-import os
 
 _LATEST_URL = "https://api.github.com/repos/Hari-Nagarajan/fairgame/releases/latest"
+_TIMEOUT = 3  # seconds
+# The latest release is cached for every FairGame instance on this machine, so running many of them
+# doesn't burn through the GitHub API rate limit
+_CACHE_PATH = os.path.join(tempfile.gettempdir(), "fairgame-latest-version.json")
+_CACHE_TTL = 6 * 60 * 60  # seconds
 
 # Use a Version object to gain additional version identification capabilities
 # See https://github.com/pypa/packaging for details
@@ -45,21 +53,45 @@ def is_latest():
 
 
 def get_latest_version():
+    latest_version = get_cached_version()
+    if latest_version:
+        return latest_version
     try:
-        r = requests.get(_LATEST_URL)
+        r = requests.get(_LATEST_URL, timeout=_TIMEOUT)
         if r.status_code == 403:
             print("GitHub API rate limit reached")
             print("Consider running fewer instances of the bot")
-            if sys.platform == "win32":
-                os.system("pause")
-            else:
-                input("Press enter key to continue...")
-            # Return a safe, but wrong version
+            # Return a safe, but wrong version.  Cache it so other instances don't hit the limit as well
             latest_version = parse("0.0")
-            return latest_version
-        data = r.json()
-        latest_version = parse(str(data["tag_name"]))
-    except InvalidVersion:
+        else:
+            data = r.json()
+            latest_version = parse(str(data["tag_name"]))
+    except (InvalidVersion, KeyError):
         # Return a safe, but wrong version
         latest_version = parse("0.0")
+    except (requests.RequestException, ValueError):
+        # Offline or GitHub is having a bad day, try again next time
+        return parse("0.0")
+    cache_version(latest_version)
     return latest_version
+
+
+def get_cached_version():
+    try:
+        with open(_CACHE_PATH) as f:
+            cached = json.load(f)
+        if time.time() - cached["checked"] < _CACHE_TTL:
+            return parse(cached["version"])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+
+def cache_version(latest_version):
+    temp_path = f"{_CACHE_PATH}.{os.getpid()}"
+    try:
+        with open(temp_path, "w") as f:
+            json.dump({"version": str(latest_version), "checked": time.time()}, f)
+        os.replace(temp_path, _CACHE_PATH)
+    except OSError:
+        pass
@@ -0,0 +1,170 @@
+#      FairGame - Automated Purchasing Program
+#      Copyright (C) 2021  Hari Nagarajan
+#
+#      This program is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU General Public License as published by
+#      the Free Software Foundation, either version 3 of the License, or
+#      (at your option) any later version.
+#
+#      This program is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU General Public License for more details.
+#
+#      You should have received a copy of the GNU General Public License
+#      along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+#      The author may be contacted through the project's GitHub, at:
+#      https://github.com/Hari-Nagarajan/fairgame
+
+import time
+from typing import Dict, List
+
+from lxml import etree, html
+
+ENGINES = ("lxml", "chrome")
+
+# Times every selector inside the page, so the WebDriver round trip isn't part of the measurement.
+# arguments[0] maps names to XPaths, arguments[1] is the number of evaluations to average.  Returns
+# name -> [ms per evaluation, number of matches, error].
+TIMING_SCRIPT = """
+var selectors = arguments[0];
+var iterations = arguments[1];
+var results = {};
+for (var name in selectors) {
+    try {
+        var count = 0;
+        var start = performance.now();
+        for (var i = 0; i < iterations; i++) {
+            count = document.evaluate(selectors[name], document, null,
+                XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null).snapshotLength;
+        }
+        results[name] = [(performance.now() - start) / iterations, count, null];
+    } catch (e) {
+        results[name] = [null, 0, String(e)];
+    }
+}
+return results;
+"""
+
+
+class SelectorResult:
+    """Timings and matches of one selector on one engine, over every page"""
+
+    def __init__(self):
+        self.timings = []
+        self.pages = 0
+        self.matched_pages = 0
+        self.error = None
+
+    def add(self, ms, matches):
+        self.timings.append(ms)
+        self.pages += 1
+        if matches:
+            self.matched_pages += 1
+
+    @property
+    def mean(self):
+        return sum(self.timings) / len(self.timings) if self.timings else None
+
+    @property
+    def worst(self):
+        return max(self.timings) if self.timings else None
+
+
+class XPathProfile:
+    """Cost and match counts of named XPaths on saved pages, with lxml and in Chrome"""
+
+    def __init__(self, selectors: Dict[str, str]):
+        self.selectors = dict(selectors)
+        self.results = {
+            (name, engine): SelectorResult()
+            for name in self.selectors
+            for engine in ENGINES
+        }
+        self.engines = []
+
+    def profile_lxml(self, pages, iterations):
+        """pages are (name, HTML bytes) tuples"""
+        self.engines.append("lxml")
+        compiled = {}
+        for name, xpath in self.selectors.items():
+            try:
+                compiled[name] = etree.XPath(xpath)
+            except etree.XPathError as e:
+                self.results[name, "lxml"].error = str(e)
+        for _, source in pages:
+            document = html.document_fromstring(source)
+            for name, xpath in compiled.items():
+                try:
+                    start_time = time.perf_counter()
+                    for _ in range(iterations):
+                        matches = xpath(document)
+                    elapsed = time.perf_counter() - start_time
+                except etree.XPathError as e:
+                    self.results[name, "lxml"].error = str(e)
+                    continue
+                self.results[name, "lxml"].add(
+                    elapsed * 1000 / iterations,
+                    len(matches) if isinstance(matches, list) else matches,
+                )
+
+    def profile_chrome(self, driver, urls, iterations):
+        """Loads each URL in driver, and times the selectors once the page has loaded"""
+        self.engines.append("chrome")
+        for url in urls:
+            driver.get(url)
+            timings = driver.execute_script(TIMING_SCRIPT, self.selectors, iterations)
+            for name, (ms, matches, error) in timings.items():
+                if error:
+                    self.results[name, "chrome"].error = error
+                else:
+                    self.results[name, "chrome"].add(ms, matches)
+
+    def cost(self, name):
+        """The slowest mean of the selector over the engines, for sorting"""
+        means = [self.results[name, engine].mean for engine in self.engines]
+        return max((mean for mean in means if mean is not None), default=0)
+
+    def flags(self, name, slow_ms) -> List[str]:
+        results = [self.results[name, engine] for engine in self.engines]
+        flags = []
+        if any(result.error for result in results):
+            flags.append("INVALID")
+        elif not any(result.matched_pages for result in results):
+            flags.append("NO MATCH")
+        if self.cost(name) >= slow_ms:
+            flags.append("SLOW")
+        return flags
+
+    def report(self, slow_ms) -> List[str]:
+        def cell(result):
+            if result.mean is None:
+                return f"{'-':>17}"
+            return f"{result.mean:7.3f}/{result.worst:7.3f} ms"
+
+        lines = [
+            f"{'Selector':<32} "
+            + " ".join(f"{engine + ' mean/worst':>20}" for engine in self.engines)
+            + f" {'matched':>9}  flags"
+        ]
+        flagged = []
+        for name in sorted(self.selectors, key=self.cost, reverse=True):
+            results = [self.results[name, engine] for engine in self.engines]
+            matched = max(result.matched_pages for result in results)
+            pages = max(result.pages for result in results)
+            flags = self.flags(name, slow_ms)
+            lines.append(
+                f"{name:<32} "
+                + " ".join(f"{cell(result):>20}" for result in results)
+                + f" {f'{matched}/{pages}':>9}  {', '.join(flags)}"
+            )
+            if flags:
+                flagged.append(name)
+        for name in flagged:
+            lines.append(f"{name} ({', '.join(self.flags(name, slow_ms))}):")
+            lines.append(f"    {self.selectors[name]}")
+            for engine in self.engines:
+                if self.results[name, engine].error:
+                    lines.append(f"    {engine}: {self.results[name, engine].error}")
+        return lines